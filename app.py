@@ -9,7 +9,15 @@ from aiogram.fsm.strategy import FSMStrategy
 from dotenv import load_dotenv
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import init_db, get_session, SQLiteStorage
+from database import init_db, get_session, CachedStorage, LazySession, create_sqlite_storage
+from database.backfill_pair_history import backfill_pair_history
+from database.add_schedule_mask import add_schedule_mask
+from database.db import get_sqlite_profile
+from database.fsm_codecs import get_codec
+from services.interest_catalog import get_interest_catalog
+from services.outbox_service import OutboxDispatcher
+from services.reminder_service import ReminderTimers
+from handlers.notifications import send_meeting_reminders
 from handlers import registration_router, feedback_router, common_router, admin_router, pairing_router
 from scheduler import setup_scheduler
 
@@ -38,19 +46,22 @@ ADMIN_USER_ID = os.getenv("ADMIN_USER_ID")
 class DbSessionMiddleware:
     """
     Middleware для внедрения сессии базы данных в апдейты.
+    
+    В хендлер передается LazySession: соединение берется из пула только
+    при первом обращении к базе и возвращается после session.release()
+    или по завершении обработки апдейта.
     """
     def __init__(self, session_maker):
         self.session_maker = session_maker
     
     async def __call__(self, handler, event, data):
-        # Создаем новую сессию для каждого запроса
-        session = self.session_maker()
+        session = LazySession(self.session_maker)
         data["session"] = session
         
         try:
             return await handler(event, data)
         finally:
-            await session.close()
+            await session.release()
 
 
 async def main():
@@ -63,18 +74,57 @@ async def main():
     await init_db()
     logger.info("Database initialized")
     
-    # Создаем хранилище состояний (SQLite)
-    storage = SQLiteStorage()
+    # Переносим историю встреч в pair_history (только если таблица еще пуста)
+    await backfill_pair_history()
+    # Добавляем и заполняем маски расписания пользователей
+    await add_schedule_mask()
+    # Загружаем справочник интересов в память (при пустой таблице - заполняем по умолчанию)
+    async with get_session()() as session:
+        await get_interest_catalog(session)
+    
+    # Создаем хранилище состояний (SQLite с кэшем в памяти) и сразу открываем соединение
+    # Записи, не обновлявшиеся дольше FSM_STATE_TTL_HOURS (брошенные анкеты и фидбек), удаляются
+    state_ttl_hours = float(os.getenv("FSM_STATE_TTL_HOURS", "72"))
+    # При FSM_STORAGE_SHARDS > 1 состояния распределяются по нескольким файлам SQLite
+    storage = CachedStorage(
+        create_sqlite_storage(
+            shards=int(os.getenv("FSM_STORAGE_SHARDS", "0")),
+            shard_dir=os.getenv("FSM_STORAGE_SHARD_DIR", "fsm_storage"),
+            state_ttl=state_ttl_hours * 3600 if state_ttl_hours > 0 else None,
+            codec=get_codec(os.getenv("FSM_STORAGE_CODEC", "json")),
+            profile=get_sqlite_profile()
+        ),
+        max_entries=int(os.getenv("FSM_CACHE_MAX_ENTRIES", "10000")),
+        max_bytes=int(os.getenv("FSM_CACHE_MAX_MB", "32")) * 1024 * 1024,
+        flush_interval=float(os.getenv("FSM_CACHE_FLUSH_INTERVAL", "1.0")),
+        max_age=float(os.getenv("FSM_CACHE_MAX_AGE", "30"))
+    )
+    await storage.open()
     
     # Создаем диспетчер
     dp = Dispatcher(storage=storage, fsm_strategy=FSMStrategy.USER_IN_CHAT)
     
+    # Сбрасываем кэш и закрываем соединение хранилища при остановке диспетчера
+    dp.shutdown.register(storage.close)
+    
     # Получаем session_maker напрямую, без await
     session_maker = get_session()
     
     # Регистрируем middleware
     dp.update.middleware(DbSessionMiddleware(session_maker))
     
+    # Запускаем диспетчер очереди исходящих сообщений (outbox): сообщения,
+    # не отправленные до перезапуска, уходят сразу
+    outbox_dispatcher = OutboxDispatcher.from_env(bot, session_maker)
+    await outbox_dispatcher.open()
+    dp.shutdown.register(outbox_dispatcher.close)
+    
+    # Запускаем таймеры напоминаний о встречах: срабатывают за
+    # REMINDER_LEAD_MINUTES до каждой встречи вместо ежечасной проверки
+    reminder_timers = ReminderTimers(session_maker, send_meeting_reminders)
+    await reminder_timers.open()
+    dp.shutdown.register(reminder_timers.close)
+    
     # Регистрируем роутеры
     dp.include_router(registration_router)
     dp.include_router(feedback_router)
@@ -0,0 +1,5 @@
+"""
+Скрипты для замеров производительности.
+
+Запуск: python -m benchmarks.<имя_модуля>
+"""
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк рассылки уведомлений.
+
+Отправляет сообщения через Broadcaster на имитацию бота с задержкой ответа
+Telegram и редкими ответами RetryAfter и сравнивает время с последовательной
+отправкой (как раньше в send_pairing_notifications). Для последовательной
+отправки время оценивается как число сообщений, умноженное на задержку.
+
+Запуск: python -m benchmarks.broadcast --messages 2000 --latency 0.15
+"""
+import argparse
+import asyncio
+import random
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+from services.broadcast_service import BroadcastMessage, Broadcaster
+
+
+class FakeBot:
+    """Имитация бота: задержка ответа, редкие RetryAfter и заблокировавшие бота пользователи"""
+
+    def __init__(self, latency: float, rng: random.Random):
+        self.latency = latency
+        self.rng = rng
+
+    async def send_message(self, chat_id, text, reply_markup=None, parse_mode=None):
+        await asyncio.sleep(self.latency)
+        if self.rng.random() < 0.001:
+            raise TelegramRetryAfter(None, "Flood control exceeded", 1)
+        if chat_id % 100 == 0:
+            raise TelegramForbiddenError(None, "bot was blocked by the user")
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    messages = [BroadcastMessage(chat_id, "Тест") for chat_id in range(1, args.messages + 1)]
+    broadcaster = Broadcaster(FakeBot(args.latency, rng), concurrency=args.concurrency, rate=args.rate)
+    stats = await broadcaster.run(messages)
+
+    print(f"Broadcaster: {stats}")
+    print(f"Последовательно (оценка): {args.messages * args.latency:.1f} с")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк рассылки уведомлений")
+    parser.add_argument("--messages", type=int, default=2000, help="Количество сообщений")
+    parser.add_argument("--latency", type=float, default=0.15, help="Задержка ответа Telegram, с")
+    parser.add_argument("--concurrency", type=int, default=20, help="Одновременных отправок")
+    parser.add_argument("--rate", type=float, default=25.0, help="Лимит сообщений в секунду")
+    parser.add_argument("--seed", type=int, default=1, help="Зерно генератора случайных чисел")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк подбора кандидатов для /find в SQL.
+
+Для каждого размера заполняет базу SQLite случайными пользователями, интересами,
+расписаниями и историей встреч и для нескольких пользователей сравнивает
+запрос services.candidate_search_service (оценка и LIMIT в базе) с движком
+MatchingEngine, которому нужны все активные пользователи в памяти.
+Проверяет, что оценки кандидатов совпадают, и выводит время одного поиска.
+
+Запуск: python -m benchmarks.candidate_search --sizes 1000,10000,50000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, insert
+
+from benchmarks.pairing_strategies import INTERESTS_COUNT, RECENT_PARTNERS, random_schedules
+from database.models import Base, Interest, MeetingFormat, PairHistory, User, user_interests
+from services.candidate_search_service import build_candidates_query
+from services.matching import MatchingEngine
+from services.pair_history_service import normalize_pair
+
+NOW = datetime(2024, 1, 1, 12, 0)
+SAMPLES = 20
+
+
+def generate_users(size: int, rng: random.Random):
+    """Случайные пользователи с полями, которые использует подбор"""
+    schedules = random_schedules(size, rng)
+    return [
+        SimpleNamespace(
+            telegram_id=user_id,
+            meeting_format=rng.choice([None, MeetingFormat.OFFLINE, MeetingFormat.ONLINE, MeetingFormat.ANY]),
+            schedule_mask=schedules[user_id - 1],
+            interests=[
+                SimpleNamespace(id=interest_id)
+                for interest_id in rng.sample(range(1, INTERESTS_COUNT + 1), rng.randint(1, 6))
+            ],
+        )
+        for user_id in range(1, size + 1)
+    ]
+
+
+def generate_pairs(size: int, rng: random.Random):
+    """Недавние встречи: у каждого пользователя до RECENT_PARTNERS собеседников"""
+    return {
+        normalize_pair(user_id, partner_id)
+        for user_id in range(1, size + 1)
+        for partner_id in rng.sample(range(1, size + 1), min(size, RECENT_PARTNERS))
+        if partner_id != user_id
+    }
+
+
+def fill_database(conn, users, pairs) -> None:
+    """Заполняет базу сгенерированными данными"""
+    conn.execute(insert(Interest), [
+        {"id": interest_id, "name": f"Интерес {interest_id}"} for interest_id in range(1, INTERESTS_COUNT + 1)
+    ])
+    conn.execute(insert(User), [
+        {
+            "telegram_id": user.telegram_id,
+            "full_name": f"Пользователь {user.telegram_id}",
+            "meeting_format": user.meeting_format,
+            "schedule_mask": user.schedule_mask,
+            "is_active": True,
+            "registration_complete": True,
+        }
+        for user in users
+    ])
+    conn.execute(insert(user_interests), [
+        {"user_id": user.telegram_id, "interest_id": interest.id} for user in users for interest in user.interests
+    ])
+    conn.execute(insert(PairHistory), [
+        {"user_low_id": low, "user_high_id": high, "last_met_at": NOW - timedelta(days=7), "meetings_count": 1}
+        for low, high in pairs
+    ])
+    conn.exec_driver_sql("ANALYZE")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк подбора кандидатов в SQL")
+    parser.add_argument("--sizes", default="1000,10000,50000", help="Размеры через запятую")
+    parser.add_argument("--limit", type=int, default=30, help="Сколько кандидатов искать")
+    parser.add_argument("--seed", type=int, default=1, help="Зерно генератора случайных чисел")
+    args = parser.parse_args()
+
+    print(f"{'пользователей':>13}{'SQL, мс':>10}{'движок, мс':>13}  совпадение")
+    for size in (int(value) for value in args.sizes.split(",")):
+        rng = random.Random(args.seed)
+        users = generate_users(size, rng)
+        pairs = generate_pairs(size, rng)
+
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            fill_database(conn, users, pairs)
+
+        samples = rng.sample(users, min(SAMPLES, size))
+        mismatches = 0
+        sql_time = engine_time = 0.0
+        with engine.connect() as conn:
+            for user in samples:
+                started = time.perf_counter()
+                found = conn.execute(build_candidates_query(user, args.limit, now=NOW)).all()
+                sql_time += time.perf_counter() - started
+
+                # Движок строится по всем пользователям, как MatchingEngine.load
+                started = time.perf_counter()
+                recent_partners = {}
+                for low, high in pairs:
+                    recent_partners.setdefault(low, set()).add(high)
+                matching = MatchingEngine(users, recent_partners)
+                expected = matching.candidates(user, limit=args.limit)
+                engine_time += time.perf_counter() - started
+
+                # При равной оценке порядок может отличаться, поэтому сравниваем оценки
+                all_scores = {candidate.telegram_id: score for candidate, score in matching.candidates(user)}
+                if (
+                    [score for _, score in found] != [score for _, score in expected]
+                    or any(all_scores.get(candidate_id) != score for candidate_id, score in found)
+                ):
+                    mismatches += 1
+
+        status = "да" if not mismatches else f"нет ({mismatches} из {len(samples)})"
+        print(
+            f"{size:>13}{sql_time / len(samples) * 1000:>10.1f}"
+            f"{engine_time / len(samples) * 1000:>13.1f}  {status}"
+        )
+
+
+if __name__ == "__main__":
+    main()
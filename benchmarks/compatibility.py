@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк расчета совместимости пользователей.
+
+Сравнивает прежний способ (множества id интересов для каждой пары в двойном цикле)
+с CompatibilityIndex (popcount от AND битовых масок сразу для всей строки)
+и замеряет время жадного подбора пар на индексе.
+
+Запуск: python -m benchmarks.compatibility --users 2000 --pairing-users 10000
+"""
+import argparse
+import random
+import time
+from typing import List, Optional, Set
+
+from database.models import MeetingFormat
+from services.matching import CompatibilityIndex, greedy_pairs, interests_to_mask
+
+INTERESTS_COUNT = 20
+
+
+def generate_users(count: int, rng: random.Random):
+    """Генерирует интересы и форматы встреч для count пользователей"""
+    interests: List[Set[int]] = []
+    formats: List[Optional[MeetingFormat]] = []
+    for _ in range(count):
+        interests.append(set(rng.sample(range(1, INTERESTS_COUNT + 1), rng.randint(1, 6))))
+        formats.append(rng.choice([None, MeetingFormat.OFFLINE, MeetingFormat.ONLINE, MeetingFormat.ANY]))
+    return interests, formats
+
+
+def sets_matrix(interests: List[Set[int]]) -> List[List[int]]:
+    """Прежний способ: пересечение множеств для каждой пары пользователей"""
+    return [[len(first & second) for second in interests] for first in interests]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк расчета совместимости пользователей")
+    parser.add_argument("--users", type=int, default=2000, help="Пользователей для сравнения с множествами")
+    parser.add_argument("--pairing-users", type=int, default=10000, help="Пользователей для жадного подбора")
+    parser.add_argument("--seed", type=int, default=1, help="Зерно генератора случайных чисел")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+
+    interests, formats = generate_users(args.users, rng)
+    index = CompatibilityIndex(range(args.users), [interests_to_mask(ids) for ids in interests], formats)
+
+    started = time.perf_counter()
+    sets_matrix(interests)
+    sets_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index.common_interests()
+    matrix_time = time.perf_counter() - started
+
+    print(f"Матрица общих интересов {args.users} x {args.users}:")
+    print(f"  множества:      {sets_time:.2f} с")
+    print(f"  битовые маски:  {matrix_time:.2f} с (x{sets_time / matrix_time:.0f})")
+
+    interests, formats = generate_users(args.pairing_users, rng)
+    started = time.perf_counter()
+    index = CompatibilityIndex(range(args.pairing_users), [interests_to_mask(ids) for ids in interests], formats)
+    pairs = greedy_pairs(index, rng=rng)
+    pairing_time = time.perf_counter() - started
+
+    print(f"Жадный подбор для {args.pairing_users} пользователей: {pairing_time:.2f} с, пар: {len(pairs)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска встреч, по которым нужно напоминание о фидбеке.
+
+Заполняет базу SQLite в памяти пользователями, прошедшими встречами и частью
+фидбеков и сравнивает прежний обход (встречи каждого активного пользователя,
+затем запрос фидбека по каждой прошедшей встрече и запрос собеседника) с
+одним запросом services.meeting_service.iter_pending_feedback. Проверяет, что
+найдены одни и те же пары (участник, встреча), и выводит время и число
+запросов к базе.
+
+Запуск: python -m benchmarks.feedback_reminders --users 2000 --meetings 5
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, insert, or_, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from database.models import Base, Feedback, Meeting, User
+from services.meeting_service import iter_pending_feedback
+
+NOW = datetime.utcnow()
+
+
+async def fill_database(session, args, rng: random.Random) -> None:
+    """Заполняет базу пользователями, встречами и фидбеком"""
+    await session.execute(insert(User), [
+        {
+            "telegram_id": user_id,
+            "full_name": f"Пользователь {user_id}",
+            "is_active": rng.random() < 0.9,
+            "registration_complete": True,
+        }
+        for user_id in range(1, args.users + 1)
+    ])
+
+    meetings = []
+    for meeting_id in range(1, args.users * args.meetings // 2 + 1):
+        user1_id, user2_id = rng.sample(range(1, args.users + 1), 2)
+        meetings.append({
+            "id": meeting_id,
+            "user1_id": user1_id,
+            "user2_id": user2_id,
+            # Сдвиг на час: ни одна встреча не совпадает с текущим временем
+            "scheduled_date": NOW + timedelta(days=rng.randint(-60, 7), hours=1),
+        })
+    await session.execute(insert(Meeting), meetings)
+
+    await session.execute(insert(Feedback), [
+        {"meeting_id": meeting["id"], "from_user_id": from_id, "to_user_id": to_id, "rating": 5}
+        for meeting in meetings
+        for from_id, to_id in ((meeting["user1_id"], meeting["user2_id"]), (meeting["user2_id"], meeting["user1_id"]))
+        if rng.random() < args.feedback_share
+    ])
+    await session.commit()
+
+
+async def legacy_pending(session):
+    """Прежний обход: запросы на каждого пользователя и каждую прошедшую встречу"""
+    pending = set()
+    users = (await session.execute(select(User).where(User.is_active == True))).scalars().all()
+    for user in users:
+        meetings = (await session.execute(
+            select(Meeting).where(or_(Meeting.user1_id == user.telegram_id, Meeting.user2_id == user.telegram_id))
+        )).scalars().all()
+        for meeting in meetings:
+            if meeting.scheduled_date and meeting.scheduled_date < NOW:
+                feedback = (await session.execute(
+                    select(Feedback)
+                    .where(Feedback.meeting_id == meeting.id)
+                    .where(Feedback.from_user_id == user.telegram_id)
+                )).scalar_one_or_none()
+                if feedback:
+                    continue
+                partner_id = meeting.user2_id if meeting.user1_id == user.telegram_id else meeting.user1_id
+                partner = await session.get(User, partner_id)
+                if partner:
+                    pending.add((user.telegram_id, meeting.id))
+    return pending
+
+
+async def streamed_pending(session):
+    """Один запрос с потоковой выдачей пачками"""
+    pending = set()
+    async for rows in iter_pending_feedback(session):
+        pending.update((row.user_id, row.meeting_id) for row in rows)
+    return pending
+
+
+async def run(args):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    queries = 0
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count_query(*_):
+        nonlocal queries
+        queries += 1
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+    async with session_maker() as session:
+        await fill_database(session, args, random.Random(args.seed))
+
+    results = {}
+    for name, search in (("по пользователям", legacy_pending), ("один запрос", streamed_pending)):
+        async with session_maker() as session:
+            queries = 0
+            started = time.perf_counter()
+            results[name] = await search(session)
+            elapsed = time.perf_counter() - started
+        print(f"{name:>17}: {len(results[name])} пар, {elapsed * 1000:.1f} мс, запросов {queries}")
+
+    legacy, streamed = results.values()
+    print(f"Совпадение: {'да' if legacy == streamed else 'нет'}")
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска встреч без фидбека")
+    parser.add_argument("--users", type=int, default=2000, help="Количество пользователей")
+    parser.add_argument("--meetings", type=int, default=5, help="Встреч на пользователя")
+    parser.add_argument("--feedback-share", type=float, default=0.5, help="Доля оставленного фидбека")
+    parser.add_argument("--seed", type=int, default=1, help="Зерно генератора случайных чисел")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Сквозная проверка поиска собеседника через /find.
+
+Заполняет временную базу SQLite пользователями с интересами и вызывает
+хендлеры handlers.pairing так же, как это делает aiogram: /find, "Другие
+варианты" и выбор собеседника. Сообщения бота перехватываются имитацией
+Telegram. Проверяет, что показаны кандидаты с общими интересами, что выбор
+создает встречу и что собеседник получает уведомление. Завершается с кодом 1,
+если хотя бы один шаг не прошел.
+
+Запуск: python -m benchmarks.find_flow
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from database.interests_data import DEFAULT_INTERESTS
+from database.lazy_session import LazySession
+from database.models import Base, Interest, Meeting, MeetingFormat, User, user_interests
+from handlers.pairing import cmd_find, select_user, show_more_users
+from states import PairingStates
+
+USER_ID = 1
+USERS = 12
+
+
+class FakeBot:
+    """Имитация бота: запоминает отправленные сообщения"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, reply_markup=None, parse_mode=None):
+        self.sent.append((chat_id, text))
+
+
+class FakeMessage:
+    """Имитация входящего сообщения: ответы бота сохраняются в bot.sent"""
+
+    def __init__(self, bot: FakeBot, user_id: int):
+        self.bot = bot
+        self.from_user = SimpleNamespace(id=user_id)
+        self.chat = SimpleNamespace(id=user_id)
+
+    async def answer(self, text, reply_markup=None, parse_mode=None):
+        self.bot.sent.append((self.from_user.id, text))
+
+    async def edit_text(self, text, reply_markup=None, parse_mode=None):
+        self.bot.sent.append((self.from_user.id, text))
+
+
+class FakeCallback:
+    """Имитация нажатия кнопки"""
+
+    def __init__(self, bot: FakeBot, user_id: int, data: str):
+        self.bot = bot
+        self.data = data
+        self.from_user = SimpleNamespace(id=user_id)
+        self.message = FakeMessage(bot, user_id)
+
+    async def answer(self, text=None, show_alert=False):
+        if text:
+            self.bot.sent.append((self.from_user.id, text))
+
+
+async def fill_database(session_maker) -> None:
+    """Пользователи с пересекающимися интересами: у всех есть интерес 1"""
+    async with session_maker() as session:
+        await session.execute(insert(Interest), [
+            {"id": interest_id, **interest} for interest_id, interest in enumerate(DEFAULT_INTERESTS, 1)
+        ])
+        await session.execute(insert(User), [
+            {
+                "telegram_id": user_id,
+                "full_name": f"Пользователь {user_id}",
+                "username": f"user{user_id}",
+                "user_number": user_id,
+                "meeting_format": MeetingFormat.ANY,
+                "is_active": True,
+                "registration_complete": True,
+            }
+            for user_id in range(1, USERS + 1)
+        ])
+        await session.execute(insert(user_interests), [
+            {"user_id": user_id, "interest_id": interest_id}
+            for user_id in range(1, USERS + 1)
+            for interest_id in {1, 1 + user_id % 3}
+        ])
+        await session.commit()
+
+
+async def call(errors: list, name: str, handler, *args) -> None:
+    """Вызывает хендлер с отдельной сессией; исключение записывается как ошибка шага"""
+    session = LazySession(args[-1])
+    try:
+        await handler(*args[:-1], session)
+    except Exception as e:
+        errors.append(f"{name}: {e!r}")
+    finally:
+        await session.release()
+
+
+async def run() -> list:
+    errors = []
+    directory = tempfile.mkdtemp()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(directory, 'find.sqlite3')}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    await fill_database(session_maker)
+
+    bot = FakeBot()
+    state = FSMContext(MemoryStorage(), StorageKey(bot_id=0, chat_id=USER_ID, user_id=USER_ID))
+
+    # /find
+    await call(errors, "/find", cmd_find, FakeMessage(bot, USER_ID), state, session_maker)
+    data = await state.get_data()
+    if await state.get_state() != PairingStates.waiting_for_selection.state or not data.get("potential_matches"):
+        errors.append(f"/find не показал кандидатов: {bot.sent}")
+    elif not any("Интересы: " in text and "Интересы: \n" not in text for _, text in bot.sent):
+        errors.append("/find не показал общие интересы")
+
+    # Другие варианты
+    shown = len(data.get("potential_matches", []))
+    await call(errors, "«Другие варианты»", show_more_users, FakeCallback(bot, USER_ID, "more_users"), state, session_maker)
+    if len((await state.get_data()).get("potential_matches", [])) <= shown:
+        errors.append("«Другие варианты» не показали новых кандидатов")
+
+    # Выбор собеседника
+    partner_id = (data.get("potential_matches") or [2])[0]
+    bot.sent.clear()
+    await call(
+        errors, "выбор собеседника", select_user,
+        FakeCallback(bot, USER_ID, f"user_{partner_id}"), state, session_maker
+    )
+    async with session_maker() as check:
+        meetings = (await check.execute(select(func.count()).select_from(Meeting))).scalar_one()
+    if meetings != 1:
+        errors.append(f"Выбор собеседника создал встреч: {meetings}")
+    if not any(chat_id == partner_id for chat_id, _ in bot.sent):
+        errors.append("Собеседник не получил уведомление о выборе")
+    if await state.get_state() is not None:
+        errors.append("Состояние не очищено после выбора собеседника")
+
+    await engine.dispose()
+    return errors
+
+
+def main():
+    errors = asyncio.run(run())
+    for error in errors:
+        print(f"[FAIL] {error}")
+    if errors:
+        sys.exit(1)
+    print("Поиск через /find работает: кандидаты, другие варианты и выбор собеседника")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк кодеков данных FSM.
+
+Сравнивает размер записи и время кодирования/декодирования для прежнего
+формата (json.dumps с настройками по умолчанию, TEXT) и для кодеков
+из database.fsm_codecs на данных, похожих на реальные: анкета регистрации
+и список potential_matches после нескольких страниц /find.
+
+Запуск: python -m benchmarks.fsm_codecs --matches 200 --rounds 20000
+"""
+import argparse
+import json
+import time
+from typing import Any, Callable, Dict
+
+from database.fsm_codecs import decode_data, get_codec
+
+
+def registration_payload() -> Dict[str, Any]:
+    """Данные, накопленные к концу регистрации"""
+    return {
+        "full_name": "Иван Петров",
+        "department": "Отдел разработки продуктов",
+        "role": "Ведущий инженер",
+        "location": "Москва",
+        "meeting_format": "Оффлайн",
+        "selected_interests": [1, 3, 4, 7, 9, 12],
+        "available_days": ["monday", "wednesday", "friday"],
+        "time_slot": "12-14",
+    }
+
+
+def matches_payload(matches: int) -> Dict[str, Any]:
+    """Данные пользователя, листающего результаты /find"""
+    return {
+        "potential_matches": [100000000 + i * 7919 for i in range(matches)],
+        "current_match_index": matches // 2,
+        "selected_interests": list(range(1, 13)),
+    }
+
+
+def measure(func: Callable[[], Any], rounds: int) -> float:
+    """Возвращает среднее время вызова в микросекундах"""
+    started = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - started) / rounds * 1_000_000
+
+
+def compare(title: str, data: Dict[str, Any], rounds: int) -> None:
+    """Печатает размер и скорость каждого формата для одного набора данных"""
+    print(title)
+    print(f"  {'формат':<14}{'байт':>8}{'кодирование, мкс':>20}{'декодирование, мкс':>22}")
+
+    legacy = json.dumps(data)
+    print(
+        f"  {'json (старый)':<14}{len(legacy.encode('utf-8')):>8}"
+        f"{measure(lambda: json.dumps(data), rounds):>20.2f}"
+        f"{measure(lambda: json.loads(legacy), rounds):>22.2f}"
+    )
+
+    for name in ("json", "msgpack"):
+        codec = get_codec(name)
+        encoded = codec.dumps(data)
+        assert decode_data(encoded) == data
+        print(
+            f"  {name:<14}{len(encoded):>8}"
+            f"{measure(lambda: codec.dumps(data), rounds):>20.2f}"
+            f"{measure(lambda: decode_data(encoded), rounds):>22.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк кодеков данных FSM")
+    parser.add_argument("--matches", type=int, default=200, help="Длина списка potential_matches")
+    parser.add_argument("--rounds", type=int, default=20000, help="Повторов каждой операции")
+    args = parser.parse_args()
+
+    compare("Регистрация:", registration_payload(), args.rounds)
+    compare(f"Поиск пары ({args.matches} кандидатов):", matches_payload(args.matches), args.rounds)
+
+
+if __name__ == "__main__":
+    main()
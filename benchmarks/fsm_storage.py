@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк хранилища состояний FSM.
+
+Сравнивает количество обработанных апдейтов в секунду для старой схемы
+(новое соединение и CREATE TABLE на каждый вызов) и для SQLiteStorage
+с постоянным соединением. Один "апдейт" имитирует шаг регистрации:
+get_state + get_data + update_data + set_state.
+
+Запуск: python -m benchmarks.fsm_storage --users 200 --steps 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+import aiosqlite
+from aiogram.fsm.storage.base import StorageKey
+
+from database.state_storage import SQLiteStorage
+from states import RegistrationStates
+
+
+class LegacySQLiteStorage(SQLiteStorage):
+    """
+    Воспроизводит прежнее поведение: соединение и инициализация таблицы на каждый вызов
+    """
+
+    async def _legacy_init(self):
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS fsm_storage (
+                    key TEXT PRIMARY KEY,
+                    state TEXT NULL,
+                    data TEXT NOT NULL
+                )
+            """)
+            await db.commit()
+
+    async def set_state(self, key: StorageKey, state=None) -> None:
+        await self._legacy_init()
+        str_key = self._create_key(key)
+        state_str = getattr(state, "state", state)
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute("SELECT 1 FROM fsm_storage WHERE key = ?", (str_key,)) as cursor:
+                exists = await cursor.fetchone()
+            if exists:
+                await db.execute("UPDATE fsm_storage SET state = ? WHERE key = ?", (state_str, str_key))
+            else:
+                data = await self.get_data(key) or {}
+                await db.execute(
+                    "INSERT INTO fsm_storage (key, state, data) VALUES (?, ?, ?)",
+                    (str_key, state_str, json.dumps(data))
+                )
+            await db.commit()
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        await self._legacy_init()
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                "SELECT state FROM fsm_storage WHERE key = ?", (self._create_key(key),)
+            ) as cursor:
+                result = await cursor.fetchone()
+        return result[0] if result else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._legacy_init()
+        str_key = self._create_key(key)
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute("SELECT 1 FROM fsm_storage WHERE key = ?", (str_key,)) as cursor:
+                exists = await cursor.fetchone()
+            if exists:
+                await db.execute("UPDATE fsm_storage SET data = ? WHERE key = ?", (json.dumps(data), str_key))
+            else:
+                await db.execute(
+                    "INSERT INTO fsm_storage (key, state, data) VALUES (?, ?, ?)",
+                    (str_key, None, json.dumps(data))
+                )
+            await db.commit()
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        await self._legacy_init()
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                "SELECT data FROM fsm_storage WHERE key = ?", (self._create_key(key),)
+            ) as cursor:
+                result = await cursor.fetchone()
+        return json.loads(result[0]) if result else {}
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        await self._legacy_init()
+        current_data = await self.get_data(key)
+        current_data.update(data)
+        await self.set_data(key, current_data)
+        return current_data
+
+
+async def simulate_update(storage: SQLiteStorage, key: StorageKey, step: int) -> None:
+    """Имитирует обработку одного апдейта в хендлере регистрации"""
+    await storage.get_state(key)
+    data = await storage.get_data(key)
+    selected = data.get("selected_interests", [])
+    selected.append(step)
+    await storage.update_data(key, {"selected_interests": selected[-3:]})
+    await storage.set_state(key, RegistrationStates.waiting_for_interests)
+
+
+async def run_storage(storage: SQLiteStorage, users: int, steps: int, concurrency: int) -> float:
+    """Прогоняет нагрузку и возвращает количество апдейтов в секунду"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def user_flow(user_id: int):
+        key = StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+        for step in range(steps):
+            async with semaphore:
+                await simulate_update(storage, key, step)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user_flow(user_id) for user_id in range(1, users + 1)))
+    elapsed = time.perf_counter() - started
+    await storage.close()
+    return users * steps / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк хранилища состояний FSM")
+    parser.add_argument("--users", type=int, default=200, help="Количество пользователей")
+    parser.add_argument("--steps", type=int, default=10, help="Апдейтов на пользователя")
+    parser.add_argument("--concurrency", type=int, default=20, help="Одновременно обрабатываемых апдейтов")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        legacy_rate = await run_storage(
+            LegacySQLiteStorage(os.path.join(tmp_dir, "legacy.sqlite3")),
+            args.users, args.steps, args.concurrency
+        )
+        current_rate = await run_storage(
+            SQLiteStorage(os.path.join(tmp_dir, "current.sqlite3")),
+            args.users, args.steps, args.concurrency
+        )
+
+    print(f"Апдейтов: {args.users * args.steps}, параллельно: {args.concurrency}")
+    print(f"Соединение на каждый вызов: {legacy_rate:,.0f} апдейтов/с")
+    print(f"Постоянное соединение:      {current_rate:,.0f} апдейтов/с")
+    print(f"Ускорение: x{current_rate / legacy_rate:.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк стратегий еженедельного подбора пар.
+
+Для каждого размера генерирует пользователей со случайными интересами, форматами,
+расписаниями и недавними партнерами и сравнивает жадный подбор (greedy) с паросочетанием
+максимального веса (max_weight): долю пользователей, получивших пару,
+суммарное число общих интересов в парах и время работы.
+
+Запуск: python -m benchmarks.pairing_strategies --sizes 1000,10000,50000
+"""
+import argparse
+import random
+import time
+
+from database.models import MeetingFormat, TimeSlot, WeekDay
+from services.matching import (
+    CompatibilityIndex, greedy_pairs, interests_to_mask, max_weight_pairs, popcount, schedule_to_mask
+)
+
+INTERESTS_COUNT = 20
+RECENT_PARTNERS = 5
+
+
+def random_schedules(size: int, rng: random.Random):
+    """Случайные расписания: 1-3 дня и один слот; у части пользователей расписание не указано"""
+    days = [day.value for day in WeekDay]
+    slots = [slot.value for slot in TimeSlot]
+    return [
+        schedule_to_mask(",".join(rng.sample(days, rng.randint(1, 3))), rng.choice(slots))
+        if rng.random() > 0.1 else 0
+        for _ in range(size)
+    ]
+
+
+def build_index(size: int, rng: random.Random) -> CompatibilityIndex:
+    """Строит индекс совместимости для случайно сгенерированных пользователей"""
+    masks = [
+        interests_to_mask(rng.sample(range(1, INTERESTS_COUNT + 1), rng.randint(1, 6)))
+        for _ in range(size)
+    ]
+    formats = [
+        rng.choice([None, MeetingFormat.OFFLINE, MeetingFormat.ONLINE, MeetingFormat.ANY])
+        for _ in range(size)
+    ]
+    recent_partners = {
+        user_id: rng.sample(range(size), min(size, RECENT_PARTNERS))
+        for user_id in range(size)
+    }
+    return CompatibilityIndex(range(size), masks, formats, recent_partners, random_schedules(size, rng))
+
+
+def total_score(index: CompatibilityIndex, pairs) -> int:
+    """Суммарное количество общих интересов во всех парах"""
+    if not pairs:
+        return 0
+    first, second = zip(*pairs)
+    return int(popcount(index.masks[list(first)] & index.masks[list(second)]).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк стратегий подбора пар")
+    parser.add_argument("--sizes", default="1000,10000,50000", help="Размеры через запятую")
+    parser.add_argument("--time-budget", type=float, default=60.0, help="Ограничение времени для max_weight, с")
+    parser.add_argument("--seed", type=int, default=1, help="Зерно генератора случайных чисел")
+    args = parser.parse_args()
+
+    strategies = {
+        "greedy": lambda index, rng: greedy_pairs(index, rng=rng),
+        "max_weight": lambda index, rng: max_weight_pairs(index, time_budget=args.time_budget, rng=rng),
+    }
+
+    print(f"{'пользователей':>13}  {'стратегия':<11}{'с парой':>9}{'общих интересов':>17}{'время, с':>10}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        index = build_index(size, random.Random(args.seed))
+        for name, strategy in strategies.items():
+            started = time.perf_counter()
+            pairs = strategy(index, random.Random(args.seed))
+            elapsed = time.perf_counter() - started
+
+            match_rate = 2 * len(pairs) / size if size else 0
+            print(
+                f"{size:>13}  {name:<11}{match_rate:>9.1%}"
+                f"{total_score(index, pairs):>17}{elapsed:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Проверка планов горячих запросов к встречам и фидбеку.
+
+Создает схему из моделей в SQLite в памяти, строит запросы так же, как это
+делают сервисы и планировщик, и через EXPLAIN QUERY PLAN проверяет, что каждый
+из них ищет по индексу (SEARCH), а не перебирает таблицу целиком (SCAN).
+Завершается с кодом 1, если хотя бы один запрос использует полный перебор.
+
+Запуск: python -m benchmarks.query_plans
+"""
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import List
+
+from sqlalchemy import and_, create_engine, exists, or_, select
+from sqlalchemy.engine import Connection
+
+from database.models import (
+    Base, CandidateCache, Feedback, Meeting, MeetingFormat, OutboxMessage, OutboxStatus, PairHistory, User
+)
+from services.candidate_search_service import build_candidates_query
+
+USER_ID = 100001
+NOW = datetime(2024, 1, 1, 12, 0)
+
+
+def hot_queries():
+    """Возвращает пары (название, запрос) для проверки"""
+    user_meetings = select(Meeting).where(
+        or_(Meeting.user1_id == USER_ID, Meeting.user2_id == USER_ID)
+    )
+
+    return [
+        # services.meeting_service.get_user_meetings
+        ("встречи пользователя", user_meetings.order_by(Meeting.created_at.desc())),
+        # services.pair_history_service.get_recent_partners для одного пользователя
+        ("недавние собеседники", select(PairHistory.user_low_id, PairHistory.user_high_id).where(
+            and_(
+                PairHistory.last_met_at >= NOW - timedelta(weeks=8),
+                or_(PairHistory.user_low_id.in_([USER_ID]), PairHistory.user_high_id.in_([USER_ID]))
+            )
+        )),
+        # services.pair_history_service.has_met_recently
+        ("история пары", select(PairHistory.last_met_at).where(
+            and_(PairHistory.user_low_id == USER_ID, PairHistory.user_high_id == USER_ID + 1)
+        )),
+        # services.candidate_cache_service.get_cached_candidates
+        ("страница кэша кандидатов", select(User, CandidateCache.rank)
+            .join(CandidateCache, CandidateCache.candidate_id == User.telegram_id)
+            .where(CandidateCache.user_id == USER_ID, CandidateCache.rank > 3)
+            .order_by(CandidateCache.rank)
+            .limit(3)),
+        # services.candidate_search_service.search_candidates
+        ("кандидаты в SQL", build_candidates_query(
+            SimpleNamespace(telegram_id=USER_ID, meeting_format=MeetingFormat.ONLINE, schedule_mask=0b11),
+            30,
+            now=NOW
+        )),
+        # services.candidate_cache_service.invalidate_user
+        ("инвалидация кэша кандидатов", select(CandidateCache).where(
+            or_(CandidateCache.user_id == USER_ID, CandidateCache.candidate_id == USER_ID)
+        )),
+        # services.reminder_service.ReminderTimers._load
+        ("встречи для напоминания", select(Meeting).where(
+            Meeting.scheduled_date >= NOW,
+            Meeting.is_completed == False,
+            Meeting.is_cancelled == False,
+            or_(Meeting.reminder_sent == False, Meeting.reminder_sent.is_(None))
+        )),
+        # scheduler.check_feedback_job
+        ("встречи для запроса фидбека", select(Meeting).where(
+            and_(
+                Meeting.scheduled_date >= NOW - timedelta(days=1),
+                Meeting.scheduled_date <= NOW,
+                Meeting.is_completed == False,
+                Meeting.is_cancelled == False,
+                Meeting.feedback_requested == False
+            )
+        )),
+        # services.outbox_service.dispatch_outbox
+        ("очередь исходящих сообщений", select(OutboxMessage)
+            .where(OutboxMessage.status == OutboxStatus.PENDING, OutboxMessage.next_attempt_at <= NOW)
+            .order_by(OutboxMessage.next_attempt_at, OutboxMessage.id)
+            .limit(500)),
+        # services.meeting_service.get_pending_feedback_meetings
+        ("встречи пользователя без фидбека", user_meetings.where(
+            Meeting.scheduled_date < NOW,
+            ~exists().where(Feedback.meeting_id == Meeting.id, Feedback.from_user_id == USER_ID)
+        )),
+    ]
+
+
+def explain(conn: Connection, query) -> List[str]:
+    """Возвращает строки EXPLAIN QUERY PLAN для запроса"""
+    compiled = query.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    # Значения параметров не влияют на выбор индекса, поэтому передаем NULL
+    params = tuple(None for _ in compiled.positiontup)
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).fetchall()
+    return [row[-1] for row in rows]
+
+
+def main():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+
+    failed = 0
+    with engine.connect() as conn:
+        for name, query in hot_queries():
+            plan = explain(conn, query)
+            # Перебор материализованного подзапроса допустим, полный перебор таблицы - нет
+            full_scans = [step for step in plan if step.startswith("SCAN ") and step.split()[1] in Base.metadata.tables]
+            status = "ПОЛНЫЙ ПЕРЕБОР" if full_scans else "ok"
+            print(f"[{status}] {name}")
+            for step in plan:
+                print(f"    {step}")
+            if full_scans:
+                failed += 1
+
+    if failed:
+        print(f"Запросов без индекса: {failed}")
+        sys.exit(1)
+    print("Все горячие запросы используют индексы")
+
+
+if __name__ == "__main__":
+    main()
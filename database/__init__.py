@@ -1,15 +1,22 @@
 from database.db import init_db, get_session, async_session_maker
+from database.lazy_session import LazySession
 from database.models import User, Meeting, Feedback, MeetingFormat, TopicType
 from database.state_storage import SQLiteStorage
+from database.sharded_storage import ShardedSQLiteStorage, create_sqlite_storage
+from database.cached_storage import CachedStorage
 
 __all__ = [
     'init_db', 
     'get_session', 
     'async_session_maker',
+    'LazySession',
     'User', 
     'Meeting', 
     'Feedback', 
     'MeetingFormat', 
     'TopicType',
-    'SQLiteStorage'
+    'SQLiteStorage',
+    'ShardedSQLiteStorage',
+    'create_sqlite_storage',
+    'CachedStorage'
 ] 
\ No newline at end of file
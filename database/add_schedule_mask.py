@@ -0,0 +1,77 @@
+"""
+Скрипт для добавления и заполнения колонки users.schedule_mask.
+
+Маска расписания (5 дней x 5 слотов) собирается из строк available_days
+и available_time_slot. Скрипт добавляет колонку, если ее нет, и обновляет
+маски, которые не совпадают со строками, поэтому его можно запускать повторно.
+"""
+import asyncio
+import logging
+
+from sqlalchemy import bindparam, inspect, select, update
+
+from database.db import engine
+from database.models import User
+from services.matching.schedule import schedule_to_mask
+
+logger = logging.getLogger(__name__)
+
+
+def _add_column(sync_conn) -> bool:
+    """Добавляет колонку schedule_mask, если ее еще нет"""
+    columns = {column["name"] for column in inspect(sync_conn).get_columns("users")}
+    if "schedule_mask" in columns:
+        return False
+
+    logger.info("Добавление колонки schedule_mask в таблицу users")
+    sync_conn.exec_driver_sql("ALTER TABLE users ADD COLUMN schedule_mask INTEGER NOT NULL DEFAULT 0")
+    return True
+
+
+async def add_schedule_mask() -> int:
+    """
+    Добавляет колонку schedule_mask и заполняет ее по строкам расписания.
+
+    :return: Количество обновленных пользователей
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(_add_column)
+
+        result = await conn.execute(
+            select(User.telegram_id, User.available_days, User.available_time_slot, User.schedule_mask)
+        )
+        changed = [
+            {"user_id": telegram_id, "mask": mask}
+            for telegram_id, available_days, time_slot, current_mask in result
+            if (mask := schedule_to_mask(available_days, time_slot)) != current_mask
+        ]
+
+        if changed:
+            await conn.execute(
+                update(User.__table__)
+                .where(User.__table__.c.telegram_id == bindparam("user_id"))
+                .values(schedule_mask=bindparam("mask")),
+                changed
+            )
+
+    logger.info(f"Обновлено масок расписания: {len(changed)}")
+    return len(changed)
+
+
+def main():
+    """
+    Главная функция скрипта.
+    """
+    # Настройка логирования
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    logger.info("Начало заполнения масок расписания...")
+    asyncio.run(add_schedule_mask())
+    logger.info("Заполнение масок расписания завершено")
+
+
+if __name__ == "__main__":
+    main()
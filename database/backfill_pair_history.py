@@ -0,0 +1,73 @@
+"""
+Скрипт для заполнения таблицы pair_history по уже созданным встречам.
+
+Для каждой пары (меньший ID, больший ID) сохраняет дату последней встречи
+и количество встреч. Таблица заполняется только если она пуста, поэтому
+скрипт можно запускать повторно.
+"""
+import asyncio
+import logging
+
+from sqlalchemy import case, func, insert, select
+
+from database.db import engine
+from database.models import Meeting, PairHistory
+
+logger = logging.getLogger(__name__)
+
+
+async def backfill_pair_history() -> int:
+    """
+    Заполняет таблицу pair_history по таблице meetings одним запросом INSERT ... SELECT.
+
+    :return: Количество добавленных пар
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(PairHistory.__table__.create, checkfirst=True)
+
+        existing = await conn.scalar(select(func.count()).select_from(PairHistory))
+        if existing:
+            logger.info("Таблица pair_history уже заполнена")
+            return 0
+
+        user_low_id = case((Meeting.user1_id < Meeting.user2_id, Meeting.user1_id), else_=Meeting.user2_id)
+        user_high_id = case((Meeting.user1_id < Meeting.user2_id, Meeting.user2_id), else_=Meeting.user1_id)
+        pairs = (
+            select(
+                user_low_id,
+                user_high_id,
+                func.coalesce(func.max(Meeting.created_at), func.current_timestamp()),
+                func.count()
+            )
+            .where(Meeting.user1_id != Meeting.user2_id)
+            .group_by(user_low_id, user_high_id)
+        )
+
+        result = await conn.execute(
+            insert(PairHistory).from_select(
+                ["user_low_id", "user_high_id", "last_met_at", "meetings_count"],
+                pairs
+            )
+        )
+
+    logger.info(f"Добавлено пар в pair_history: {result.rowcount}")
+    return result.rowcount
+
+
+def main():
+    """
+    Главная функция скрипта.
+    """
+    # Настройка логирования
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    logger.info("Начало заполнения pair_history...")
+    asyncio.run(backfill_pair_history())
+    logger.info("Заполнение pair_history завершено")
+
+
+if __name__ == "__main__":
+    main()
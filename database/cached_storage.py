@@ -0,0 +1,282 @@
+import asyncio
+import copy
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Union
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from database.sharded_storage import ShardedSQLiteStorage
+from database.state_storage import SQLiteStorage
+
+logger = logging.getLogger(__name__)
+
+# Примерные накладные расходы на одну запись кэша (ключ, словарь, служебные поля)
+ENTRY_OVERHEAD_BYTES = 256
+
+
+@dataclass
+class _CacheEntry:
+    """Запись кэша: состояние и данные одного ключа FSM"""
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    size: int = ENTRY_OVERHEAD_BYTES
+    # Номер версии растет при каждой записи, чтобы сброс не затер более свежие изменения
+    version: int = 0
+    # Время последнего обращения к записи (для истечения вместе с TTL хранилища)
+    accessed_at: float = field(default_factory=time.monotonic)
+    # Когда запись последний раз совпадала с базой (загружена или сброшена)
+    synced_at: float = field(default_factory=time.monotonic)
+
+
+class CachedStorage(BaseStorage):
+    """
+    Кэширующее хранилище FSM с отложенной записью поверх SQLiteStorage
+    (или ShardedSQLiteStorage).
+
+    Чтения обслуживаются из памяти, записи накапливаются по ключу и сбрасываются
+    в базу пачками по таймеру и при закрытии. При превышении лимита по числу записей
+    или по памяти вытесняются давно не использовавшиеся ключи (LRU).
+
+    Изменения, внесенные в fsm_storage другим процессом (например, state_utils.py
+    clear или expire при работающем боте), становятся видны не позже чем через
+    max_age секунд: сохраненная запись, не совпадавшая с базой дольше max_age,
+    перечитывается при следующем обращении. Несохраненные изменения ключа
+    (пользователь как раз отвечает боту) имеют приоритет и перезапишут базу.
+
+    :param max_age: Через сколько секунд перечитывать сохраненные записи из базы
+        (None или 0 - не перечитывать, бот считается единственным писателем)
+    """
+
+    def __init__(
+        self,
+        storage: Union[SQLiteStorage, ShardedSQLiteStorage],
+        max_entries: int = 10000,
+        max_bytes: int = 32 * 1024 * 1024,
+        flush_interval: float = 1.0,
+        max_age: Optional[float] = 30.0
+    ):
+        self.storage = storage
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.max_age = max_age
+
+        self._entries: "OrderedDict[StorageKey, _CacheEntry]" = OrderedDict()
+        self._dirty: Set[StorageKey] = set()
+        self._size = 0
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def open(self) -> None:
+        """Открывает нижележащее хранилище и запускает фоновый сброс"""
+        await self.storage.open()
+        self._ensure_flusher()
+
+    def _ensure_flusher(self) -> None:
+        """Запускает фоновую задачу сброса, если она еще не запущена"""
+        if self._flush_task is None and not self._closed:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        """Периодически сбрасывает накопленные изменения в базу"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка при сбросе кэша состояний: {e}", exc_info=True)
+            self._drop_expired()
+
+    def _drop_expired(self) -> None:
+        """
+        Убирает из кэша сохраненные записи, к которым не обращались дольше TTL хранилища,
+        чтобы не отдавать состояния, уже удаленные фоновой очисткой
+        """
+        if not self.storage.state_ttl:
+            return
+
+        threshold = time.monotonic() - self.storage.state_ttl
+        # Записи упорядочены по времени обращения, поэтому идем с самых старых
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.accessed_at >= threshold or key in self._dirty:
+                break
+            self._entries.popitem(last=False)
+            self._size -= entry.size
+
+    @staticmethod
+    def _estimate_size(state: Optional[str], data: Dict[str, Any]) -> int:
+        """Оценивает объем памяти, занимаемый записью"""
+        size = ENTRY_OVERHEAD_BYTES + len(json.dumps(data, default=str))
+        if state:
+            size += len(state)
+        return size
+
+    async def _get_entry(self, key: StorageKey) -> _CacheEntry:
+        """Возвращает запись из кэша, при промахе или устаревании загружая ее из базы"""
+        entry = self._entries.get(key)
+        if entry is not None and self._is_stale(key, entry):
+            # Запись могла измениться в базе другим процессом - перечитываем
+            del self._entries[key]
+            self._size -= entry.size
+            entry = None
+        if entry is not None:
+            self._entries.move_to_end(key)
+            entry.accessed_at = time.monotonic()
+            return entry
+
+        state, data = await self.storage.get_record(key)
+
+        # Пока шло чтение, запись могла появиться из параллельного апдейта
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            entry.accessed_at = time.monotonic()
+            return entry
+
+        entry = _CacheEntry(state=state, data=data, size=self._estimate_size(state, data))
+        self._entries[key] = entry
+        self._size += entry.size
+        await self._evict()
+        return entry
+
+    def _is_stale(self, key: StorageKey, entry: _CacheEntry) -> bool:
+        """Сохраненная запись не сверялась с базой дольше max_age"""
+        return bool(self.max_age) and key not in self._dirty and time.monotonic() - entry.synced_at > self.max_age
+
+    def _touch(self, key: StorageKey, entry: _CacheEntry) -> None:
+        """Отмечает запись измененной и пересчитывает ее размер"""
+        new_size = self._estimate_size(entry.state, entry.data)
+        self._size += new_size - entry.size
+        entry.size = new_size
+        entry.version += 1
+        self._dirty.add(key)
+        self._ensure_flusher()
+
+    async def _evict(self) -> None:
+        """Вытесняет самые старые записи, пока кэш не уложится в лимиты"""
+        victims = []
+        while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+            key, entry = self._entries.popitem(last=False)
+            self._size -= entry.size
+            if key in self._dirty:
+                self._dirty.discard(key)
+                victims.append((key, entry.state, entry.data))
+
+        # Несохраненные изменения вытесненных записей пишем сразу, чтобы не потерять их
+        if victims:
+            await self.storage.write_records(victims)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        """Устанавливает состояние для ключа"""
+        entry = await self._get_entry(key)
+        entry.state = state.state if isinstance(state, State) else state
+        self._touch(key, entry)
+        await self._evict()
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        """Получает текущее состояние по ключу"""
+        entry = await self._get_entry(key)
+        return entry.state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        """Устанавливает данные для ключа"""
+        entry = await self._get_entry(key)
+        entry.data = copy.deepcopy(data)
+        self._touch(key, entry)
+        await self._evict()
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        """Получает данные по ключу"""
+        entry = await self._get_entry(key)
+        # Отдаем копию, чтобы изменения в хендлере не попадали в кэш в обход set_data
+        return copy.deepcopy(entry.data)
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Обновляет данные для ключа"""
+        entry = await self._get_entry(key)
+        entry.data.update(copy.deepcopy(data))
+        self._touch(key, entry)
+        await self._evict()
+        return copy.deepcopy(entry.data)
+
+    async def reset_all(self, key: StorageKey) -> None:
+        """Сбрасывает и состояние, и данные для ключа"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry.size
+        self._dirty.discard(key)
+        await self.storage.reset_all(key)
+
+    async def delete_user(self, user_id: int) -> int:
+        """Удаляет все записи пользователя из кэша и из базы"""
+        for key in [key for key in self._entries if key.user_id == user_id]:
+            entry = self._entries.pop(key)
+            self._size -= entry.size
+            self._dirty.discard(key)
+        return await self.storage.delete_user(user_id)
+
+    async def flush(self) -> None:
+        """Сбрасывает все накопленные изменения в базу одной пачкой"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+
+            batch = []
+            versions = {}
+            for key in self._dirty:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                batch.append((key, entry.state, copy.deepcopy(entry.data)))
+                versions[key] = entry.version
+            self._dirty.clear()
+
+            try:
+                await self.storage.write_records(batch)
+            except Exception:
+                # Возвращаем ключи в очередь, если их не успели перезаписать заново
+                for key, version in versions.items():
+                    entry = self._entries.get(key)
+                    if entry is not None and entry.version == version:
+                        self._dirty.add(key)
+                raise
+
+            # Записи, не измененные во время сброса, совпадают с базой
+            synced_at = time.monotonic()
+            for key, version in versions.items():
+                entry = self._entries.get(key)
+                if entry is not None and entry.version == version:
+                    entry.synced_at = synced_at
+
+            logger.debug(f"Сброшено {len(batch)} записей кэша состояний")
+
+    async def get_all_states(self) -> List[Dict[str, Any]]:
+        """Получает все состояния из хранилища (после сброса кэша)"""
+        await self.flush()
+        return await self.storage.get_all_states()
+
+    async def close(self) -> None:
+        """Останавливает фоновый сброс, сохраняет изменения и закрывает хранилище"""
+        if self._closed:
+            return
+        self._closed = True
+
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+
+        try:
+            await self.flush()
+        finally:
+            await self.storage.close()
@@ -0,0 +1,76 @@
+"""
+Скрипт для создания индексов, объявленных в моделях, в существующей базе данных.
+
+Base.metadata.create_all не добавляет индексы к уже созданным таблицам,
+поэтому для баз, созданных до появления индексов, их нужно построить отдельно.
+Скрипт можно запускать повторно: существующие индексы пропускаются.
+"""
+import asyncio
+import logging
+
+from sqlalchemy import inspect
+
+from database.db import DATABASE_URL, engine
+from database.models import Base
+
+logger = logging.getLogger(__name__)
+
+
+def _create_missing_indexes(sync_conn) -> int:
+    """Создает отсутствующие индексы для всех существующих таблиц"""
+    inspector = inspect(sync_conn)
+    existing_tables = set(inspector.get_table_names())
+    created = 0
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            logger.info(f"Создание индекса {index.name} для таблицы {table.name}")
+            index.create(sync_conn)
+            created += 1
+
+    # Обновляем статистику, чтобы планировщик SQLite сразу начал выбирать новые индексы
+    if created and DATABASE_URL.startswith("sqlite"):
+        sync_conn.exec_driver_sql("ANALYZE")
+
+    return created
+
+
+async def create_indexes() -> int:
+    """
+    Создает недостающие индексы в базе данных.
+
+    :return: Количество созданных индексов
+    """
+    async with engine.begin() as conn:
+        created = await conn.run_sync(_create_missing_indexes)
+
+    if created:
+        logger.info(f"Создано индексов: {created}")
+    else:
+        logger.info("Все индексы уже существуют")
+    return created
+
+
+def main():
+    """
+    Главная функция скрипта.
+    """
+    # Настройка логирования
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    logger.info("Начало создания индексов...")
+    asyncio.run(create_indexes())
+    logger.info("Создание индексов завершено")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,15 @@
+import logging
 import os
 from typing import AsyncGenerator
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker, async_scoped_session
 from sqlalchemy.orm import sessionmaker
 
 from database.models import Base
+from database.sqlite_profile import SQLiteProfile, get_profile
+
+logger = logging.getLogger(__name__)
 
 # Получаем URL базы данных из переменных окружения
 # По умолчанию используем SQLite
@@ -21,6 +26,24 @@ engine = create_async_engine(
     pool_recycle=3600
 )
 
+
+
+def get_sqlite_profile() -> SQLiteProfile:
+    """
+    Возвращает профиль PRAGMA для соединений SQLite из переменной SQLITE_PROFILE
+    (off, balanced или performance).
+    Переменная читается при вызове, поэтому учитываются значения из .env,
+    загруженного после импорта модуля.
+    """
+    return get_profile(os.getenv("SQLITE_PROFILE", "balanced"))
+
+
+if DATABASE_URL.startswith("sqlite"):
+    @event.listens_for(engine.sync_engine, "connect")
+    def _apply_sqlite_profile(dbapi_connection, connection_record):
+        """Применяет профиль SQLite к каждому новому соединению пула"""
+        get_sqlite_profile().apply(dbapi_connection)
+
 # Создаем фабрику сессий
 async_session_maker = async_sessionmaker(
     engine, 
@@ -41,4 +64,15 @@ async def init_db():
     Инициализация базы данных (создание всех таблиц).
     """
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all) 
\ No newline at end of file
+        await conn.run_sync(Base.metadata.create_all)
+
+    if DATABASE_URL.startswith("sqlite"):
+        # Читаем фактические значения: например, WAL не включится для базы в памяти
+        async with engine.connect() as conn:
+            applied = {}
+            for pragma in ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size"):
+                applied[pragma] = (await conn.exec_driver_sql(f"PRAGMA {pragma}")).scalar()
+        logger.info(
+            f"Профиль SQLite {get_sqlite_profile().describe()}, применено: "
+            + ", ".join(f"{name}={value}" for name, value in applied.items())
+        )
@@ -0,0 +1,103 @@
+"""
+Кодеки для данных FSM, хранящихся в колонке data таблицы fsm_storage.
+
+Каждое закодированное значение начинается с байта версии, по которому при чтении
+выбирается кодек. Поэтому смена кодека не требует миграции: старые записи
+читаются своим кодеком, новые пишутся текущим. Строки, записанные до появления
+кодеков (TEXT с JSON), читаются как JSON.
+"""
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Union
+
+
+class FSMCodec(ABC):
+    """Базовый класс кодека данных FSM"""
+
+    # Байт версии, с которого начинается закодированное значение
+    version: int = 0
+    name: str = ""
+
+    def dumps(self, data: Dict[str, Any]) -> bytes:
+        """Кодирует данные вместе с байтом версии"""
+        return bytes((self.version,)) + self._dumps(data)
+
+    @abstractmethod
+    def _dumps(self, data: Dict[str, Any]) -> bytes:
+        """Кодирует данные без байта версии"""
+
+    @abstractmethod
+    def loads(self, payload: bytes) -> Dict[str, Any]:
+        """Декодирует данные без байта версии"""
+
+
+class JsonCodec(FSMCodec):
+    """Компактный JSON (без пробелов, UTF-8 без экранирования)"""
+
+    version = 1
+    name = "json"
+
+    def _dumps(self, data: Dict[str, Any]) -> bytes:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, payload: bytes) -> Dict[str, Any]:
+        return json.loads(payload)
+
+
+class MsgpackCodec(FSMCodec):
+    """
+    Двоичный формат MessagePack: меньше размер и быстрее разбор списков чисел
+    (potential_matches, selected_interests)
+    """
+
+    version = 2
+    name = "msgpack"
+
+    def __init__(self):
+        # Импортируем здесь, чтобы msgpack был нужен только при использовании этого кодека
+        import msgpack
+        self._packb = msgpack.packb
+        self._unpackb = msgpack.unpackb
+
+    def _dumps(self, data: Dict[str, Any]) -> bytes:
+        return self._packb(data, use_bin_type=True)
+
+    def loads(self, payload: bytes) -> Dict[str, Any]:
+        return self._unpackb(payload, raw=False, strict_map_key=False)
+
+
+CODECS = {
+    JsonCodec.name: JsonCodec,
+    MsgpackCodec.name: MsgpackCodec,
+}
+
+# Экземпляры кодеков по байту версии (создаются при первом чтении)
+_decoders: Dict[int, FSMCodec] = {}
+
+
+def get_codec(name: str = "json") -> FSMCodec:
+    """Возвращает кодек по имени ("json" или "msgpack")"""
+    try:
+        codec_class = CODECS[name]
+    except KeyError:
+        raise ValueError(f"Неизвестный кодек данных FSM: {name}")
+    return codec_class()
+
+
+def decode_data(value: Union[str, bytes]) -> Dict[str, Any]:
+    """Декодирует значение колонки data любой версии"""
+    # Записи старого формата хранятся как текст с JSON
+    if isinstance(value, str):
+        return json.loads(value)
+
+    version = value[0]
+    decoder = _decoders.get(version)
+    if decoder is None:
+        for codec_class in CODECS.values():
+            if codec_class.version == version:
+                decoder = _decoders[version] = codec_class()
+                break
+        else:
+            raise ValueError(f"Неизвестная версия кодека данных FSM: {version}")
+
+    return decoder.loads(value[1:])
@@ -0,0 +1,48 @@
+from typing import Any, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+
+class LazySession:
+    """
+    Ленивая обертка над AsyncSession для хендлеров.
+
+    Сессия (и соединение из пула) создается только при первом обращении
+    к любому методу или атрибуту AsyncSession, поэтому апдейты, не работающие
+    с базой (помощь, отмена), соединение не занимают.
+
+    release() закрывает сессию и возвращает соединение в пул. Хендлер вызывает
+    его, закончив работу с базой, перед медленными запросами к Telegram.
+    Загруженные объекты остаются доступными (expire_on_commit=False), а при
+    следующем обращении к базе будет открыта новая сессия.
+    Незакоммиченные изменения при release() отбрасываются.
+    """
+
+    def __init__(self, session_maker: async_sessionmaker):
+        self._session_maker = session_maker
+        self._session: Optional[AsyncSession] = None
+
+    @property
+    def acquired(self) -> bool:
+        """Открыта ли сейчас сессия"""
+        return self._session is not None
+
+    def _get_session(self) -> AsyncSession:
+        """Возвращает текущую сессию, создавая ее при первом обращении"""
+        if self._session is None:
+            self._session = self._session_maker()
+        return self._session
+
+    def __getattr__(self, name: str) -> Any:
+        # Служебные атрибуты не проксируем, чтобы не открывать сессию при интроспекции
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._get_session(), name)
+
+    async def release(self) -> None:
+        """Закрывает сессию и возвращает соединение в пул, если сессия была открыта"""
+        if self._session is None:
+            return
+
+        session, self._session = self._session, None
+        await session.close()
@@ -4,7 +4,7 @@ from typing import List, Optional
 
 from sqlalchemy import (
     BigInteger, Boolean, Column, DateTime, Enum as SQLAlchemyEnum,
-    ForeignKey, Integer, String, Table, Text, Float
+    ForeignKey, Index, Integer, String, Table, Text, Float, and_
 )
 from sqlalchemy.orm import relationship, DeclarativeBase
 
@@ -42,6 +42,12 @@ class TimeSlot(str, Enum):
     SLOT_16_18 = "16:00-18:00"
 
 
+class OutboxStatus(str, Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
 # Ассоциативная таблица для связи пользователей и интересов
 user_topics = Table(
     "user_topics",
@@ -56,7 +62,9 @@ user_interests = Table(
     'user_interests',
     Base.metadata,
     Column('user_id', BigInteger, ForeignKey('users.telegram_id'), primary_key=True),
-    Column('interest_id', Integer, ForeignKey('interests.id'), primary_key=True)
+    Column('interest_id', Integer, ForeignKey('interests.id'), primary_key=True),
+    # Пользователи с заданным интересом (подсчет общих интересов в SQL)
+    Index('ix_user_interests_interest_user', 'interest_id', 'user_id')
 )
 
 
@@ -73,6 +81,7 @@ class User(Base):
     office = Column(String(255), nullable=True)
     available_days = Column(String(255), nullable=True)  # Хранит список дней в виде строки (разделенной запятыми)
     available_time_slot = Column(String(255), nullable=True)  # Хранит выбранный временной слот
+    schedule_mask = Column(Integer, nullable=False, default=0, server_default="0")  # Маска 5x5 дней и слотов (services.matching.schedule)
     work_hours_start = Column(String(5), nullable=True)  # Время начала рабочего дня (формат "ЧЧ:ММ")
     work_hours_end = Column(String(5), nullable=True)  # Время окончания рабочего дня (формат "ЧЧ:ММ")
     photo_id = Column(String(255), nullable=True)
@@ -129,6 +138,20 @@ class Meeting(Base):
     user2 = relationship("User", foreign_keys=[user2_id], back_populates="meetings_as_user2")
     feedbacks = relationship("Feedback", back_populates="meeting")
 
+    __table_args__ = (
+        # Встречи пользователя: WHERE user1_id = ? OR user2_id = ? ORDER BY created_at
+        Index("ix_meetings_user1_created", "user1_id", "created_at"),
+        Index("ix_meetings_user2_created", "user2_id", "created_at"),
+        # Активные встречи по дате (напоминания и запросы фидбека в планировщике).
+        # Частичный индекс: завершенные и отмененные встречи в него не попадают
+        Index(
+            "ix_meetings_open_scheduled",
+            "scheduled_date",
+            sqlite_where=and_(is_completed == False, is_cancelled == False),
+            postgresql_where=and_(is_completed == False, is_cancelled == False),
+        ),
+    )
+
     def __repr__(self):
         return f"<Meeting(id={self.id}, user1_id={self.user1_id}, user2_id={self.user2_id}, date={self.scheduled_date})>"
 
@@ -150,6 +173,11 @@ class Feedback(Base):
     from_user = relationship("User", foreign_keys=[from_user_id], back_populates="feedbacks_given")
     to_user = relationship("User", foreign_keys=[to_user_id], back_populates="feedbacks_received")
 
+    __table_args__ = (
+        # Проверка, оставил ли пользователь фидбек по встрече
+        Index("ix_feedbacks_meeting_from_user", "meeting_id", "from_user_id"),
+    )
+
     def __repr__(self):
         return f"<Feedback(id={self.id}, meeting_id={self.meeting_id}, from_user_id={self.from_user_id}, rating={self.rating})>"
 
@@ -162,4 +190,82 @@ class Interest(Base):
     emoji = Column(String, nullable=True)
     
     # Связь с пользователями (many-to-many)
-    users = relationship("User", secondary=user_interests, back_populates="interests") 
\ No newline at end of file
+    users = relationship("User", secondary=user_interests, back_populates="interests") 
+
+
+class PairHistory(Base):
+    """
+    История встреч пары пользователей для быстрой проверки "встречались недавно".
+    Пара хранится в нормализованном виде: user_low_id < user_high_id.
+    """
+    __tablename__ = "pair_history"
+
+    user_low_id = Column(BigInteger, ForeignKey("users.telegram_id"), primary_key=True)
+    user_high_id = Column(BigInteger, ForeignKey("users.telegram_id"), primary_key=True)
+    last_met_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    meetings_count = Column(Integer, nullable=False, default=1)
+
+    __table_args__ = (
+        # Поиск пар пользователя по второй половине ключа (первая покрыта первичным ключом)
+        Index("ix_pair_history_user_high", "user_high_id", "last_met_at"),
+        # Выборка всех пар, встречавшихся в окне исключения
+        Index("ix_pair_history_last_met_at", "last_met_at"),
+    )
+
+    def __repr__(self):
+        return f"<PairHistory(users=({self.user_low_id}, {self.user_high_id}), last_met_at={self.last_met_at}, count={self.meetings_count})>"
+
+
+
+class CandidateCache(Base):
+    """
+    Предрассчитанные лучшие кандидаты для /find: для каждого пользователя
+    список собеседников по убыванию оценки (rank 1 - лучший). Пустой список
+    отмечается строкой с rank 0 и candidate_id, равным user_id.
+    """
+    __tablename__ = "candidate_cache"
+
+    user_id = Column(BigInteger, ForeignKey("users.telegram_id"), primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    candidate_id = Column(BigInteger, ForeignKey("users.telegram_id"), nullable=False)
+    score = Column(Integer, nullable=False)
+    computed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Инвалидация: удаление пользователя из списков других пользователей
+        Index("ix_candidate_cache_candidate", "candidate_id"),
+    )
+
+    def __repr__(self):
+        return f"<CandidateCache(user_id={self.user_id}, rank={self.rank}, candidate_id={self.candidate_id}, score={self.score})>"
+
+
+class OutboxMessage(Base):
+    """
+    Исходящее сообщение, ожидающее отправки (transactional outbox).
+    Записывается в той же транзакции, что и встречи, и отправляется
+    фоновым диспетчером (services.outbox_service) с повторами.
+    """
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True)
+    # Ключ идемпотентности: повторная постановка того же сообщения игнорируется
+    idempotency_key = Column(String(255), nullable=False, unique=True)
+    chat_id = Column(BigInteger, nullable=False)
+    payload = Column(Text, nullable=False)  # JSON: text, parse_mode, reply_markup
+    status = Column(SQLAlchemyEnum(OutboxStatus), nullable=False, default=OutboxStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Выборка ожидающих сообщений, которые пора отправить, в порядке времени попытки
+        Index("ix_outbox_status_next_attempt", "status", "next_attempt_at"),
+        # Очистка старых отправленных сообщений
+        Index("ix_outbox_sent_at", "sent_at"),
+    )
+
+    def __repr__(self):
+        return f"<OutboxMessage(id={self.id}, key={self.idempotency_key}, status={self.status}, attempts={self.attempts})>"
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from database.fsm_codecs import FSMCodec
+from database.sqlite_profile import SQLiteProfile
+from database.state_storage import SQLiteStorage
+
+logger = logging.getLogger(__name__)
+
+
+class ShardedSQLiteStorage(BaseStorage):
+    """
+    Хранилище FSM, распределяющее ключи по нескольким файлам SQLite.
+
+    Шард выбирается по user_id (user_id % shards), поэтому все записи одного
+    пользователя лежат в одном файле. Каждый шард - отдельный SQLiteStorage
+    в режиме WAL со своим соединением, так что записи разных пользователей
+    не ждут друг друга и не конкурируют с основной базой бота.
+
+    Количество шардов нельзя менять без переноса данных: ключи окажутся в других файлах.
+    """
+
+    def __init__(
+        self,
+        shard_dir: str = "fsm_storage",
+        shards: int = 4,
+        state_ttl: Optional[float] = None,
+        sweep_interval: float = 3600,
+        codec: Optional[FSMCodec] = None,
+        profile: Optional[SQLiteProfile] = None
+    ):
+        if shards < 1:
+            raise ValueError("Количество шардов должно быть не меньше 1")
+
+        self.shard_dir = shard_dir
+        self.state_ttl = state_ttl
+        os.makedirs(shard_dir, exist_ok=True)
+        self.shards = [
+            SQLiteStorage(
+                os.path.join(shard_dir, f"shard_{index}.sqlite3"),
+                state_ttl=state_ttl,
+                sweep_interval=sweep_interval,
+                wal=True,
+                codec=codec,
+                profile=profile
+            )
+            for index in range(shards)
+        ]
+
+    def _shard_for_user(self, user_id: int) -> SQLiteStorage:
+        """Возвращает шард, в котором хранятся записи пользователя"""
+        return self.shards[user_id % len(self.shards)]
+
+    def _shard(self, key: StorageKey) -> SQLiteStorage:
+        """Возвращает шард для ключа"""
+        return self._shard_for_user(key.user_id)
+
+    async def open(self) -> None:
+        """Открывает соединения со всеми шардами"""
+        await asyncio.gather(*(shard.open() for shard in self.shards))
+        logger.info(f"Хранилище состояний разбито на {len(self.shards)} шардов в {self.shard_dir}")
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        """Устанавливает состояние для ключа"""
+        await self._shard(key).set_state(key, state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        """Получает текущее состояние по ключу"""
+        return await self._shard(key).get_state(key)
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        """Устанавливает данные для ключа"""
+        await self._shard(key).set_data(key, data)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        """Получает данные по ключу"""
+        return await self._shard(key).get_data(key)
+
+    async def get_record(self, key: StorageKey) -> Tuple[Optional[str], Dict[str, Any]]:
+        """Получает состояние и данные по ключу одним запросом"""
+        return await self._shard(key).get_record(key)
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Обновляет данные для ключа"""
+        return await self._shard(key).update_data(key, data)
+
+    async def write_records(self, records: List[Tuple[StorageKey, Optional[str], Dict[str, Any]]]) -> None:
+        """Записывает пачку записей, параллельно по шардам"""
+        by_shard = defaultdict(list)
+        for record in records:
+            by_shard[self._shard(record[0])].append(record)
+
+        await asyncio.gather(*(shard.write_records(batch) for shard, batch in by_shard.items()))
+
+    async def reset_state(self, key: StorageKey) -> None:
+        """Сбрасывает состояние для ключа (устанавливает в None)"""
+        await self._shard(key).reset_state(key)
+
+    async def reset_data(self, key: StorageKey) -> None:
+        """Сбрасывает данные для ключа (устанавливает пустой словарь)"""
+        await self._shard(key).reset_data(key)
+
+    async def reset_all(self, key: StorageKey) -> None:
+        """Сбрасывает и состояние, и данные для ключа"""
+        await self._shard(key).reset_all(key)
+
+    async def delete_user(self, user_id: int) -> int:
+        """Удаляет все записи пользователя (только в его шарде)"""
+        return await self._shard_for_user(user_id).delete_user(user_id)
+
+    async def clear_all(self) -> int:
+        """Удаляет все записи во всех шардах"""
+        return sum(await asyncio.gather(*(shard.clear_all() for shard in self.shards)))
+
+    async def expire_stale(self, ttl: float) -> int:
+        """Удаляет устаревшие записи во всех шардах"""
+        return sum(await asyncio.gather(*(shard.expire_stale(ttl) for shard in self.shards)))
+
+    async def iter_states(
+        self,
+        state: Optional[str] = None,
+        user_id: Optional[int] = None,
+        older_than: Optional[float] = None,
+        limit: Optional[int] = None,
+        page_size: int = 500
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Постранично перебирает записи, обходя шарды по очереди"""
+        shards = [self._shard_for_user(user_id)] if user_id is not None else self.shards
+
+        returned = 0
+        for shard in shards:
+            shard_limit = None if limit is None else limit - returned
+            if shard_limit is not None and shard_limit <= 0:
+                break
+
+            async for item in shard.iter_states(state, user_id, older_than, shard_limit, page_size):
+                returned += 1
+                yield item
+
+    async def count_states(
+        self,
+        user_id: Optional[int] = None,
+        older_than: Optional[float] = None
+    ) -> List[Tuple[Optional[str], int]]:
+        """Суммирует количество записей по состояниям со всех шардов"""
+        shards = [self._shard_for_user(user_id)] if user_id is not None else self.shards
+        results = await asyncio.gather(*(shard.count_states(user_id, older_than) for shard in shards))
+
+        totals: Dict[Optional[str], int] = defaultdict(int)
+        for counts in results:
+            for state, count in counts:
+                totals[state] += count
+
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+    async def get_all_states(self) -> List[Dict[str, Any]]:
+        """Получает все состояния из всех шардов"""
+        return [item async for item in self.iter_states()]
+
+    async def close(self) -> None:
+        """Закрывает соединения со всеми шардами"""
+        await asyncio.gather(*(shard.close() for shard in self.shards))
+
+
+def create_sqlite_storage(
+    db_path: str = "database.sqlite3",
+    shards: int = 0,
+    shard_dir: str = "fsm_storage",
+    state_ttl: Optional[float] = None,
+    codec: Optional[FSMCodec] = None,
+    profile: Optional[SQLiteProfile] = None
+):
+    """
+    Создает хранилище состояний: одиночный файл db_path при shards <= 1
+    или ShardedSQLiteStorage с указанным количеством шардов в shard_dir.
+    """
+    if shards > 1:
+        return ShardedSQLiteStorage(shard_dir, shards, state_ttl=state_ttl, codec=codec, profile=profile)
+    return SQLiteStorage(db_path, state_ttl=state_ttl, codec=codec, profile=profile)
@@ -0,0 +1,89 @@
+"""
+Профили настроек SQLite (PRAGMA), применяемые к каждому новому соединению.
+
+Профиль используется и движком SQLAlchemy (database/db.py), и хранилищем
+состояний FSM (SQLiteStorage), чтобы все соединения к файлам базы работали
+в одном режиме журнала и с одинаковым ожиданием блокировок.
+"""
+from dataclasses import dataclass
+from typing import List, Optional
+
+import aiosqlite
+
+
+@dataclass(frozen=True)
+class SQLiteProfile:
+    """Набор PRAGMA для соединения SQLite (None - оставить значение SQLite по умолчанию)"""
+    name: str
+    journal_mode: Optional[str] = None
+    synchronous: Optional[str] = None
+    # Сколько миллисекунд ждать снятия блокировки, прежде чем вернуть "database is locked"
+    busy_timeout: Optional[int] = None
+    # Размер кэша страниц: отрицательное значение - в килобайтах
+    cache_size: Optional[int] = None
+    mmap_size: Optional[int] = None
+    temp_store: Optional[str] = None
+
+    def pragmas(self) -> List[str]:
+        """Возвращает список PRAGMA для выполнения на новом соединении"""
+        values = [
+            ("journal_mode", self.journal_mode),
+            ("synchronous", self.synchronous),
+            ("busy_timeout", self.busy_timeout),
+            ("cache_size", self.cache_size),
+            ("mmap_size", self.mmap_size),
+            ("temp_store", self.temp_store),
+        ]
+        return [f"PRAGMA {name}={value}" for name, value in values if value is not None]
+
+    def describe(self) -> str:
+        """Возвращает краткое описание профиля для логов"""
+        pragmas = [pragma.replace("PRAGMA ", "") for pragma in self.pragmas()]
+        return f"{self.name} ({', '.join(pragmas) or 'настройки SQLite по умолчанию'})"
+
+    def apply(self, dbapi_connection) -> None:
+        """Применяет профиль к синхронному DBAPI-соединению (событие connect SQLAlchemy)"""
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in self.pragmas():
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    async def apply_async(self, connection: aiosqlite.Connection) -> None:
+        """Применяет профиль к соединению aiosqlite"""
+        for pragma in self.pragmas():
+            await connection.execute(pragma)
+
+
+PROFILES = {
+    # Прежнее поведение: никаких PRAGMA, журнал DELETE
+    "off": SQLiteProfile(name="off"),
+    # WAL, чтобы чтения не блокировали запись, и ожидание блокировок вместо ошибок
+    "balanced": SQLiteProfile(
+        name="balanced",
+        journal_mode="WAL",
+        synchronous="NORMAL",
+        busy_timeout=5000,
+        cache_size=-16000,
+        mmap_size=64 * 1024 * 1024,
+    ),
+    # Для больших баз и тяжелых отчетов: больше кэша и mmap, временные таблицы в памяти
+    "performance": SQLiteProfile(
+        name="performance",
+        journal_mode="WAL",
+        synchronous="NORMAL",
+        busy_timeout=10000,
+        cache_size=-65536,
+        mmap_size=256 * 1024 * 1024,
+        temp_store="MEMORY",
+    ),
+}
+
+
+def get_profile(name: str = "balanced") -> SQLiteProfile:
+    """Возвращает профиль по имени ("off", "balanced" или "performance")"""
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Неизвестный профиль SQLite: {name}")
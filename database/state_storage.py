@@ -1,168 +1,492 @@
-import json
+import asyncio
 import logging
-from typing import Dict, Any, Optional, cast, List
+import time
+from typing import AsyncIterator, Dict, Any, Optional, cast, List, Tuple
 
 from aiogram.fsm.state import State
 from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
 
 import aiosqlite
 
+from database.fsm_codecs import FSMCodec, JsonCodec, decode_data
+from database.sqlite_profile import SQLiteProfile
+
 logger = logging.getLogger(__name__)
 
+# Колонки с частями ключа, которые хранятся отдельно для индексированного поиска
+KEY_COLUMNS = ("bot_id", "chat_id", "user_id", "thread_id")
+
 class SQLiteStorage(BaseStorage):
     """
-    SQLite хранилище для состояний FSM
+    SQLite хранилище для состояний FSM.
+
+    Хранилище держит одно долгоживущее соединение с базой данных, которое
+    открывается при первом обращении (или явно через open()) и закрывается
+    в close() при остановке диспетчера.
+
+    Если задан state_ttl (в секундах), фоновая задача раз в sweep_interval
+    удаляет записи, которые не обновлялись дольше state_ttl, - например,
+    брошенные на середине регистрации или сбора фидбека.
+
+    profile задает PRAGMA, применяемые к соединению (тот же профиль, что и
+    у движка SQLAlchemy). При wal=True соединение в любом случае переводится
+    в режим WAL, чтобы читатели не блокировали запись (используется для
+    отдельных файлов шардов).
+
+    Данные кодируются переданным codec (по умолчанию JSON) и хранятся
+    в колонке data как BLOB с байтом версии кодека; записи, сохраненные
+    другим кодеком или в старом текстовом формате, читаются автоматически.
     """
-    
-    def __init__(self, db_path: str = "database.sqlite3"):
+
+    def __init__(
+        self,
+        db_path: str = "database.sqlite3",
+        state_ttl: Optional[float] = None,
+        sweep_interval: float = 3600,
+        wal: bool = False,
+        codec: Optional[FSMCodec] = None,
+        profile: Optional[SQLiteProfile] = None
+    ):
         self.db_path = db_path
-        
-    async def _init_db(self):
+        self.state_ttl = state_ttl
+        self.sweep_interval = sweep_interval
+        self.wal = wal
+        self.codec = codec or JsonCodec()
+        self.profile = profile
+        self._connection: Optional[aiosqlite.Connection] = None
+        # Защищает открытие соединения от одновременного вызова из нескольких апдейтов
+        self._connect_lock = asyncio.Lock()
+        # Сериализует записи, чтобы commit одного апдейта не захватывал чужие изменения
+        self._write_lock = asyncio.Lock()
+        self._sweep_task: Optional[asyncio.Task] = None
+
+    async def open(self) -> None:
+        """Открывает соединение и создает таблицу (вызывается один раз при старте)"""
+        await self._get_connection()
+
+        if self.state_ttl and self._sweep_task is None:
+            self._sweep_task = asyncio.create_task(self._sweep_loop())
+
+    async def _get_connection(self) -> aiosqlite.Connection:
+        """Возвращает открытое соединение, открывая его при первом обращении"""
+        if self._connection is not None:
+            return self._connection
+
+        async with self._connect_lock:
+            if self._connection is None:
+                connection = await aiosqlite.connect(self.db_path)
+                try:
+                    if self.profile is not None:
+                        await self.profile.apply_async(connection)
+                    if self.wal:
+                        await connection.execute("PRAGMA journal_mode=WAL")
+                        await connection.execute("PRAGMA synchronous=NORMAL")
+                    await self._init_db(connection)
+                except Exception:
+                    await connection.close()
+                    raise
+                self._connection = connection
+                logger.info(f"Открыто соединение с хранилищем состояний {self.db_path}")
+
+        return self._connection
+
+    @classmethod
+    async def _init_db(cls, db: aiosqlite.Connection):
         """Инициализирует таблицу для хранения состояний, если она еще не существует"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS fsm_storage (
-                    key TEXT PRIMARY KEY,
-                    state TEXT NULL,
-                    data TEXT NOT NULL
-                )
-            """)
-            await db.commit()
-    
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS fsm_storage (
+                key TEXT PRIMARY KEY,
+                bot_id INTEGER NULL,
+                chat_id INTEGER NULL,
+                user_id INTEGER NULL,
+                thread_id INTEGER NULL,
+                state TEXT NULL,
+                data BLOB NOT NULL,
+                updated_at INTEGER NULL
+            )
+        """)
+
+        await cls._migrate_key_columns(db)
+
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS ix_fsm_storage_user_id ON fsm_storage (user_id)"
+        )
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS ix_fsm_storage_updated_at ON fsm_storage (updated_at)"
+        )
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS ix_fsm_storage_state ON fsm_storage (state)"
+        )
+        await db.commit()
+
+    @staticmethod
+    async def _migrate_key_columns(db: aiosqlite.Connection):
+        """
+        Добавляет структурированные колонки ключа и updated_at в таблицу старого формата
+        и заполняет их, разбирая строковый ключ
+        """
+        async with db.execute("PRAGMA table_info(fsm_storage)") as cursor:
+            columns = {row[1] for row in await cursor.fetchall()}
+
+        missing = [column for column in KEY_COLUMNS + ("updated_at",) if column not in columns]
+        if not missing:
+            return
+
+        logger.info(f"Добавление колонок {', '.join(missing)} в таблицу fsm_storage")
+        for column in missing:
+            await db.execute(f"ALTER TABLE fsm_storage ADD COLUMN {column} INTEGER NULL")
+
+        rows = []
+        async with db.execute("SELECT key FROM fsm_storage WHERE user_id IS NULL") as cursor:
+            async for (str_key,) in cursor:
+                parts = str_key.split(":")
+                if len(parts) != 4:
+                    continue
+                try:
+                    bot_id, chat_id, user_id, thread_id = (int(part) for part in parts)
+                except ValueError:
+                    continue
+                rows.append((bot_id, chat_id, user_id, thread_id, str_key))
+
+        await db.executemany(
+            "UPDATE fsm_storage SET bot_id = ?, chat_id = ?, user_id = ?, thread_id = ? WHERE key = ?",
+            rows
+        )
+        # Для старых записей отсчитываем срок жизни с момента миграции
+        await db.execute(
+            "UPDATE fsm_storage SET updated_at = ? WHERE updated_at IS NULL",
+            (int(time.time()),)
+        )
+        logger.info(f"Заполнены колонки ключа для {len(rows)} записей fsm_storage")
+
     @staticmethod
     def _create_key(key: StorageKey) -> str:
         """Создает строковый ключ из объекта StorageKey"""
         return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or 0}"
-    
+
+    @classmethod
+    def _key_params(cls, key: StorageKey) -> Tuple[str, int, int, int, int]:
+        """Возвращает строковый ключ и его части для записи в отдельные колонки"""
+        return cls._create_key(key), key.bot_id, key.chat_id, key.user_id, key.thread_id or 0
+
     async def set_state(self, key: StorageKey, state: StateType = None) -> None:
-        """Устанавливает состояние для ключа"""
-        await self._init_db()
-        
-        str_key = self._create_key(key)
-        
+        """Устанавливает состояние для ключа (одним запросом INSERT ... ON CONFLICT)"""
         state_str = state.state if isinstance(state, State) else state
-        
-        async with aiosqlite.connect(self.db_path) as db:
-            # Проверяем существование записи
-            async with db.execute("SELECT 1 FROM fsm_storage WHERE key = ?", (str_key,)) as cursor:
-                exists = await cursor.fetchone()
-            
-            if exists:
-                await db.execute(
-                    "UPDATE fsm_storage SET state = ? WHERE key = ?",
-                    (state_str, str_key)
-                )
-            else:
-                # Получаем текущие данные или создаем пустой словарь
-                data = await self.get_data(key) or {}
-                await db.execute(
-                    "INSERT INTO fsm_storage (key, state, data) VALUES (?, ?, ?)",
-                    (str_key, state_str, json.dumps(data))
-                )
-            
+
+        db = await self._get_connection()
+        async with self._write_lock:
+            await db.execute(
+                """
+                INSERT INTO fsm_storage (key, bot_id, chat_id, user_id, thread_id, state, data, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at
+                """,
+                (*self._key_params(key), state_str, self.codec.dumps({}), int(time.time()))
+            )
             await db.commit()
-    
+
     async def get_state(self, key: StorageKey) -> Optional[str]:
         """Получает текущее состояние по ключу"""
-        await self._init_db()
-        
         str_key = self._create_key(key)
-        
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute(
-                "SELECT state FROM fsm_storage WHERE key = ?",
-                (str_key,)
-            ) as cursor:
-                result = await cursor.fetchone()
-                
-                if result:
-                    return result[0]
-                return None
-    
+
+        db = await self._get_connection()
+        async with db.execute(
+            "SELECT state FROM fsm_storage WHERE key = ?",
+            (str_key,)
+        ) as cursor:
+            result = await cursor.fetchone()
+
+            if result:
+                return result[0]
+            return None
+
     async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
-        """Устанавливает данные для ключа"""
-        await self._init_db()
-        
-        str_key = self._create_key(key)
-        
-        async with aiosqlite.connect(self.db_path) as db:
-            # Проверяем существование записи
-            async with db.execute("SELECT 1 FROM fsm_storage WHERE key = ?", (str_key,)) as cursor:
-                exists = await cursor.fetchone()
-            
-            if exists:
-                await db.execute(
-                    "UPDATE fsm_storage SET data = ? WHERE key = ?",
-                    (json.dumps(data), str_key)
-                )
-            else:
-                await db.execute(
-                    "INSERT INTO fsm_storage (key, state, data) VALUES (?, ?, ?)",
-                    (str_key, None, json.dumps(data))
-                )
-            
+        """Устанавливает данные для ключа (одним запросом INSERT ... ON CONFLICT)"""
+        db = await self._get_connection()
+        async with self._write_lock:
+            await db.execute(
+                """
+                INSERT INTO fsm_storage (key, bot_id, chat_id, user_id, thread_id, state, data, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+                """,
+                (*self._key_params(key), None, self.codec.dumps(data), int(time.time()))
+            )
             await db.commit()
-    
+
     async def get_data(self, key: StorageKey) -> Dict[str, Any]:
         """Получает данные по ключу"""
-        await self._init_db()
-        
         str_key = self._create_key(key)
-        
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute(
-                "SELECT data FROM fsm_storage WHERE key = ?",
-                (str_key,)
-            ) as cursor:
-                result = await cursor.fetchone()
-                
-                if result:
-                    return cast(Dict[str, Any], json.loads(result[0]))
-                return {}
-    
+
+        db = await self._get_connection()
+        async with db.execute(
+            "SELECT data FROM fsm_storage WHERE key = ?",
+            (str_key,)
+        ) as cursor:
+            result = await cursor.fetchone()
+
+            if result:
+                return cast(Dict[str, Any], decode_data(result[0]))
+            return {}
+
+    async def get_record(self, key: StorageKey) -> Tuple[Optional[str], Dict[str, Any]]:
+        """Получает состояние и данные по ключу одним запросом"""
+        str_key = self._create_key(key)
+
+        db = await self._get_connection()
+        async with db.execute(
+            "SELECT state, data FROM fsm_storage WHERE key = ?",
+            (str_key,)
+        ) as cursor:
+            result = await cursor.fetchone()
+
+            if result:
+                return result[0], cast(Dict[str, Any], decode_data(result[1]))
+            return None, {}
+
     async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Обновляет данные для ключа"""
-        await self._init_db()
-        
-        current_data = await self.get_data(key)
-        current_data.update(data)
-        await self.set_data(key, current_data)
+        """
+        Обновляет данные для ключа.
+
+        Чтение и запись выполняются в одной транзакции BEGIN IMMEDIATE, поэтому
+        два параллельных обновления одного ключа не теряют изменения друг друга.
+        """
+        str_key = self._create_key(key)
+
+        db = await self._get_connection()
+        async with self._write_lock:
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                async with db.execute(
+                    "SELECT data FROM fsm_storage WHERE key = ?",
+                    (str_key,)
+                ) as cursor:
+                    result = await cursor.fetchone()
+
+                current_data = cast(Dict[str, Any], decode_data(result[0])) if result else {}
+                current_data.update(data)
+
+                await db.execute(
+                    """
+                    INSERT INTO fsm_storage (key, bot_id, chat_id, user_id, thread_id, state, data, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+                    """,
+                    (*self._key_params(key), None, self.codec.dumps(current_data), int(time.time()))
+                )
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
         return current_data
-    
+
+    async def write_records(self, records: List[Tuple[StorageKey, Optional[str], Dict[str, Any]]]) -> None:
+        """
+        Записывает пачку полных записей (ключ, состояние, данные) в одной транзакции
+        """
+        if not records:
+            return
+
+        now = int(time.time())
+        rows = [
+            (*self._key_params(key), state, self.codec.dumps(data), now)
+            for key, state, data in records
+        ]
+
+        db = await self._get_connection()
+        async with self._write_lock:
+            await db.executemany(
+                """
+                INSERT INTO fsm_storage (key, bot_id, chat_id, user_id, thread_id, state, data, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    state = excluded.state,
+                    data = excluded.data,
+                    updated_at = excluded.updated_at
+                """,
+                rows
+            )
+            await db.commit()
+
+    async def delete_user(self, user_id: int) -> int:
+        """Удаляет все записи пользователя одним запросом по индексу, возвращает их количество"""
+        db = await self._get_connection()
+        async with self._write_lock:
+            cursor = await db.execute("DELETE FROM fsm_storage WHERE user_id = ?", (user_id,))
+            await db.commit()
+            return cursor.rowcount
+
+    async def clear_all(self) -> int:
+        """Удаляет все записи из хранилища, возвращает их количество"""
+        db = await self._get_connection()
+        async with self._write_lock:
+            cursor = await db.execute("DELETE FROM fsm_storage")
+            await db.commit()
+            return cursor.rowcount
+
+    async def expire_stale(self, ttl: float) -> int:
+        """Удаляет записи, которые не обновлялись дольше ttl секунд, возвращает их количество"""
+        threshold = int(time.time() - ttl)
+
+        db = await self._get_connection()
+        async with self._write_lock:
+            cursor = await db.execute(
+                "DELETE FROM fsm_storage WHERE updated_at < ?",
+                (threshold,)
+            )
+            await db.commit()
+            return cursor.rowcount
+
+    async def _sweep_loop(self) -> None:
+        """Периодически удаляет устаревшие записи"""
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                expired = await self.expire_stale(self.state_ttl)
+                if expired:
+                    logger.info(f"Удалено {expired} устаревших записей из хранилища состояний")
+            except Exception as e:
+                logger.error(f"Ошибка при очистке устаревших состояний: {e}", exc_info=True)
+
     async def close(self) -> None:
-        """Этот метод вызывается при закрытии хранилища"""
-        pass
-        
+        """Закрывает соединение с базой данных (вызывается при остановке диспетчера)"""
+        if self._sweep_task is not None:
+            self._sweep_task.cancel()
+            try:
+                await self._sweep_task
+            except asyncio.CancelledError:
+                pass
+            self._sweep_task = None
+
+        async with self._connect_lock:
+            if self._connection is None:
+                return
+
+            connection = self._connection
+            self._connection = None
+            await connection.close()
+            logger.info(f"Соединение с хранилищем состояний {self.db_path} закрыто")
+
     async def reset_state(self, key: StorageKey) -> None:
         """Сбрасывает состояние для ключа (устанавливает в None)"""
         await self.set_state(key, state=None)
-        
+
     async def reset_data(self, key: StorageKey) -> None:
         """Сбрасывает данные для ключа (устанавливает пустой словарь)"""
         await self.set_data(key, data={})
-        
+
     async def reset_all(self, key: StorageKey) -> None:
         """Сбрасывает и состояние, и данные для ключа"""
         str_key = self._create_key(key)
-        
-        async with aiosqlite.connect(self.db_path) as db:
+
+        db = await self._get_connection()
+        async with self._write_lock:
             await db.execute("DELETE FROM fsm_storage WHERE key = ?", (str_key,))
             await db.commit()
-            
-    async def get_all_states(self) -> List[Dict[str, Any]]:
-        """Получает все состояния из хранилища"""
-        await self._init_db()
-        
-        result = []
-        async with aiosqlite.connect(self.db_path) as db:
+
+    @staticmethod
+    def _build_filters(
+        state: Optional[str] = None,
+        user_id: Optional[int] = None,
+        older_than: Optional[float] = None
+    ) -> Tuple[List[str], List[Any]]:
+        """
+        Собирает условия WHERE для выборки состояний.
+
+        state - точное имя состояния ("RegistrationStates:waiting_for_name")
+        или имя группы без двоеточия ("RegistrationStates") для всех ее состояний;
+        older_than - возраст записи в секундах.
+        """
+        conditions = []
+        params: List[Any] = []
+
+        if state is not None:
+            if ":" in state:
+                conditions.append("state = ?")
+                params.append(state)
+            else:
+                # Диапазон по индексу вместо LIKE: все состояния вида "Группа:..."
+                conditions.append("state >= ? AND state < ?")
+                params.extend([f"{state}:", f"{state};"])
+
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+
+        if older_than is not None:
+            conditions.append("updated_at < ?")
+            params.append(int(time.time() - older_than))
+
+        return conditions, params
+
+    async def iter_states(
+        self,
+        state: Optional[str] = None,
+        user_id: Optional[int] = None,
+        older_than: Optional[float] = None,
+        limit: Optional[int] = None,
+        page_size: int = 500
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Постранично перебирает записи хранилища, не загружая всю таблицу в память.
+
+        Используется пагинация по ключу (WHERE key > последний_ключ), поэтому каждая
+        страница - отдельный короткий запрос по первичному ключу.
+        """
+        conditions, params = self._build_filters(state, user_id, older_than)
+
+        db = await self._get_connection()
+        last_key = None
+        returned = 0
+
+        while limit is None or returned < limit:
+            page_conditions = list(conditions)
+            page_params = list(params)
+            if last_key is not None:
+                page_conditions.append("key > ?")
+                page_params.append(last_key)
+
+            where = f"WHERE {' AND '.join(page_conditions)}" if page_conditions else ""
+            page_limit = page_size if limit is None else min(page_size, limit - returned)
+
             async with db.execute(
-                "SELECT key, state, data FROM fsm_storage"
+                f"SELECT key, user_id, state, data, updated_at FROM fsm_storage {where} "
+                f"ORDER BY key LIMIT ?",
+                (*page_params, page_limit)
             ) as cursor:
-                async for key, state, data in cursor:
-                    result.append({
-                        "key": key,
-                        "state": state,
-                        "data": json.loads(data)
-                    })
-        
-        return result 
\ No newline at end of file
+                rows = await cursor.fetchall()
+
+            for key, row_user_id, row_state, data, updated_at in rows:
+                yield {
+                    "key": key,
+                    "user_id": row_user_id,
+                    "state": row_state,
+                    "data": decode_data(data),
+                    "updated_at": updated_at
+                }
+
+            returned += len(rows)
+            if len(rows) < page_limit:
+                break
+            last_key = rows[-1][0]
+
+    async def count_states(
+        self,
+        user_id: Optional[int] = None,
+        older_than: Optional[float] = None
+    ) -> List[Tuple[Optional[str], int]]:
+        """Возвращает количество записей по каждому состоянию (подсчет выполняется в SQL)"""
+        conditions, params = self._build_filters(user_id=user_id, older_than=older_than)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        db = await self._get_connection()
+        async with db.execute(
+            f"SELECT state, COUNT(*) FROM fsm_storage {where} GROUP BY state ORDER BY COUNT(*) DESC",
+            params
+        ) as cursor:
+            return [(row[0], row[1]) for row in await cursor.fetchall()]
+
+    async def get_all_states(self) -> List[Dict[str, Any]]:
+        """Получает все состояния из хранилища"""
+        return [item async for item in self.iter_states()]
@@ -7,6 +7,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from database.models import User, Meeting, Feedback
 from services.user_service import get_user, get_active_users
 from services.meeting_service import get_user_meetings
+from services.interest_catalog import reload_interest_catalog
 from services.test_mode_service import activate_test_mode, deactivate_test_mode, get_test_mode_status, is_test_mode_active
 from scheduler import reconfigure_scheduler
 
@@ -58,7 +59,8 @@ async def cmd_admin(message: Message, session: AsyncSession):
         "/adminstats - Подробная статистика\n"
         "/adminusers - Список пользователей\n"
         "/adminmeetings - Список встреч\n"
-        "/adminfeedback - Отзывы пользователей"
+        "/adminfeedback - Отзывы пользователей\n"
+        "/admininterests - Перечитать справочник интересов"
         f"{test_mode_info}"
     )
     
@@ -226,6 +228,23 @@ async def cmd_admin_feedback(message: Message, session: AsyncSession):
     await message.answer(feedback_message, parse_mode="Markdown")
 
 
+@admin_router.message(Command("admin_interests", "admininterests"))
+async def cmd_admin_interests(message: Message, session: AsyncSession):
+    """
+    Перечитывает справочник интересов из базы и показывает его.
+    Нужна после изменения таблицы interests: бот хранит справочник в памяти.
+    """
+    if not is_admin(message.from_user.id):
+        return
+    
+    catalog = await reload_interest_catalog(session)
+    
+    interests_message = f"🏷 *Справочник интересов обновлен* ({len(catalog.all())}):\n\n"
+    interests_message += "\n".join(f"{interest.id}. {interest.label}" for interest in catalog.all())
+    
+    await message.answer(interests_message, parse_mode="Markdown")
+
+
 @admin_router.message(Command("admin_testmode", "testmode", "test_mode"))
 async def cmd_admin_testmode(message: Message, session: AsyncSession):
     """
@@ -1,4 +1,4 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import List
 import logging
 
@@ -6,13 +6,14 @@ from aiogram import Bot, Router
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, update
 
 from database.models import Meeting, User, TopicType
 from keyboards import get_topic_name, get_topic_emoji, create_rating_keyboard
-from services.meeting_service import get_meeting, get_pending_feedback_meetings
-from services.user_service import get_user
+from services.meeting_service import iter_pending_feedback
 from services.test_mode_service import is_test_mode_active, get_accelerated_date, get_real_date
+from services.broadcast_service import BroadcastMessage, broadcast
+from services.outbox_service import enqueue_messages, wake_outbox_dispatcher
 
 # Создаем роутер для уведомлений
 notifications_router = Router()
@@ -25,14 +26,17 @@ async def send_meeting_notifications(session: AsyncSession, meetings: List[Meeti
     
     Args:
         session: Сессия базы данных
-        meetings: Список встреч для отправки уведомлений
+        meetings: Список встреч с загруженными участниками
+            (см. get_meetings_with_participants)
+    
+    Returns:
+        Итоги рассылки
     """
     from app import bot  # Импортируем бота здесь, чтобы избежать цикличного импорта
     
+    messages = []
     for meeting in meetings:
-        # Получаем пользователей
-        user1 = await get_user(session, meeting.user1_id)
-        user2 = await get_user(session, meeting.user2_id)
+        user1, user2 = meeting.user1, meeting.user2
         
         if not user1 or not user2:
             continue
@@ -49,26 +53,15 @@ async def send_meeting_notifications(session: AsyncSession, meetings: List[Meeti
         kb_for_user1 = get_contact_keyboard(user2)
         kb_for_user2 = get_contact_keyboard(user1)
         
-        # Отправляем уведомления
-        try:
-            await bot.send_message(
-                chat_id=user1.telegram_id,
-                text=message_for_user1,
-                reply_markup=kb_for_user1,
-                parse_mode="Markdown"
-            )
-        except Exception as e:
-            print(f"Ошибка при отправке уведомления пользователю {user1.telegram_id}: {e}")
-        
-        try:
-            await bot.send_message(
-                chat_id=user2.telegram_id,
-                text=message_for_user2,
-                reply_markup=kb_for_user2,
-                parse_mode="Markdown"
-            )
-        except Exception as e:
-            print(f"Ошибка при отправке уведомления пользователю {user2.telegram_id}: {e}")
+        messages.append(BroadcastMessage(
+            user1.telegram_id, message_for_user1, reply_markup=kb_for_user1, parse_mode="Markdown"
+        ))
+        messages.append(BroadcastMessage(
+            user2.telegram_id, message_for_user2, reply_markup=kb_for_user2, parse_mode="Markdown"
+        ))
+    
+    # Отправляем параллельно с учетом лимитов Telegram (BROADCAST_*)
+    return await broadcast(bot, messages, "уведомления о встречах")
 
 
 def generate_meeting_message(partner: User, common_topics) -> str:
@@ -161,33 +154,25 @@ def get_contact_keyboard(user: User) -> InlineKeyboardMarkup:
 
 async def send_feedback_reminders(session: AsyncSession):
     """
-    Отправляет напоминания о необходимости оставить фидбек после встречи.
+    Ставит в очередь outbox напоминания о необходимости оставить фидбек после встречи.
+    
+    Все пары (участник, встреча) без фидбека выбираются одним запросом и
+    обрабатываются пачками; на каждую пачку приходится одна вставка в очередь.
+    Ключ идемпотентности включает дату, поэтому напоминание по встрече
+    отправляется не чаще раза в день.
     
     Args:
         session: Сессия базы данных
     """
-    from app import bot  # Импортируем бота здесь, чтобы избежать цикличного импорта
-    
-    # Получаем список активных пользователей
-    from services.user_service import get_active_users
-    users = await get_active_users(session)
+    today = datetime.now().strftime("%Y%m%d")
+    count = 0
     
-    for user in users:
-        # Получаем встречи, требующие фидбека
-        pending_feedback_meetings = await get_pending_feedback_meetings(session, user.telegram_id)
-        
-        # Отправляем напоминание, если есть встречи без фидбека
-        for meeting in pending_feedback_meetings:
-            # Определяем партнера
-            partner_id = meeting.user2_id if meeting.user1_id == user.telegram_id else meeting.user1_id
-            partner = await get_user(session, partner_id)
-            
-            if not partner:
-                continue
-            
+    async for rows in iter_pending_feedback(session):
+        notifications = []
+        for row in rows:
             # Формируем сообщение
             message = (
-                f"👋 Привет! Как прошла ваша встреча с {partner.full_name}?\n\n"
+                f"👋 Привет! Как прошла ваша встреча с {row.partner_name}?\n\n"
                 f"Пожалуйста, оставьте небольшой фидбек, чтобы мы могли улучшать сервис Random Coffee."
             )
             
@@ -195,174 +180,142 @@ async def send_feedback_reminders(session: AsyncSession):
             kb = InlineKeyboardBuilder()
             kb.add(InlineKeyboardButton(
                 text="📝 Оставить фидбек",
-                callback_data=f"feedback:{meeting.id}:{partner.telegram_id}"
+                callback_data=f"feedback:{row.meeting_id}:{row.partner_id}"
             ))
             
-            # Отправляем напоминание
-            try:
-                await bot.send_message(
-                    chat_id=user.telegram_id,
-                    text=message,
-                    reply_markup=kb.as_markup()
-                )
-            except Exception as e:
-                print(f"Ошибка при отправке напоминания о фидбеке пользователю {user.telegram_id}: {e}") 
+            notifications.append((
+                f"feedback-reminder:{row.meeting_id}:{row.user_id}:{today}",
+                BroadcastMessage(row.user_id, message, reply_markup=kb.as_markup())
+            ))
+        
+        await enqueue_messages(session, notifications)
+        count += len(notifications)
+    
+    await session.commit()
+    wake_outbox_dispatcher()
+    logger.info(f"Поставлены в очередь напоминания о фидбеке: {count}")
 
 
-async def send_meeting_reminder(bot: Bot, session: AsyncSession, meeting_id: int):
+async def send_meeting_reminders(session: AsyncSession, meetings: List[Meeting]) -> int:
     """
-    Отправляет напоминание о предстоящей встрече.
+    Ставит в очередь outbox напоминания о предстоящих встречах.
+    
+    Вызывается таймерами напоминаний (services.reminder_service) за
+    REMINDER_LEAD_MINUTES до встречи. Встречи передаются вместе с загруженными
+    участниками (user1, user2). Напоминания записываются одной вставкой в той же
+    транзакции, что и отметка reminder_sent (один UPDATE на всю пачку),
+    а отправляет их диспетчер очереди.
     
     Args:
-        bot: Бот для отправки сообщений
         session: Сессия базы данных
-        meeting_id: ID встречи
-    """
-    # Получаем встречу
-    meeting = await get_meeting(session, meeting_id)
-    if not meeting or not meeting.scheduled_date:
-        return
+        meetings: Встречи с загруженными участниками
     
-    # Проверяем, что встреча еще не прошла и не отменена
+    Returns:
+        Количество встреч, по которым поставлены напоминания
+    """
+    # Проверяем, что встреча еще не прошла, не отменена и напоминание еще не отправлено
     current_time = datetime.now()
     if is_test_mode_active():
         current_time = get_accelerated_date(current_time)
     
-    if meeting.is_completed or meeting.is_cancelled or meeting.scheduled_date < current_time:
-        return
-    
-    # Находим разницу между текущим временем и временем встречи
-    time_diff = meeting.scheduled_date - current_time
-    
-    # Если до встречи больше 1 часа, не отправляем напоминание
-    if time_diff > timedelta(hours=1):
-        return
-    
-    # Получаем участников встречи
-    user1 = await get_user(session, meeting.user1_id)
-    user2 = await get_user(session, meeting.user2_id)
-    
-    if not user1 or not user2:
-        return
-    
-    # Формируем сообщение напоминания
-    message = (
-        f"⏰ *Напоминание о встрече*\n\n"
-        f"Ваша встреча с {user2.full_name} запланирована на сегодня в {meeting.scheduled_date.strftime('%H:%M')}.\n\n"
-        f"Не забудьте присоединиться и хорошо провести время! ☕"
-    )
-    
-    # Отправляем напоминание первому пользователю
-    try:
-        await bot.send_message(
-            chat_id=user1.telegram_id,
-            text=message,
-            parse_mode="Markdown"
-        )
-    except Exception as e:
-        logger.error(f"Ошибка при отправке напоминания пользователю {user1.telegram_id}: {e}")
+    notifications = []
+    meeting_ids = []
+    for meeting in meetings:
+        if (
+            not meeting.scheduled_date
+            or meeting.is_completed or meeting.is_cancelled or meeting.reminder_sent
+            or meeting.scheduled_date < current_time
+            or not meeting.user1 or not meeting.user2
+        ):
+            continue
+        
+        for user, partner in ((meeting.user1, meeting.user2), (meeting.user2, meeting.user1)):
+            # Формируем сообщение напоминания
+            message = (
+                f"⏰ *Напоминание о встрече*\n\n"
+                f"Ваша встреча с {partner.full_name} запланирована на сегодня в {meeting.scheduled_date.strftime('%H:%M')}.\n\n"
+                f"Не забудьте присоединиться и хорошо провести время! ☕"
+            )
+            # Дата в ключе: после переноса встречи напоминание отправляется снова
+            notifications.append((
+                f"reminder:{meeting.id}:{user.telegram_id}:{meeting.scheduled_date:%Y%m%d%H%M}",
+                BroadcastMessage(user.telegram_id, message, parse_mode="Markdown")
+            ))
+        meeting_ids.append(meeting.id)
     
-    # Формируем сообщение для второго пользователя
-    message = (
-        f"⏰ *Напоминание о встрече*\n\n"
-        f"Ваша встреча с {user1.full_name} запланирована на сегодня в {meeting.scheduled_date.strftime('%H:%M')}.\n\n"
-        f"Не забудьте присоединиться и хорошо провести время! ☕"
-    )
+    if not meeting_ids:
+        return 0
     
-    # Отправляем напоминание второму пользователю
-    try:
-        await bot.send_message(
-            chat_id=user2.telegram_id,
-            text=message,
-            parse_mode="Markdown"
-        )
-    except Exception as e:
-        logger.error(f"Ошибка при отправке напоминания пользователю {user2.telegram_id}: {e}")
+    await enqueue_messages(session, notifications)
     
     # Обновляем статус напоминания
-    meeting.reminder_sent = True
+    await session.execute(
+        update(Meeting).where(Meeting.id.in_(meeting_ids)).values(reminder_sent=True)
+    )
     await session.commit()
+    return len(meeting_ids)
 
 
-async def send_feedback_request(bot: Bot, session: AsyncSession, meeting_id: int):
+async def send_feedback_requests(session: AsyncSession, meetings: List[Meeting]) -> int:
     """
-    Отправляет запрос на предоставление фидбека после встречи.
+    Ставит в очередь outbox запросы на предоставление фидбека после встреч.
+    
+    Встречи передаются вместе с загруженными участниками (user1, user2).
+    Запросы записываются одной вставкой в той же транзакции, что и отметка
+    feedback_requested (один UPDATE на всю пачку), а отправляет их диспетчер очереди.
     
     Args:
-        bot: Бот для отправки сообщений
         session: Сессия базы данных
-        meeting_id: ID встречи
-    """
-    # Получаем встречу
-    meeting = await get_meeting(session, meeting_id)
-    if not meeting or not meeting.scheduled_date:
-        return
+        meetings: Встречи с загруженными участниками
     
+    Returns:
+        Количество встреч, по которым поставлены запросы
+    """
     # Проверяем, что встреча прошла и не отменена
     current_time = datetime.now()
     if is_test_mode_active():
         current_time = get_accelerated_date(current_time)
     
-    if meeting.is_cancelled or meeting.scheduled_date > current_time:
-        return
-    
-    # Проверяем, что запрос на фидбек еще не был отправлен
-    if meeting.feedback_requested:
-        return
-    
-    # Получаем участников встречи
-    user1 = await get_user(session, meeting.user1_id)
-    user2 = await get_user(session, meeting.user2_id)
-    
-    if not user1 or not user2:
-        return
-    
-    # Формируем сообщение для первого пользователя
-    message = (
-        f"👋 Привет, {user1.full_name}!\n\n"
-        f"Как прошла твоя встреча с {user2.full_name}? "
-        f"Пожалуйста, оцени встречу, чтобы помочь нам улучшить Random Coffee!"
-    )
-    
-    # Создаем клавиатуру для оценки
-    keyboard = create_rating_keyboard(meeting.id, user2.telegram_id)
-    
-    # Отправляем запрос на фидбек первому пользователю
-    try:
-        await bot.send_message(
-            chat_id=user1.telegram_id,
-            text=message,
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
-    except Exception as e:
-        logger.error(f"Ошибка при отправке запроса фидбека пользователю {user1.telegram_id}: {e}")
-    
-    # Формируем сообщение для второго пользователя
-    message = (
-        f"👋 Привет, {user2.full_name}!\n\n"
-        f"Как прошла твоя встреча с {user1.full_name}? "
-        f"Пожалуйста, оцени встречу, чтобы помочь нам улучшить Random Coffee!"
-    )
+    notifications = []
+    meeting_ids = []
+    for meeting in meetings:
+        # Пропускаем встречи, по которым запрос на фидбек уже был отправлен
+        if (
+            not meeting.scheduled_date
+            or meeting.is_cancelled or meeting.feedback_requested
+            or meeting.scheduled_date > current_time
+            or not meeting.user1 or not meeting.user2
+        ):
+            continue
+        
+        for user, partner in ((meeting.user1, meeting.user2), (meeting.user2, meeting.user1)):
+            # Формируем сообщение с клавиатурой для оценки
+            message = (
+                f"👋 Привет, {user.full_name}!\n\n"
+                f"Как прошла твоя встреча с {partner.full_name}? "
+                f"Пожалуйста, оцени встречу, чтобы помочь нам улучшить Random Coffee!"
+            )
+            notifications.append((
+                f"feedback:{meeting.id}:{user.telegram_id}",
+                BroadcastMessage(
+                    user.telegram_id, message, reply_markup=create_rating_keyboard(), parse_mode="Markdown"
+                )
+            ))
+        meeting_ids.append(meeting.id)
     
-    # Создаем клавиатуру для оценки
-    keyboard = create_rating_keyboard(meeting.id, user1.telegram_id)
+    if not meeting_ids:
+        return 0
     
-    # Отправляем запрос на фидбек второму пользователю
-    try:
-        await bot.send_message(
-            chat_id=user2.telegram_id,
-            text=message,
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
-    except Exception as e:
-        logger.error(f"Ошибка при отправке запроса фидбека пользователю {user2.telegram_id}: {e}")
+    await enqueue_messages(session, notifications)
     
     # Обновляем статус запроса фидбека
-    meeting.feedback_requested = True
-    meeting.is_completed = True
+    await session.execute(
+        update(Meeting)
+        .where(Meeting.id.in_(meeting_ids))
+        .values(feedback_requested=True, is_completed=True)
+    )
     await session.commit()
+    return len(meeting_ids)
 
 
 async def send_reactivation_reminder(bot: Bot, session: AsyncSession):
@@ -372,6 +325,9 @@ async def send_reactivation_reminder(bot: Bot, session: AsyncSession):
     Args:
         bot: Бот для отправки сообщений
         session: Сессия базы данных
+    
+    Returns:
+        Итоги рассылки
     """
     # Получаем всех зарегистрированных, но неактивных пользователей
     query = select(User).where(
@@ -408,15 +364,13 @@ async def send_reactivation_reminder(bot: Bot, session: AsyncSession):
         callback_data="decline_reactivation"
     ))
     
-    # Отправляем сообщения
-    for user in inactive_users:
-        try:
-            await bot.send_message(
-                chat_id=user.telegram_id,
-                text=message,
-                reply_markup=kb.as_markup(),
-                parse_mode="Markdown"
-            )
-        except Exception as e:
-            logger.error(f"Ошибка при отправке напоминания пользователю {user.telegram_id}: {e}")
-            continue 
\ No newline at end of file
+    # Отправляем параллельно с учетом лимитов Telegram (BROADCAST_*)
+    markup = kb.as_markup()
+    return await broadcast(
+        bot,
+        [
+            BroadcastMessage(user.telegram_id, message, reply_markup=markup, parse_mode="Markdown")
+            for user in inactive_users
+        ],
+        "напоминания неактивным пользователям"
+    ) 
\ No newline at end of file
@@ -1,18 +1,21 @@
 import logging
-import random
 from datetime import datetime, timedelta
+from typing import List
 
 from aiogram import Router, F
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
-from sqlalchemy import select, and_, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database.models import User, Meeting, Interest
+from database.lazy_session import LazySession
+from database.models import User, Meeting
 from keyboards import create_pairing_keyboard
-from services.user_service import get_user, get_active_users
-from services.meeting_service import create_meeting, get_user_meetings
+from services.user_service import get_user_with_interests, get_active_users
+from services.meeting_service import create_meeting
+from services.matching import format_weekdays
+from services.candidate_cache_service import get_cached_candidates
+from services.interest_catalog import CatalogInterest, get_interest_catalog
 from states import PairingStates
 
 # Создаем роутер для подбора пар
@@ -21,11 +24,12 @@ logger = logging.getLogger(__name__)
 
 
 @pairing_router.message(Command("find"))
-async def cmd_find(message: Message, state: FSMContext, session: AsyncSession):
+async def cmd_find(message: Message, state: FSMContext, session: LazySession):
     """
     Обработчик команды /find - запускает поиск собеседника
     """
-    user = await get_user(session, message.from_user.id)
+    # Интересы нужны для общих интересов с кандидатами - загружаем сразу
+    user = await get_user_with_interests(session, message.from_user.id)
     
     if not user or not user.registration_complete:
         await message.answer(
@@ -34,21 +38,25 @@ async def cmd_find(message: Message, state: FSMContext, session: AsyncSession):
         )
         return
     
-    # Ищем подходящие варианты собеседников
-    potential_matches = await find_potential_matches(session, user)
+    # Первые варианты из предрассчитанного списка кандидатов
+    matches_to_show, cursor = await get_cached_candidates(session, user)
     
-    if not potential_matches:
+    if not matches_to_show:
         await message.answer(
             "🔎 К сожалению, сейчас не удалось найти подходящих собеседников.\n"
             "Попробуй запросить поиск позже или дождись еженедельного подбора."
         )
         return
     
-    # Выбираем до 3 случайных вариантов
-    matches_to_show = random.sample(potential_matches, min(len(potential_matches), 3))
+    # Сохраняем варианты и позицию в списке кандидатов в state
+    await state.update_data(
+        potential_matches=[user.telegram_id for user in matches_to_show],
+        candidate_cursor=cursor
+    )
     
-    # Сохраняем варианты в state
-    await state.update_data(potential_matches=[user.telegram_id for user in matches_to_show])
+    # Получаем общие интересы заранее и отпускаем соединение до отправки сообщений
+    matches_interests = await get_common_interests(session, user, matches_to_show)
+    await session.release()
     
     # Формируем сообщение с вариантами
     await message.answer(
@@ -58,9 +66,7 @@ async def cmd_find(message: Message, state: FSMContext, session: AsyncSession):
     )
     
     # Формируем описание каждого варианта
-    for i, match in enumerate(matches_to_show, 1):
-        # Получаем общие интересы
-        common_interests = await get_common_interests(session, user, match)
+    for i, (match, common_interests) in enumerate(zip(matches_to_show, matches_interests), 1):
         interests_text = ", ".join([f"{interest.emoji} {interest.name}" for interest in common_interests])
         
         user_info = (
@@ -68,7 +74,7 @@ async def cmd_find(message: Message, state: FSMContext, session: AsyncSession):
             f"   Номер: №{match.user_number}\n"
             f"   Отдел: {match.department}\n"
             f"   Интересы: {interests_text}\n"
-            f"   Доступен: {format_weekdays(match.available_days)}, {match.available_time_slot}"
+            f"   Доступен: {format_weekdays(match.schedule_mask)}, {match.available_time_slot}"
         )
         
         await message.answer(user_info, parse_mode="Markdown")
@@ -84,18 +90,17 @@ async def cmd_find(message: Message, state: FSMContext, session: AsyncSession):
 
 
 @pairing_router.callback_query(StateFilter(PairingStates.waiting_for_selection), F.data.startswith("user_"))
-async def select_user(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+async def select_user(callback: CallbackQuery, state: FSMContext, session: LazySession):
     """
     Обработчик выбора собеседника
     """
     # Получаем ID выбранного пользователя
     selected_user_id = int(callback.data.split("_")[1])
     
-    # Получаем текущего пользователя
-    user = await get_user(session, callback.from_user.id)
-    
-    # Получаем выбранного пользователя
-    selected_user = await get_user(session, selected_user_id)
+    # Получаем текущего и выбранного пользователей вместе с интересами
+    # (до создания встречи, чтобы общие интересы считались без ленивой загрузки)
+    user = await get_user_with_interests(session, callback.from_user.id)
+    selected_user = await get_user_with_interests(session, selected_user_id)
     
     if not user or not selected_user:
         await callback.answer("Ошибка: пользователь не найден", show_alert=True)
@@ -110,9 +115,12 @@ async def select_user(callback: CallbackQuery, state: FSMContext, session: Async
     )
     
     # Формируем сообщение с информацией о собеседнике
-    common_interests = await get_common_interests(session, user, selected_user)
+    common_interests, = await get_common_interests(session, user, [selected_user])
     interests_text = ", ".join([f"{interest.emoji} {interest.name}" for interest in common_interests])
     
+    # Работа с базой закончена: отпускаем соединение до отправки сообщений
+    await session.release()
+    
     meeting_info = (
         f"✅ Отлично! Ты выбрал(а) встречу с *{selected_user.full_name}*\n\n"
         f"*О собеседнике:*\n"
@@ -121,7 +129,7 @@ async def select_user(callback: CallbackQuery, state: FSMContext, session: Async
         f"👨‍💼 Роль: {selected_user.role}\n"
         f"🤝 Формат: {selected_user.meeting_format.value if selected_user.meeting_format else 'Не указан'}\n"
         f"📍 Место встречи: {selected_user.city}, {selected_user.office}\n"
-        f"🕒 Доступные дни: {format_weekdays(selected_user.available_days)}\n"
+        f"🕒 Доступные дни: {format_weekdays(selected_user.schedule_mask)}\n"
         f"⏰ Удобное время: {selected_user.available_time_slot}\n\n"
         f"*Общие интересы:*\n{interests_text}\n\n"
         f"Напиши собеседнику напрямую, чтобы договориться о встрече: @{selected_user.username}"
@@ -138,7 +146,7 @@ async def select_user(callback: CallbackQuery, state: FSMContext, session: Async
         f"👨‍💼 Роль: {user.role}\n"
         f"🤝 Формат: {user.meeting_format.value if user.meeting_format else 'Не указан'}\n"
         f"📍 Место встречи: {user.city}, {user.office}\n"
-        f"🕒 Доступные дни: {format_weekdays(user.available_days)}\n"
+        f"🕒 Доступные дни: {format_weekdays(user.schedule_mask)}\n"
         f"⏰ Удобное время: {user.available_time_slot}\n\n"
         f"*Общие интересы:*\n{interests_text}\n\n"
         f"Собеседник напишет тебе напрямую для согласования деталей встречи.\n"
@@ -159,21 +167,23 @@ async def select_user(callback: CallbackQuery, state: FSMContext, session: Async
 
 
 @pairing_router.callback_query(StateFilter(PairingStates.waiting_for_selection), F.data == "more_users")
-async def show_more_users(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+async def show_more_users(callback: CallbackQuery, state: FSMContext, session: LazySession):
     """
     Обработчик запроса других вариантов
     """
-    # Получаем текущего пользователя
-    user = await get_user(session, callback.from_user.id)
+    # Получаем текущего пользователя вместе с интересами
+    user = await get_user_with_interests(session, callback.from_user.id)
     
-    # Получаем уже показанные варианты
+    # Получаем уже показанные варианты и позицию в списке кандидатов
     state_data = await state.get_data()
     shown_user_ids = state_data.get("potential_matches", [])
     
-    # Ищем новые варианты
-    potential_matches = await find_potential_matches(session, user, exclude_ids=shown_user_ids)
+    # Следующие варианты после уже показанных
+    matches_to_show, cursor = await get_cached_candidates(
+        session, user, cursor=state_data.get("candidate_cursor", 0)
+    )
     
-    if not potential_matches:
+    if not matches_to_show:
         # Если нет новых вариантов, предлагаем повторить поиск на следующей неделе
         await callback.message.edit_text(
             "К сожалению, сейчас нет других подходящих вариантов.\n"
@@ -183,12 +193,13 @@ async def show_more_users(callback: CallbackQuery, state: FSMContext, session: A
         await state.clear()
         return
     
-    # Выбираем до 3 случайных вариантов
-    matches_to_show = random.sample(potential_matches, min(len(potential_matches), 3))
-    
     # Добавляем новые варианты к уже показанным
     all_shown_ids = shown_user_ids + [user.telegram_id for user in matches_to_show]
-    await state.update_data(potential_matches=all_shown_ids)
+    await state.update_data(potential_matches=all_shown_ids, candidate_cursor=cursor)
+    
+    # Получаем общие интересы заранее и отпускаем соединение до отправки сообщений
+    matches_interests = await get_common_interests(session, user, matches_to_show)
+    await session.release()
     
     # Формируем сообщение с вариантами
     await callback.message.edit_text(
@@ -197,9 +208,7 @@ async def show_more_users(callback: CallbackQuery, state: FSMContext, session: A
     )
     
     # Формируем описание каждого варианта
-    for i, match in enumerate(matches_to_show, 1):
-        # Получаем общие интересы
-        common_interests = await get_common_interests(session, user, match)
+    for i, (match, common_interests) in enumerate(zip(matches_to_show, matches_interests), 1):
         interests_text = ", ".join([f"{interest.emoji} {interest.name}" for interest in common_interests])
         
         user_info = (
@@ -207,7 +216,7 @@ async def show_more_users(callback: CallbackQuery, state: FSMContext, session: A
             f"   Номер: №{match.user_number}\n"
             f"   Отдел: {match.department}\n"
             f"   Интересы: {interests_text}\n"
-            f"   Доступен: {format_weekdays(match.available_days)}, {match.available_time_slot}"
+            f"   Доступен: {format_weekdays(match.schedule_mask)}, {match.available_time_slot}"
         )
         
         await callback.bot.send_message(
@@ -224,115 +233,22 @@ async def show_more_users(callback: CallbackQuery, state: FSMContext, session: A
     )
 
 
-async def find_potential_matches(session: AsyncSession, user: User, exclude_ids=None):
-    """
-    Находит потенциальных собеседников для пользователя.
-    
-    :param session: Сессия базы данных
-    :param user: Пользователь, для которого ищем собеседников
-    :param exclude_ids: Список ID пользователей, которых нужно исключить из поиска
-    :return: Список потенциальных собеседников
+async def get_common_interests(session: AsyncSession, user: User, matches: List[User]) -> List[List[CatalogInterest]]:
     """
-    if exclude_ids is None:
-        exclude_ids = []
-    
-    # Добавляем ID самого пользователя в список исключений
-    exclude_ids.append(user.telegram_id)
-    
-    # Получаем всех активных пользователей, кроме исключенных
-    query = select(User).where(
-        User.is_active == True,
-        User.registration_complete == True,
-        User.telegram_id.notin_(exclude_ids)
-    )
-    
-    # Фильтрация по формату встречи, если указан
-    if user.meeting_format and user.meeting_format.value != "Не важно":
-        query = query.where(
-            or_(
-                User.meeting_format == user.meeting_format,
-                User.meeting_format.is_(None),
-                User.meeting_format.value == "Не важно"
-            )
-        )
-    
-    # Получаем список последних встреч пользователя
-    recent_meetings = await get_user_meetings(session, user.telegram_id, limit=5)
-    recent_partner_ids = []
-    
-    for meeting in recent_meetings:
-        if meeting.user1_id == user.telegram_id:
-            recent_partner_ids.append(meeting.user2_id)
-        else:
-            recent_partner_ids.append(meeting.user1_id)
-    
-    # Исключаем недавних собеседников
-    if recent_partner_ids:
-        query = query.where(User.telegram_id.notin_(recent_partner_ids))
+    Находит общие интересы пользователя с каждым из кандидатов.
     
-    # Получаем потенциальных собеседников
-    result = await session.execute(query)
-    potential_matches = result.scalars().all()
-    
-    # Сортируем по количеству общих интересов
-    matches_with_scores = []
-    for match in potential_matches:
-        common_interests = await get_common_interests(session, user, match)
-        matches_with_scores.append((match, len(common_interests)))
-    
-    # Сортируем по количеству общих интересов (от большего к меньшему)
-    matches_with_scores.sort(key=lambda x: x[1], reverse=True)
-    
-    # Возвращаем только пользователей, без оценок
-    return [match for match, score in matches_with_scores if score > 0]
-
-
-async def get_common_interests(session: AsyncSession, user1: User, user2: User):
-    """
-    Находит общие интересы между двумя пользователями.
+    Интересы пользователя и кандидатов должны быть уже загружены
+    (get_user_with_interests, get_cached_candidates): пересечение считается
+    по битовым маскам справочника в памяти, без запросов к базе.
     
     :param session: Сессия базы данных
-    :param user1: Первый пользователь
-    :param user2: Второй пользователь
-    :return: Список общих интересов
+    :param user: Пользователь с загруженными интересами
+    :param matches: Кандидаты с загруженными интересами
+    :return: Списки общих интересов в порядке кандидатов
     """
-    # Получаем ID интересов первого пользователя
-    user1_interests = [interest.id for interest in user1.interests]
-    
-    # Получаем ID интересов второго пользователя
-    user2_interests = [interest.id for interest in user2.interests]
-    
-    # Находим пересечение
-    common_interest_ids = set(user1_interests) & set(user2_interests)
-    
-    # Получаем объекты интересов
-    common_interests = []
-    for interest_id in common_interest_ids:
-        interest = await session.get(Interest, interest_id)
-        if interest:
-            common_interests.append(interest)
-    
-    return common_interests
-
-
-# Добавим функцию форматирования дней недели
-def format_weekdays(days_str):
-    """
-    Форматирует строку с днями недели в удобочитаемый формат
-    
-    :param days_str: Строка с днями недели, разделенными запятыми
-    :return: Отформатированная строка
-    """
-    if not days_str:
-        return "Не указаны"
-    
-    days_list = days_str.split(",")
-    days_names = {
-        "monday": "Пн",
-        "tuesday": "Вт",
-        "wednesday": "Ср",
-        "thursday": "Чт",
-        "friday": "Пт"
-    }
-    
-    return ", ".join([days_names.get(day, day) for day in days_list]) 
\ No newline at end of file
+    catalog = await get_interest_catalog(session)
+    user_interest_ids = [interest.id for interest in user.interests]
+    return [
+        catalog.common(user_interest_ids, (interest.id for interest in match.interests))
+        for match in matches
+    ]
@@ -9,8 +9,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from database.models import User, Interest, MeetingFormat
-from database.interests_data import DEFAULT_INTERESTS
+from database.models import User, MeetingFormat
 from keyboards import (
     create_meeting_format_keyboard,
     create_interest_keyboard,
@@ -20,7 +19,8 @@ from keyboards import (
     create_weekday_keyboard,
     create_timeslot_keyboard
 )
-from services.user_service import get_user, create_user, update_user
+from services.user_service import get_user, create_user, update_user, set_user_interests
+from services.interest_catalog import get_interest_catalog
 from states import RegistrationStates
 
 # Создаем роутер для регистрации
@@ -242,24 +242,13 @@ async def process_location(message: Message, state: FSMContext, session: AsyncSe
         {"city": city, "office": office}
     )
     
-    # Получаем список интересов из базы данных или создаем по умолчанию
-    interests = await session.execute(select(Interest))
-    interests = interests.scalars().all()
-    
-    if not interests:
-        # Если интересов нет в базе, создаем их
-        for interest_data in DEFAULT_INTERESTS:
-            interest = Interest(name=interest_data["name"], emoji=interest_data["emoji"])
-            session.add(interest)
-        await session.commit()
-        
-        interests = await session.execute(select(Interest))
-        interests = interests.scalars().all()
+    # Список интересов берем из справочника в памяти
+    catalog = await get_interest_catalog(session)
     
     # Переходим к вопросу об интересах
     await message.answer(
         "5/6 🔹 Твои интересы (выбери 1-3 варианта):",
-        reply_markup=create_interest_keyboard(interests)
+        reply_markup=create_interest_keyboard(catalog.all())
     )
     await state.set_state(RegistrationStates.waiting_for_interests)
 
@@ -288,19 +277,12 @@ async def process_interests(callback: CallbackQuery, state: FSMContext, session:
     await state.update_data(selected_interests=selected_interests)
     
     # Получаем информацию о выбранных интересах для отображения
-    interests_info = []
-    for interest_id in selected_interests:
-        interest = await session.get(Interest, interest_id)
-        if interest:
-            interests_info.append(f"{interest.emoji} {interest.name}")
+    catalog = await get_interest_catalog(session)
+    interests_info = [interest.label for interest in catalog.by_ids(selected_interests)]
     
     # Отвечаем на callback и обновляем сообщение
     await callback.answer()
     
-    # Получаем все интересы для обновления клавиатуры
-    all_interests = await session.execute(select(Interest))
-    all_interests = all_interests.scalars().all()
-    
     if selected_interests:
         selected_text = "Выбранные интересы:\n" + "\n".join(interests_info)
         if len(selected_interests) >= 1:
@@ -310,7 +292,7 @@ async def process_interests(callback: CallbackQuery, state: FSMContext, session:
     
     await callback.message.edit_text(
         f"5/6 🔹 Твои интересы (выбери 1-3 варианта):\n\n{selected_text}",
-        reply_markup=create_interest_keyboard(all_interests, selected_interests, show_done=(len(selected_interests) >= 1))
+        reply_markup=create_interest_keyboard(catalog.all(), selected_interests, show_done=(len(selected_interests) >= 1))
     )
 
 
@@ -330,24 +312,11 @@ async def process_interests_done(callback: CallbackQuery, state: FSMContext, ses
     user_data = await state.get_data()
     selected_interests = user_data.get("selected_interests", [])
     
-    interests = []
-    for interest_id in selected_interests:
-        result = await session.execute(select(Interest).where(Interest.id == interest_id))
-        interest = result.scalar_one_or_none()
-        if interest:
-            interests.append(interest)
-    
-    # Обновляем интересы пользователя
-    await session.refresh(user, ["interests"])
-    
-    # Очищаем старые интересы
-    user.interests = []
-    await session.commit()
+    # Сохраняем только интересы, которые есть в справочнике
+    catalog = await get_interest_catalog(session)
     
-    # Добавляем новые интересы
-    for interest in interests:
-        user.interests.append(interest)
-    await session.commit()
+    # Заменяем интересы пользователя (кэш кандидатов для /find инвалидируется там же)
+    await set_user_interests(session, user, catalog.existing_ids(selected_interests))
     
     # Переходим к выбору дней недели
     await callback.message.edit_text(
@@ -15,6 +15,9 @@ from datetime import datetime
 from database.alter_table import main as alter_table_main
 from database.update_values import main as update_values_main
 from database.migrate_schedule import run_migration as run_user_numbering
+from database.create_indexes import create_indexes
+from database.backfill_pair_history import backfill_pair_history
+from database.add_schedule_mask import add_schedule_mask
 from database.models import Base, Meeting
 from database.db import DATABASE_URL
 
@@ -130,6 +133,18 @@ if __name__ == "__main__":
         # Запускаем новую миграцию для тестового режима
         logger.info("Запуск обновления схемы meetings...")
         asyncio.run(update_meetings_schema())
+        
+        # Строим индексы для горячих запросов к встречам и фидбеку
+        logger.info("Создание индексов...")
+        asyncio.run(create_indexes())
+        
+        # Заполняем историю пар по существующим встречам
+        logger.info("Заполнение pair_history...")
+        asyncio.run(backfill_pair_history())
+        
+        # Собираем маски расписания из строк дней и временных слотов
+        logger.info("Заполнение масок расписания...")
+        asyncio.run(add_schedule_mask())
         logger.info("Миграция завершена")
         
     except Exception as e:
@@ -7,15 +7,21 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 from aiogram import Bot
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select, and_
+from sqlalchemy.orm import joinedload
 
 from database.db import get_session
-from database.models import User, Meeting
-from handlers.notifications import send_meeting_reminder, send_feedback_request, send_reactivation_reminder
-from services.meeting_service import create_meeting, get_pending_feedback_meetings
+from database.models import Meeting
+from handlers.notifications import send_feedback_requests, send_reactivation_reminder
+from services.meeting_service import create_meetings_bulk, get_pending_feedback_meetings
+from services.user_service import get_active_users_with_interests
+from services.pair_history_service import get_recent_partners
+from services.candidate_cache_service import refresh_candidate_cache
+from services.broadcast_service import BroadcastMessage
+from services.outbox_service import wake_outbox_dispatcher
+from services.reminder_service import reload_meeting_reminders
+from services.matching import MatchingEngine, format_weekdays
 from services.test_mode_service import is_test_mode_active
-from collections import defaultdict
-import random
 
 logger = logging.getLogger(__name__)
 
@@ -31,70 +37,43 @@ async def weekly_pairing_job():
     
     session = get_session()()
     try:
-        # Получаем всех активных пользователей
-        query = select(User).where(
-            User.is_active == True,
-            User.registration_complete == True
-        )
-        result = await session.execute(query)
-        active_users = result.scalars().all()
+        # Получаем всех активных пользователей вместе с интересами одним запросом
+        active_users = await get_active_users_with_interests(session)
         
         # Создаем пары только если есть хотя бы 2 пользователя
         if len(active_users) < 2:
             logger.info("Недостаточно активных пользователей для создания пар")
             return
         
-        # Создаем пары и отправляем уведомления
+        # Создаем пары; уведомления записываются в очередь outbox в той же транзакции
         paired_users = await create_pairs(session, active_users)
         logger.info(f"Создано {len(paired_users) // 2} пар")
         
-        # Отправляем уведомления
-        await send_pairing_notifications(paired_users)
+        # Уведомления отправит диспетчер очереди, не дожидаясь своего интервала
+        wake_outbox_dispatcher()
         
     except Exception as e:
         logger.error(f"Ошибка при создании пар: {e}", exc_info=True)
+        return
     finally:
         await session.close()
+    
+    # После раунда списки кандидатов для /find заметно меняются - пересчитываем сразу;
+    # ошибка пересчета не выдается за ошибку создания пар
+    await refresh_candidates_job()
 
 
-async def check_meetings_job():
+async def refresh_candidates_job():
     """
-    Задача по проверке предстоящих встреч и отправке напоминаний.
+    Задача по пересчету кэша кандидатов для /find.
     """
-    logger.info("Запущена задача проверки предстоящих встреч")
+    logger.info("Запущена задача пересчета кэша кандидатов")
     
     session = get_session()()
     try:
-        # Получаем встречи, которые состоятся в ближайший час
-        now = datetime.now()
-        one_hour_later = now + timedelta(hours=1)
-        
-        # Учитываем тестовый режим, если он активен
-        if is_test_mode_active():
-            from services.test_mode_service import get_accelerated_date
-            now = get_accelerated_date(now)
-            one_hour_later = get_accelerated_date(one_hour_later)
-        
-        query = select(Meeting).where(
-            and_(
-                Meeting.scheduled_date >= now,
-                Meeting.scheduled_date <= one_hour_later,
-                Meeting.is_completed == False,
-                Meeting.is_cancelled == False
-            )
-        )
-        
-        result = await session.execute(query)
-        upcoming_meetings = result.scalars().all()
-        
-        # Отправляем напоминания
-        for meeting in upcoming_meetings:
-            await send_meeting_reminder(bot, session, meeting.id)
-        
-        logger.info(f"Отправлены напоминания для {len(upcoming_meetings)} встреч")
-        
+        await refresh_candidate_cache(session)
     except Exception as e:
-        logger.error(f"Ошибка при проверке встреч: {e}", exc_info=True)
+        logger.error(f"Ошибка при пересчете кэша кандидатов: {e}", exc_info=True)
     finally:
         await session.close()
 
@@ -117,7 +96,10 @@ async def check_feedback_job():
             yesterday = get_accelerated_date(yesterday)
             today = get_accelerated_date(today)
         
-        query = select(Meeting).where(
+        # Встречи загружаются вместе с обоими участниками одним запросом
+        query = select(Meeting).options(
+            joinedload(Meeting.user1), joinedload(Meeting.user2)
+        ).where(
             and_(
                 Meeting.scheduled_date >= yesterday,
                 Meeting.scheduled_date <= today,
@@ -130,11 +112,11 @@ async def check_feedback_job():
         result = await session.execute(query)
         completed_meetings = result.scalars().all()
         
-        # Отправляем запросы на фидбек
-        for meeting in completed_meetings:
-            await send_feedback_request(bot, session, meeting.id)
+        # Ставим запросы на фидбек в очередь outbox и отмечаем встречи одним UPDATE
+        count = await send_feedback_requests(session, list(completed_meetings))
+        wake_outbox_dispatcher()
         
-        logger.info(f"Отправлены запросы фидбека для {len(completed_meetings)} встреч")
+        logger.info(f"Поставлены в очередь запросы фидбека для {count} встреч")
         
     except Exception as e:
         logger.error(f"Ошибка при проверке фидбека: {e}", exc_info=True)
@@ -162,156 +144,78 @@ async def create_pairs(session, users):
     Создает пары пользователей на основе их интересов и предыдущих встреч.
     
     :param session: Сессия базы данных
-    :param users: Список активных пользователей
+    :param users: Список активных пользователей с загруженными интересами
     :return: Список пар (кортежей пользователей)
     """
-    # Предварительно загружаем интересы всех пользователей для избежания lazy loading
-    for user in users:
-        # Явно загружаем interests для каждого пользователя
-        await session.refresh(user, ["interests"])
+    # Собеседники, с которыми пользователи встречались в пределах окна исключения
+    # (PAIR_EXCLUSION_WEEKS), одним запросом к pair_history; интересы уже загружены
+    engine = MatchingEngine(users, await get_recent_partners(session))
     
-    # Словарь для хранения последних партнеров каждого пользователя
-    recent_partners = defaultdict(set)
+    # Стратегия из PAIRING_STRATEGY: greedy (жадный подбор) или max_weight
+    # (паросочетание максимального веса с ограничением по времени и жадным добором).
+    # Подбор занимает до PAIRING_TIME_BUDGET секунд, поэтому выполняется в отдельном
+    # потоке, чтобы бот продолжал отвечать; сессия в поток не передается
+    pairs = await asyncio.to_thread(engine.pair_all)
     
-    # Получаем последние встречи для каждого пользователя
-    for user in users:
-        # Получаем последние встречи (до 5)
-        meetings_query = select(Meeting).where(
-            or_(
-                Meeting.user1_id == user.telegram_id,
-                Meeting.user2_id == user.telegram_id
-            )
-        ).order_by(Meeting.created_at.desc()).limit(5)
-        
-        meetings_result = await session.execute(meetings_query)
-        recent_meetings = meetings_result.scalars().all()
-        
-        # Добавляем партнеров в множество
-        for meeting in recent_meetings:
-            if meeting.user1_id == user.telegram_id:
-                recent_partners[user.telegram_id].add(meeting.user2_id)
-            else:
-                recent_partners[user.telegram_id].add(meeting.user1_id)
-    
-    # Создаем копию списка пользователей для работы
-    available_users = users.copy()
-    random.shuffle(available_users)
+    # Сохраняем все встречи раунда и уведомления о них одной транзакцией: либо весь раунд, либо ничего
+    await create_meetings_bulk(
+        session,
+        [(user.telegram_id, partner.telegram_id) for user, partner in pairs],
+        build_notifications=lambda meeting_ids: build_pairing_notifications(pairs, meeting_ids)
+    )
     
     paired_users = []
+    for user, partner in pairs:
+        paired_users.extend([user, partner])
     
-    # Проходим по всем пользователям и пытаемся найти подходящую пару
-    while len(available_users) >= 2:
-        user = available_users.pop(0)
-        
-        # Формируем список потенциальных партнеров
-        potential_partners = []
-        
-        for potential_partner in available_users:
-            # Проверяем, был ли партнер недавно
-            if potential_partner.telegram_id in recent_partners[user.telegram_id]:
-                continue
-            
-            # Проверяем форматы встреч
-            if (user.meeting_format and potential_partner.meeting_format and
-                user.meeting_format != potential_partner.meeting_format and
-                user.meeting_format.value != "Не важно" and 
-                potential_partner.meeting_format.value != "Не важно"):
-                continue
-            
-            # Находим общие интересы (теперь interests уже загружены)
-            common_interests = set(interest.id for interest in user.interests) & set(interest.id for interest in potential_partner.interests)
-            
-            # Добавляем пользователя с весом по количеству общих интересов
-            potential_partners.append((potential_partner, len(common_interests)))
-        
-        # Если есть потенциальные партнеры, выбираем по общим интересам
-        if potential_partners:
-            # Сортируем по количеству общих интересов (от большего к меньшему)
-            potential_partners.sort(key=lambda x: x[1], reverse=True)
-            
-            # Берем первые 3 или все, если их меньше
-            top_partners = potential_partners[:min(3, len(potential_partners))]
-            
-            # Случайно выбираем одного из топ-партнеров
-            selected_partner, _ = random.choice(top_partners)
-            
-            # Удаляем выбранного партнера из доступных
-            available_users.remove(selected_partner)
-            
-            # Добавляем пару в результат
-            paired_users.extend([user, selected_partner])
-            
-            # Создаем встречу в базе данных
-            await create_meeting(session, user.telegram_id, selected_partner.telegram_id)
-        
     return paired_users
 
 
-async def send_pairing_notifications(paired_users):
+def build_pairing_notifications(pairs, meeting_ids):
     """
-    Отправляет уведомления о созданных парах.
+    Формирует уведомления о созданных парах для очереди outbox.
     
-    :param paired_users: Список пользователей, разбитых на пары
+    :param pairs: Список пар пользователей
+    :param meeting_ids: ID встреч в порядке пар
+    :return: Список пар (ключ идемпотентности, сообщение)
     """
-    # Проходим по парам и отправляем уведомления
-    for i in range(0, len(paired_users), 2):
-        if i + 1 < len(paired_users):
-            user1 = paired_users[i]
-            user2 = paired_users[i + 1]
-            
-            # Формируем сообщение для первого пользователя
-            message1 = (
-                f"🎉 Хорошие новости! Мы нашли тебе собеседника для неслучайной встречи!\n\n"
-                f"*Твой собеседник: {user2.full_name}*\n"
-                f"№{user2.user_number}\n"
-                f"Подразделение: {user2.department}, {user2.role}\n"
-                f"Формат встреч: {user2.meeting_format.value if user2.meeting_format else 'Не указан'}\n"
-                f"Доступные дни: {format_weekdays(user2.available_days)}\n"
-                f"Удобное время: {user2.available_time_slot}\n\n"
-                f"Напиши собеседнику напрямую, чтобы договориться о встрече: @{user2.username}"
-            )
-            
-            # Формируем сообщение для второго пользователя
-            message2 = (
-                f"🎉 Хорошие новости! Мы нашли тебе собеседника для неслучайной встречи!\n\n"
-                f"*Твой собеседник: {user1.full_name}*\n"
-                f"№{user1.user_number}\n"
-                f"Подразделение: {user1.department}, {user1.role}\n"
-                f"Формат встреч: {user1.meeting_format.value if user1.meeting_format else 'Не указан'}\n"
-                f"Доступные дни: {format_weekdays(user1.available_days)}\n"
-                f"Удобное время: {user1.available_time_slot}\n\n"
-                f"Напиши собеседнику напрямую, чтобы договориться о встрече: @{user1.username}"
-            )
-            
-            # Отправляем сообщения
-            try:
-                await bot.send_message(user1.telegram_id, message1, parse_mode="Markdown")
-            except Exception as e:
-                logger.error(f"Ошибка при отправке уведомления пользователю {user1.telegram_id}: {e}")
-            
-            try:
-                await bot.send_message(user2.telegram_id, message2, parse_mode="Markdown")
-            except Exception as e:
-                logger.error(f"Ошибка при отправке уведомления пользователю {user2.telegram_id}: {e}")
-
-
-def format_weekdays(days_str):
-    """
-    Форматирует строку с днями недели в удобочитаемый формат
-    """
-    if not days_str:
-        return "Не указаны"
+    notifications = []
     
-    days_list = days_str.split(",")
-    days_names = {
-        "monday": "Пн",
-        "tuesday": "Вт",
-        "wednesday": "Ср",
-        "thursday": "Чт",
-        "friday": "Пт"
-    }
+    for (user1, user2), meeting_id in zip(pairs, meeting_ids):
+        # Формируем сообщение для первого пользователя
+        message1 = (
+            f"🎉 Хорошие новости! Мы нашли тебе собеседника для неслучайной встречи!\n\n"
+            f"*Твой собеседник: {user2.full_name}*\n"
+            f"№{user2.user_number}\n"
+            f"Подразделение: {user2.department}, {user2.role}\n"
+            f"Формат встреч: {user2.meeting_format.value if user2.meeting_format else 'Не указан'}\n"
+            f"Доступные дни: {format_weekdays(user2.schedule_mask)}\n"
+            f"Удобное время: {user2.available_time_slot}\n\n"
+            f"Напиши собеседнику напрямую, чтобы договориться о встрече: @{user2.username}"
+        )
+        
+        # Формируем сообщение для второго пользователя
+        message2 = (
+            f"🎉 Хорошие новости! Мы нашли тебе собеседника для неслучайной встречи!\n\n"
+            f"*Твой собеседник: {user1.full_name}*\n"
+            f"№{user1.user_number}\n"
+            f"Подразделение: {user1.department}, {user1.role}\n"
+            f"Формат встреч: {user1.meeting_format.value if user1.meeting_format else 'Не указан'}\n"
+            f"Доступные дни: {format_weekdays(user1.schedule_mask)}\n"
+            f"Удобное время: {user1.available_time_slot}\n\n"
+            f"Напиши собеседнику напрямую, чтобы договориться о встрече: @{user1.username}"
+        )
+        
+        notifications.append((
+            f"pairing:{meeting_id}:{user1.telegram_id}",
+            BroadcastMessage(user1.telegram_id, message1, parse_mode="Markdown")
+        ))
+        notifications.append((
+            f"pairing:{meeting_id}:{user2.telegram_id}",
+            BroadcastMessage(user2.telegram_id, message2, parse_mode="Markdown")
+        ))
     
-    return ", ".join([days_names.get(day, day) for day in days_list])
+    return notifications
 
 
 def setup_scheduler(bot=None):
@@ -350,14 +254,6 @@ def setup_scheduler(bot=None):
             replace_existing=True
         )
         
-        # Проверка предстоящих встреч - каждые 2 минуты (1 рабочий день = 12 минут)
-        _scheduler.add_job(
-            check_meetings_job,
-            trigger=IntervalTrigger(minutes=2),
-            id="check_meetings_test",
-            replace_existing=True
-        )
-        
         # Проверка фидбека - каждые 12 минут
         _scheduler.add_job(
             check_feedback_job,
@@ -385,14 +281,6 @@ def setup_scheduler(bot=None):
             replace_existing=True
         )
         
-        # Проверка предстоящих встреч (каждый час)
-        _scheduler.add_job(
-            check_meetings_job,
-            trigger=CronTrigger(hour="*", minute=0),
-            id="check_meetings",
-            replace_existing=True
-        )
-        
         # Проверка фидбека (каждый день в 18:00)
         _scheduler.add_job(
             check_feedback_job,
@@ -409,6 +297,15 @@ def setup_scheduler(bot=None):
             replace_existing=True
         )
     
+    # Пересчет кэша кандидатов для /find: при запуске и затем с интервалом
+    _scheduler.add_job(
+        refresh_candidates_job,
+        trigger=IntervalTrigger(minutes=float(os.getenv("CANDIDATE_CACHE_REFRESH_MINUTES", "60"))),
+        id="refresh_candidates",
+        next_run_time=datetime.now(),
+        replace_existing=True
+    )
+    
     # Запускаем планировщик
     _scheduler.start()
     return _scheduler
@@ -420,4 +317,6 @@ def reconfigure_scheduler():
     Вызывается при включении/отключении тестового режима.
     """
     logger.info("Перенастройка планировщика")
+    # Время напоминаний зависит от режима: в тестовом режиме время ускорено
+    reload_meeting_reminders()
     return setup_scheduler(bot=globals().get("bot")) 
\ No newline at end of file
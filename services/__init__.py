@@ -1,18 +1,49 @@
 from services.user_service import (
-    get_user, create_user, update_user, add_user_topic, 
-    remove_user_topic, get_active_users, get_matching_users, 
-    get_recent_meeting_partners
+    get_user, get_user_with_interests, create_user, update_user, add_user_topic, 
+    remove_user_topic, set_user_interests, get_active_users,
+    get_active_users_with_interests, get_recent_meeting_partners
 )
 from services.meeting_service import (
-    create_meeting, get_meeting, update_meeting, 
-    get_user_meetings, get_pending_feedback_meetings, 
-    create_meetings_for_users, add_feedback
+    create_meeting, get_meeting, get_meetings_with_participants, update_meeting, 
+    get_user_meetings, get_pending_feedback_meetings, build_pending_feedback_query,
+    iter_pending_feedback, create_meetings_bulk, create_meetings_for_users, add_feedback
+)
+from services.pair_history_service import (
+    normalize_pair, get_exclusion_window, record_pairs,
+    get_recent_partners, has_met_recently
+)
+from services.candidate_cache_service import (
+    get_cache_size, get_refresh_block_size, refresh_candidate_cache, get_cached_candidates,
+    invalidate_user, invalidate_pairs
+)
+from services.candidate_search_service import search_candidates
+from services.broadcast_service import (
+    BroadcastMessage, BroadcastFailure, BroadcastStats, Broadcaster, TokenBucket, broadcast
+)
+from services.outbox_service import (
+    enqueue_messages, dispatch_outbox, purge_outbox, OutboxDispatcher, wake_outbox_dispatcher
+)
+from services.interest_catalog import (
+    CatalogInterest, InterestCatalog, get_interest_catalog, reload_interest_catalog
+)
+from services.reminder_service import (
+    get_reminder_lead, ReminderTimers, schedule_meeting_reminder, reload_meeting_reminders
 )
 
 __all__ = [
-    'get_user', 'create_user', 'update_user', 'add_user_topic',
-    'remove_user_topic', 'get_active_users', 'get_matching_users',
-    'get_recent_meeting_partners', 'create_meeting', 'get_meeting',
+    'get_user', 'get_user_with_interests', 'create_user', 'update_user', 'add_user_topic',
+    'remove_user_topic', 'set_user_interests', 'get_active_users',
+    'get_active_users_with_interests', 'get_recent_meeting_partners',
+    'create_meeting', 'get_meeting', 'get_meetings_with_participants',
     'update_meeting', 'get_user_meetings', 'get_pending_feedback_meetings',
-    'create_meetings_for_users', 'add_feedback'
+    'build_pending_feedback_query', 'iter_pending_feedback',
+    'create_meetings_bulk', 'create_meetings_for_users', 'add_feedback',
+    'normalize_pair', 'get_exclusion_window', 'record_pairs',
+    'get_recent_partners', 'has_met_recently',
+    'get_cache_size', 'get_refresh_block_size', 'refresh_candidate_cache', 'get_cached_candidates',
+    'invalidate_user', 'invalidate_pairs', 'search_candidates',
+    'BroadcastMessage', 'BroadcastFailure', 'BroadcastStats', 'Broadcaster', 'TokenBucket', 'broadcast',
+    'enqueue_messages', 'dispatch_outbox', 'purge_outbox', 'OutboxDispatcher', 'wake_outbox_dispatcher',
+    'CatalogInterest', 'InterestCatalog', 'get_interest_catalog', 'reload_interest_catalog',
+    'get_reminder_lead', 'ReminderTimers', 'schedule_meeting_reminder', 'reload_meeting_reminders'
 ] 
\ No newline at end of file
@@ -0,0 +1,244 @@
+"""
+Массовая рассылка сообщений с учетом лимитов Telegram.
+
+Сообщения отправляются несколькими параллельными обработчиками. Общий темп
+ограничивается ведром токенов (Telegram допускает около 30 сообщений
+в секунду на бота), сообщения в один чат разносятся по времени, а при ответе
+RetryAfter рассылка целиком приостанавливается на указанное Telegram время
+и сообщение отправляется повторно.
+"""
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter,
+    TelegramServerError
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BroadcastMessage:
+    """Сообщение рассылки: аргументы bot.send_message и ключ для сопоставления результата"""
+    chat_id: int
+    text: str
+    reply_markup: Optional[Any] = None
+    parse_mode: Optional[str] = None
+    key: Optional[Any] = None
+
+
+@dataclass
+class BroadcastFailure:
+    """Неотправленное сообщение; permanent - повторная отправка не поможет"""
+    message: BroadcastMessage
+    error: str
+    permanent: bool
+
+
+@dataclass
+class BroadcastStats:
+    """Итоги рассылки"""
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    blocked: int = 0
+    retries: int = 0
+    elapsed: float = 0.0
+    delivered: List[BroadcastMessage] = field(default_factory=list)
+    failures: List[BroadcastFailure] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        """Отправлено сообщений в секунду"""
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"отправлено {self.sent} из {self.total}, ошибок {self.failed} "
+            f"(заблокировали бота {self.blocked}), повторов {self.retries}, "
+            f"{self.elapsed:.1f} с ({self.throughput:.1f} сообщ./с)"
+        )
+
+
+class TokenBucket:
+    """
+    Ведро токенов: в среднем не больше rate операций в секунду,
+    всплеск - не больше capacity операций подряд.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = asyncio.get_running_loop().time()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Ждет и забирает один токен"""
+        loop = asyncio.get_running_loop()
+        # Ожидающие обслуживаются по очереди: блокировка держится на время ожидания
+        async with self._lock:
+            while True:
+                now = loop.time()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Приостанавливает выдачу токенов на seconds секунд (ответ RetryAfter)"""
+        now = asyncio.get_running_loop().time()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0
+        self._updated = self._paused_until
+
+
+class Broadcaster:
+    """
+    Рассылка с ограничением параллельности, общего темпа и темпа в один чат.
+
+    :param bot: Бот для отправки сообщений
+    :param concurrency: Количество одновременно отправляемых сообщений
+    :param rate: Общий лимит сообщений в секунду
+    :param chat_interval: Минимальный интервал между сообщениями в один чат, с
+    :param max_retries: Сколько раз повторять сообщение при сетевых ошибках
+        и ошибках сервера Telegram (ответы RetryAfter не ограничены этим числом)
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        concurrency: int = 20,
+        rate: float = 25.0,
+        chat_interval: float = 1.0,
+        max_retries: int = 3
+    ):
+        self.bot = bot
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+
+    @classmethod
+    def from_env(cls, bot: Bot) -> "Broadcaster":
+        """
+        Рассылка с настройками из переменных BROADCAST_CONCURRENCY (20),
+        BROADCAST_RATE (25 сообщений в секунду), BROADCAST_CHAT_INTERVAL (1 с)
+        и BROADCAST_MAX_RETRIES (3).
+        """
+        return cls(
+            bot,
+            concurrency=int(os.getenv("BROADCAST_CONCURRENCY", "20")),
+            rate=float(os.getenv("BROADCAST_RATE", "25")),
+            chat_interval=float(os.getenv("BROADCAST_CHAT_INTERVAL", "1.0")),
+            max_retries=int(os.getenv("BROADCAST_MAX_RETRIES", "3"))
+        )
+
+    async def run(self, messages: Iterable[BroadcastMessage]) -> BroadcastStats:
+        """
+        Отправляет сообщения и возвращает итоги рассылки.
+        Ошибки отдельных сообщений не прерывают рассылку.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        stats = BroadcastStats()
+        bucket = TokenBucket(self.rate)
+        # Сообщения в один чат отправляются по очереди, не чаще chat_interval
+        chat_locks: Dict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+        last_sent: Dict[int, float] = {}
+
+        messages = list(messages)
+        stats.total = len(messages)
+        # Общий итератор: каждый обработчик берет следующее еще не взятое сообщение
+        pending = iter(messages)
+
+        async def worker():
+            for message in pending:
+                async with chat_locks[message.chat_id]:
+                    if message.chat_id in last_sent:
+                        delay = last_sent[message.chat_id] + self.chat_interval - loop.time()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                    await self._send(message, bucket, stats)
+                    last_sent[message.chat_id] = loop.time()
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, stats.total))))
+
+        stats.elapsed = loop.time() - started
+        return stats
+
+    async def _send(self, message: BroadcastMessage, bucket: TokenBucket, stats: BroadcastStats) -> None:
+        """Отправляет одно сообщение с повторами"""
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            try:
+                await self.bot.send_message(
+                    chat_id=message.chat_id,
+                    text=message.text,
+                    reply_markup=message.reply_markup,
+                    parse_mode=message.parse_mode
+                )
+                stats.sent += 1
+                stats.delivered.append(message)
+                return
+            except TelegramRetryAfter as e:
+                # Лимит превышен: останавливаем всю рассылку, а не только этот обработчик
+                logger.warning(f"Telegram просит подождать {e.retry_after} с (чат {message.chat_id})")
+                bucket.pause(e.retry_after)
+                stats.retries += 1
+            except (TelegramNetworkError, TelegramServerError) as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    self._fail(message, e, stats, permanent=False)
+                    return
+                stats.retries += 1
+                await asyncio.sleep(2 ** (attempt - 1))
+            except TelegramForbiddenError as e:
+                # Пользователь заблокировал бота - повторять бессмысленно
+                stats.blocked += 1
+                self._fail(message, e, stats, permanent=True)
+                return
+            except TelegramBadRequest as e:
+                # Некорректное сообщение или несуществующий чат
+                self._fail(message, e, stats, permanent=True)
+                return
+            except Exception as e:
+                self._fail(message, e, stats, permanent=False)
+                return
+
+    @staticmethod
+    def _fail(message: BroadcastMessage, error: Exception, stats: BroadcastStats, permanent: bool) -> None:
+        stats.failed += 1
+        stats.failures.append(BroadcastFailure(message, str(error), permanent))
+        logger.error(f"Ошибка при отправке сообщения пользователю {message.chat_id}: {error}")
+
+
+async def broadcast(bot: Bot, messages: Iterable[BroadcastMessage], name: str = "рассылка") -> BroadcastStats:
+    """
+    Отправляет сообщения с настройками из переменных окружения и пишет итоги в лог.
+
+    Args:
+        bot: Бот для отправки сообщений
+        messages: Сообщения рассылки
+        name: Название рассылки для лога
+
+    Returns:
+        Итоги рассылки
+    """
+    stats = await Broadcaster.from_env(bot).run(messages)
+    logger.info(f"Рассылка «{name}» завершена: {stats}")
+    return stats
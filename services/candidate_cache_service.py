@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import bindparam, delete, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from database.models import CandidateCache, PairHistory, User
+from services.matching import MatchingEngine
+from services.candidate_search_service import search_candidates
+
+logger = logging.getLogger(__name__)
+
+# Отметка пустого списка: строка с rank 0 (страницы читаются с rank > 0),
+# чтобы для пользователя без кандидатов поиск не повторялся при каждом /find
+EMPTY_LIST_RANK = 0
+
+
+def get_cache_size() -> int:
+    """
+    Сколько лучших кандидатов хранить для каждого пользователя.
+    Задается переменной CANDIDATE_CACHE_SIZE (по умолчанию 30).
+    """
+    return int(os.getenv("CANDIDATE_CACHE_SIZE", "30"))
+
+
+async def _store_candidates(
+    session: AsyncSession,
+    candidates: Dict[int, Sequence[Tuple[int, int]]],
+    computed_at: datetime
+) -> None:
+    """
+    Добавляет списки кандидатов одним executemany-запросом (без commit).
+    Для пустого списка сохраняется отметка EMPTY_LIST_RANK.
+    """
+    rows = [
+        {
+            "user_id": user_id,
+            "rank": rank,
+            "candidate_id": candidate_id,
+            "score": score,
+            "computed_at": computed_at,
+        }
+        for user_id, user_candidates in candidates.items()
+        for rank, (candidate_id, score) in (
+            enumerate(user_candidates, 1) if user_candidates else [(EMPTY_LIST_RANK, (user_id, 0))]
+        )
+    ]
+    if rows:
+        await session.execute(CandidateCache.__table__.insert(), rows)
+
+
+def get_refresh_block_size() -> int:
+    """
+    Сколько пользователей обновлять в кэше одной транзакцией.
+    Задается переменной CANDIDATE_CACHE_REFRESH_BLOCK (по умолчанию 500).
+    """
+    return int(os.getenv("CANDIDATE_CACHE_REFRESH_BLOCK", "500"))
+
+
+async def refresh_candidate_cache(session: AsyncSession) -> int:
+    """
+    Пересчитывает кэш кандидатов для всех активных пользователей.
+
+    Кандидаты считаются движком подбора в памяти, а кэш заменяется блоками
+    по CANDIDATE_CACHE_REFRESH_BLOCK пользователей, каждый блок - отдельной
+    короткой транзакцией, чтобы не держать блокировку записи SQLite на время
+    всей перезаписи. Пока идет замена, часть пользователей видит прежние
+    списки. Изменения, сделанные во время расчета (новые встречи, изменения
+    профиля), инвалидируются после замены.
+
+    Args:
+        session: Сессия базы данных
+
+    Returns:
+        Количество пользователей, для которых рассчитаны кандидаты
+    """
+    started_at = datetime.utcnow()
+    engine = await MatchingEngine.load(session)
+    # Соединение не держим открытым, пока идет расчет
+    await session.commit()
+    # Оценка всех пар n x n занимает заметное время - считаем в отдельном потоке,
+    # чтобы не блокировать цикл событий бота
+    candidates = await asyncio.to_thread(engine.top_candidates, get_cache_size())
+
+    # Списки пользователей, которые больше не участвуют в подборе (чтение без блокировки записи)
+    result = await session.execute(select(CandidateCache.user_id).distinct())
+    stale_ids = [user_id for user_id in result.scalars() if user_id not in candidates]
+    await session.commit()
+
+    user_ids = list(candidates)
+    block_size = get_refresh_block_size()
+    for start in range(0, len(user_ids), block_size):
+        block = user_ids[start:start + block_size]
+        await session.execute(delete(CandidateCache).where(CandidateCache.user_id.in_(block)))
+        await _store_candidates(session, {user_id: candidates[user_id] for user_id in block}, started_at)
+        await session.commit()
+
+    table = CandidateCache.__table__
+    if stale_ids:
+        await session.execute(
+            table.delete().where(table.c.user_id == bindparam("stale_id")),
+            [{"stale_id": user_id} for user_id in stale_ids]
+        )
+
+    # Пары, встретившиеся во время расчета
+    result = await session.execute(
+        select(PairHistory.user_low_id, PairHistory.user_high_id).where(PairHistory.last_met_at >= started_at)
+    )
+    await invalidate_pairs(session, result.all())
+
+    # Пользователи, изменившие профиль во время расчета
+    result = await session.execute(select(User.telegram_id).where(User.updated_at >= started_at))
+    changed_ids = [{"changed_id": user_id} for user_id in result.scalars()]
+    if changed_ids:
+        await session.execute(
+            table.delete().where(or_(
+                table.c.user_id == bindparam("changed_id"),
+                table.c.candidate_id == bindparam("changed_id")
+            )),
+            changed_ids
+        )
+
+    await session.commit()
+    logger.info(f"Кэш кандидатов обновлен для {len(candidates)} пользователей")
+    return len(candidates)
+
+
+async def get_cached_candidates(
+    session: AsyncSession,
+    user: User,
+    cursor: int = 0,
+    count: int = 3
+) -> Tuple[List[User], int]:
+    """
+    Следующие кандидаты пользователя из кэша после позиции cursor.
+
+    Если для пользователя в кэше нет ни одной записи (новый пользователь
+    или кэш инвалидирован), список рассчитывается для него сразу одним
+    SQL-запросом (search_candidates) и сохраняется. Пустой результат тоже
+    сохраняется (отметкой EMPTY_LIST_RANK) до следующего пересчета кэша.
+
+    Args:
+        session: Сессия базы данных
+        user: Пользователь, для которого ищем собеседников
+        cursor: Позиция последнего показанного кандидата (0 - с начала списка)
+        count: Сколько кандидатов вернуть
+
+    Returns:
+        Кандидаты с загруженными интересами и новая позиция курсора
+    """
+    rows = await _read_candidates(session, user.telegram_id, cursor, count)
+
+    if not rows and cursor == 0 and not await _has_cached_candidates(session, user.telegram_id):
+        candidates = await search_candidates(session, user, get_cache_size())
+        await _store_candidates(session, {user.telegram_id: candidates}, datetime.utcnow())
+        await session.commit()
+        rows = await _read_candidates(session, user.telegram_id, cursor, count)
+
+    if not rows:
+        return [], cursor
+    return [candidate for candidate, rank in rows], rows[-1][1]
+
+
+async def _read_candidates(session: AsyncSession, user_id: int, cursor: int, count: int):
+    """Чтение страницы кандидатов по первичному ключу (user_id, rank)"""
+    result = await session.execute(
+        select(User, CandidateCache.rank)
+        .join(CandidateCache, CandidateCache.candidate_id == User.telegram_id)
+        .options(selectinload(User.interests))
+        .where(
+            CandidateCache.user_id == user_id,
+            CandidateCache.rank > cursor,
+            User.is_active == True,
+            User.registration_complete == True
+        )
+        .order_by(CandidateCache.rank)
+        .limit(count)
+    )
+    return result.all()
+
+
+async def _has_cached_candidates(session: AsyncSession, user_id: int) -> bool:
+    """Рассчитан ли для пользователя список (есть записи или отметка пустого списка)"""
+    result = await session.execute(
+        select(func.count()).select_from(CandidateCache).where(CandidateCache.user_id == user_id)
+    )
+    return result.scalar_one() > 0
+
+
+async def invalidate_user(session: AsyncSession, user_id: int) -> None:
+    """
+    Инвалидирует кэш после изменения профиля: удаляет список пользователя
+    и убирает его из списков других пользователей. Не делает commit.
+    """
+    await session.execute(
+        delete(CandidateCache).where(
+            or_(CandidateCache.user_id == user_id, CandidateCache.candidate_id == user_id)
+        )
+    )
+
+
+async def invalidate_pairs(session: AsyncSession, pairs: Iterable[Tuple[int, int]]) -> None:
+    """
+    Убирает пользователей, которым назначена встреча, из списков кандидатов
+    друг друга. Не делает commit.
+    """
+    params = [
+        {"user_id": user_id, "candidate_id": candidate_id}
+        for user1_id, user2_id in pairs
+        for user_id, candidate_id in ((user1_id, user2_id), (user2_id, user1_id))
+    ]
+    if params:
+        await session.execute(
+            CandidateCache.__table__.delete().where(
+                CandidateCache.__table__.c.user_id == bindparam("user_id"),
+                CandidateCache.__table__.c.candidate_id == bindparam("candidate_id")
+            ),
+            params
+        )
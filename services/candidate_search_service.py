@@ -0,0 +1,141 @@
+"""
+Подбор кандидатов для одного пользователя средствами базы данных.
+
+В отличие от MatchingEngine, который загружает всех активных пользователей
+в память, здесь оценка считается одним SQL-запросом: общие интересы через
+соединение user_interests с самой собой и GROUP BY, недавние собеседники
+отсекаются через NOT EXISTS по pair_history, а в Python возвращаются только
+limit лучших строк. Поэтому время и память не зависят от числа пользователей.
+
+Правила совпадают с MatchingEngine и оценщиком по умолчанию
+(InterestScheduleScorer): общие интересы плюс общие слоты расписания
+(не больше SCHEDULE_SCORE_CAP, только если расписание указано у обоих).
+Запрос использует только переносимые конструкции и работает
+как в SQLite, так и в PostgreSQL.
+"""
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, case, exists, func, literal, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import MeetingFormat, PairHistory, User, user_interests
+from services.matching.schedule import SCHEDULE_SCORE_CAP
+from services.pair_history_service import get_exclusion_window
+
+
+def _schedule_score(user_mask: int):
+    """
+    Вклад расписания в оценку: число общих слотов, не больше SCHEDULE_SCORE_CAP.
+    Слоты считаются суммой проверок битов маски пользователя, так как
+    в SQLite нет функции подсчета битов.
+    """
+    if not user_mask:
+        return literal(0)
+
+    overlap = sum(
+        case((User.schedule_mask.bitwise_and(1 << bit) != 0, 1), else_=0)
+        for bit in range(user_mask.bit_length())
+        if user_mask >> bit & 1
+    )
+    return case((overlap > SCHEDULE_SCORE_CAP, SCHEDULE_SCORE_CAP), else_=overlap)
+
+
+def build_candidates_query(
+    user: User,
+    limit: int,
+    min_common_interests: int = 1,
+    exclude_ids: Iterable[int] = (),
+    now: Optional[datetime] = None
+):
+    """
+    Строит запрос лучших кандидатов пользователя: строки (ID кандидата, оценка)
+    по убыванию оценки, при равной оценке - по ID.
+
+    :param user: Пользователь, для которого ищем собеседников
+    :param limit: Сколько кандидатов вернуть
+    :param min_common_interests: Минимальное количество общих интересов (не меньше 1)
+    :param exclude_ids: ID пользователей, которых не нужно предлагать
+    :param now: Текущее время для окна недавних встреч (по умолчанию utcnow)
+    """
+    mine = user_interests.alias("mine")
+    theirs = user_interests.alias("theirs")
+
+    # Количество общих интересов с каждым, у кого есть хотя бы один общий интерес
+    common = (
+        select(theirs.c.user_id, func.count().label("common_interests"))
+        .join(mine, mine.c.interest_id == theirs.c.interest_id)
+        .where(mine.c.user_id == user.telegram_id, theirs.c.user_id != user.telegram_id)
+        .group_by(theirs.c.user_id)
+        .having(func.count() >= max(1, min_common_interests))
+        .subquery("common")
+    )
+
+    score = (common.c.common_interests + _schedule_score(user.schedule_mask)).label("score")
+
+    cutoff = (now or datetime.utcnow()) - get_exclusion_window()
+    met_recently = exists().where(
+        PairHistory.last_met_at >= cutoff,
+        or_(
+            and_(PairHistory.user_low_id == user.telegram_id, PairHistory.user_high_id == User.telegram_id),
+            and_(PairHistory.user_high_id == user.telegram_id, PairHistory.user_low_id == User.telegram_id)
+        )
+    )
+
+    query = (
+        select(User.telegram_id, score)
+        .join(common, common.c.user_id == User.telegram_id)
+        .where(
+            User.is_active == True,
+            User.registration_complete == True,
+            ~met_recently
+        )
+        .order_by(score.desc(), User.telegram_id)
+        .limit(limit)
+    )
+
+    # Формат ANY (и не указанный формат) совместим с любым
+    if user.meeting_format not in (None, MeetingFormat.ANY):
+        query = query.where(or_(
+            User.meeting_format.is_(None),
+            User.meeting_format.in_([user.meeting_format, MeetingFormat.ANY])
+        ))
+
+    # Не указанное расписание (0) совместимо с любым
+    if user.schedule_mask:
+        query = query.where(or_(
+            User.schedule_mask == 0,
+            User.schedule_mask.bitwise_and(user.schedule_mask) != 0
+        ))
+
+    exclude_ids = list(exclude_ids)
+    if exclude_ids:
+        query = query.where(User.telegram_id.not_in(exclude_ids))
+
+    return query
+
+
+async def search_candidates(
+    session: AsyncSession,
+    user: User,
+    limit: int,
+    min_common_interests: int = 1,
+    exclude_ids: Iterable[int] = ()
+) -> List[Tuple[int, int]]:
+    """
+    Лучшие кандидаты пользователя, посчитанные в базе данных.
+
+    Args:
+        session: Сессия базы данных
+        user: Пользователь, для которого ищем собеседников
+        limit: Сколько кандидатов вернуть
+        min_common_interests: Минимальное количество общих интересов (не меньше 1)
+        exclude_ids: ID пользователей, которых не нужно предлагать
+
+    Returns:
+        Список пар (ID кандидата, оценка) по убыванию оценки
+    """
+    result = await session.execute(
+        build_candidates_query(user, limit, min_common_interests, exclude_ids)
+    )
+    return [(candidate_id, score) for candidate_id, score in result]
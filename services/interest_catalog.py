@@ -0,0 +1,117 @@
+"""
+Справочник интересов в памяти.
+
+Таблица interests маленькая и меняется только администратором, поэтому она
+читается один раз (при первом обращении или при запуске бота) и дальше
+используется без запросов к базе. После изменения таблицы справочник
+перечитывается через reload_interest_catalog (команда администратора).
+"""
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.interests_data import DEFAULT_INTERESTS
+from database.models import Interest
+from services.matching.bitmask import interests_to_mask, mask_to_interests
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CatalogInterest:
+    """Интерес из справочника (совместим с create_interest_keyboard)"""
+    id: int
+    name: str
+    emoji: Optional[str]
+
+    @property
+    def label(self) -> str:
+        """Название с эмодзи для сообщений и кнопок"""
+        return f"{self.emoji} {self.name}" if self.emoji else self.name
+
+
+class InterestCatalog:
+    """
+    Справочник интересов: id -> (название, эмодзи) и преобразования
+    между списками id и битовыми масками.
+    """
+
+    def __init__(self):
+        self._by_id: Dict[int, CatalogInterest] = {}
+        self.loaded = False
+
+    async def load(self, session: AsyncSession) -> None:
+        """
+        Загружает интересы из базы. Если таблица пуста, заполняет ее
+        интересами по умолчанию из DEFAULT_INTERESTS.
+        """
+        result = await session.execute(select(Interest.id, Interest.name, Interest.emoji).order_by(Interest.id))
+        rows = result.all()
+
+        if not rows:
+            session.add_all(
+                Interest(name=interest_data["name"], emoji=interest_data["emoji"])
+                for interest_data in DEFAULT_INTERESTS
+            )
+            await session.commit()
+            logger.info(f"Добавлено {len(DEFAULT_INTERESTS)} интересов в базу данных")
+
+            result = await session.execute(select(Interest.id, Interest.name, Interest.emoji).order_by(Interest.id))
+            rows = result.all()
+
+        self._by_id = {
+            interest_id: CatalogInterest(interest_id, name, emoji)
+            for interest_id, name, emoji in rows
+        }
+        self.loaded = True
+        logger.info(f"Справочник интересов загружен: {len(self._by_id)}")
+
+    def all(self) -> List[CatalogInterest]:
+        """Все интересы в порядке id"""
+        return list(self._by_id.values())
+
+    def get(self, interest_id: int) -> Optional[CatalogInterest]:
+        """Интерес по id (None, если такого нет)"""
+        return self._by_id.get(interest_id)
+
+    def existing_ids(self, interest_ids: Iterable[int]) -> List[int]:
+        """Оставляет только id, которые есть в справочнике, сохраняя порядок"""
+        return [interest_id for interest_id in interest_ids if interest_id in self._by_id]
+
+    def by_ids(self, interest_ids: Iterable[int]) -> List[CatalogInterest]:
+        """Интересы по списку id (неизвестные id пропускаются)"""
+        return [self._by_id[interest_id] for interest_id in self.existing_ids(interest_ids)]
+
+    def to_mask(self, interest_ids: Iterable[int]) -> int:
+        """Битовая маска известных интересов"""
+        return interests_to_mask(self.existing_ids(interest_ids))
+
+    def from_mask(self, mask: int) -> List[CatalogInterest]:
+        """Интересы из битовой маски"""
+        return self.by_ids(mask_to_interests(mask))
+
+    def common(self, first_ids: Iterable[int], second_ids: Iterable[int]) -> List[CatalogInterest]:
+        """Общие интересы двух списков id (через AND битовых масок)"""
+        return self.from_mask(self.to_mask(first_ids) & self.to_mask(second_ids))
+
+
+_catalog = InterestCatalog()
+
+
+async def get_interest_catalog(session: AsyncSession) -> InterestCatalog:
+    """
+    Возвращает справочник интересов; при первом обращении загружает его из базы.
+    Пока справочник загружен, сессия не используется.
+    """
+    if not _catalog.loaded:
+        await _catalog.load(session)
+    return _catalog
+
+
+async def reload_interest_catalog(session: AsyncSession) -> InterestCatalog:
+    """Перечитывает справочник интересов из базы (после изменений администратором)"""
+    await _catalog.load(session)
+    return _catalog
@@ -0,0 +1,17 @@
+from services.matching.bitmask import interests_to_mask, mask_to_interests, masks_to_array, popcount
+from services.matching.compatibility import CompatibilityIndex
+from services.matching.engine import MatchingEngine
+from services.matching.pairing import PAIRING_STRATEGIES, greedy_pairs, max_weight_pairs, run_pairing
+from services.matching.scoring import DEFAULT_SCORER, InterestScheduleScorer, InterestScorer, Scorer
+from services.matching.schedule import (
+    FULL_SCHEDULE_MASK, SCHEDULE_SCORE_CAP, format_weekdays, mask_to_days, mask_to_slots,
+    schedule_overlap, schedule_score, schedule_to_mask
+)
+
+__all__ = [
+    'interests_to_mask', 'mask_to_interests', 'masks_to_array', 'popcount',
+    'CompatibilityIndex', 'MatchingEngine', 'Scorer', 'InterestScorer',
+    'InterestScheduleScorer', 'DEFAULT_SCORER', 'PAIRING_STRATEGIES', 'greedy_pairs', 'max_weight_pairs',
+    'run_pairing', 'FULL_SCHEDULE_MASK', 'SCHEDULE_SCORE_CAP', 'format_weekdays',
+    'mask_to_days', 'mask_to_slots', 'schedule_overlap', 'schedule_score', 'schedule_to_mask'
+]
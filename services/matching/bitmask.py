@@ -0,0 +1,61 @@
+"""
+Битовые маски интересов.
+
+Интерес с id = k соответствует биту k маски. Для нескольких десятков интересов
+маска пользователя умещается в одно 64-битное число, а количество общих
+интересов двух пользователей - это число единичных битов в (mask1 & mask2).
+"""
+from typing import Iterable, List, Sequence
+
+import numpy as np
+
+# Количество бит в одном слове маски в массивах numpy
+WORD_BITS = 64
+
+# Таблица количества единичных битов для каждого значения байта (для numpy < 2.0)
+_BYTE_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def interests_to_mask(interest_ids: Iterable[int]) -> int:
+    """Собирает битовую маску из id интересов"""
+    mask = 0
+    for interest_id in interest_ids:
+        mask |= 1 << interest_id
+    return mask
+
+
+def mask_to_interests(mask: int) -> List[int]:
+    """Возвращает отсортированный список id интересов из битовой маски"""
+    interest_ids = []
+    position = 0
+    while mask:
+        if mask & 1:
+            interest_ids.append(position)
+        mask >>= 1
+        position += 1
+    return interest_ids
+
+
+def masks_to_array(masks: Sequence[int]) -> np.ndarray:
+    """
+    Упаковывает маски в массив uint64 формы (количество масок, количество слов).
+    Маски длиннее 64 бит разбиваются на несколько слов.
+    """
+    max_bits = max((mask.bit_length() for mask in masks), default=0)
+    words = max(1, -(-max_bits // WORD_BITS))
+    word_mask = (1 << WORD_BITS) - 1
+
+    array = np.zeros((len(masks), words), dtype=np.uint64)
+    for word in range(words):
+        shift = word * WORD_BITS
+        array[:, word] = [(mask >> shift) & word_mask for mask in masks]
+    return array
+
+
+def popcount(array: np.ndarray) -> np.ndarray:
+    """Поэлементно считает количество единичных битов в массиве uint64"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(array)
+
+    as_bytes = np.ascontiguousarray(array).view(np.uint8)
+    return _BYTE_POPCOUNT[as_bytes].reshape(array.shape + (array.itemsize,)).sum(axis=-1, dtype=np.uint8)
@@ -0,0 +1,187 @@
+"""
+Векторизованный расчет совместимости пользователей для подбора пар.
+"""
+from typing import Dict, Iterable, Optional, Sequence, Set, Union
+
+import numpy as np
+
+from database.models import MeetingFormat
+from services.matching.bitmask import interests_to_mask, masks_to_array, popcount
+from services.matching.schedule import FULL_SCHEDULE_MASK
+from services.matching.scoring import DEFAULT_SCORER, Scorer
+
+# Коды форматов встречи; 0 - формат не указан или "любой", совместим с любым другим
+FORMAT_CODES = {
+    MeetingFormat.OFFLINE: 1,
+    MeetingFormat.ONLINE: 2,
+}
+
+# Совместимость кодов форматов: FORMAT_COMPATIBLE[a, b]
+FORMAT_COMPATIBLE = np.array([
+    [True, True, True],
+    [True, True, False],
+    [True, False, True],
+])
+
+# Сколько элементов матрицы обрабатывать за один шаг при построении по блокам
+BLOCK_ELEMENTS = 4_000_000
+
+Rows = Union[None, int, slice, Sequence[int], np.ndarray]
+
+
+class CompatibilityIndex:
+    """
+    Индекс совместимости активных пользователей.
+
+    Хранит маски интересов, маски расписания, форматы встреч и недавних партнеров
+    в массивах numpy и считает оценки совместимости сразу для строки или блока строк.
+    Оценку допустимой пары считает оценщик (по умолчанию - общие интересы
+    плюс общие слоты расписания), а для недопустимых пар (тот же пользователь,
+    несовместимый формат, нет общих слотов, недавняя встреча) оценка равна -1.
+
+    Пользователи адресуются позициями 0..size-1 в порядке передачи в конструктор.
+    """
+
+    def __init__(
+        self,
+        user_ids: Sequence[int],
+        interest_masks: Sequence[int],
+        formats: Sequence[Optional[MeetingFormat]],
+        recent_partners: Optional[Dict[int, Iterable[int]]] = None,
+        schedules: Optional[Sequence[int]] = None,
+        scorer: Optional[Scorer] = None
+    ):
+        self.user_ids = list(user_ids)
+        self.scorer = scorer or DEFAULT_SCORER
+        self.size = len(self.user_ids)
+        self._positions = {user_id: position for position, user_id in enumerate(self.user_ids)}
+
+        self.masks = masks_to_array(list(interest_masks))
+        # Слова масок отдельными непрерывными массивами: выборка по столбцам из них быстрее
+        self._mask_words = [np.ascontiguousarray(self.masks[:, word]) for word in range(self.masks.shape[1])]
+        self.formats = np.array([FORMAT_CODES.get(meeting_format, 0) for meeting_format in formats], dtype=np.int8)
+        # Не указанное расписание (0) совместимо с любым
+        if schedules is None:
+            schedules = [0] * self.size
+        self.schedules = np.array([mask or FULL_SCHEDULE_MASK for mask in schedules], dtype=np.uint32)
+        # Общие слоты дают вклад в оценку, только если расписание указано у обоих
+        self.schedule_known = np.array([bool(mask) for mask in schedules], dtype=bool)
+
+        # Исключения храним симметрично: если A недавно встречался с B, то и B с A
+        excluded: Dict[int, Set[int]] = {}
+        for user_id, partners in (recent_partners or {}).items():
+            position = self._positions.get(user_id)
+            if position is None:
+                continue
+            for partner_id in partners:
+                partner = self._positions.get(partner_id)
+                if partner is None or partner == position:
+                    continue
+                excluded.setdefault(position, set()).add(partner)
+                excluded.setdefault(partner, set()).add(position)
+
+        self._no_partners = np.zeros(0, dtype=np.int64)
+        self._excluded = {
+            position: np.fromiter(partners, dtype=np.int64, count=len(partners))
+            for position, partners in excluded.items()
+        }
+
+    @classmethod
+    def from_users(
+        cls,
+        users: Sequence,
+        recent_partners: Optional[Dict[int, Iterable[int]]] = None,
+        scorer: Optional[Scorer] = None
+    ):
+        """Строит индекс по пользователям с загруженными интересами"""
+        return cls(
+            [user.telegram_id for user in users],
+            [interests_to_mask(interest.id for interest in user.interests) for user in users],
+            [user.meeting_format for user in users],
+            recent_partners,
+            [user.schedule_mask for user in users],
+            scorer
+        )
+
+    def position(self, user_id: int) -> int:
+        """Возвращает позицию пользователя в индексе"""
+        return self._positions[user_id]
+
+    def positions(self, user_ids: Iterable[int]) -> np.ndarray:
+        """Позиции пользователей из индекса; отсутствующие в индексе ID пропускаются"""
+        return np.array(
+            [self._positions[user_id] for user_id in user_ids if user_id in self._positions],
+            dtype=np.int64
+        )
+
+    def _rows(self, rows: Rows) -> np.ndarray:
+        """Приводит выборку строк к массиву позиций"""
+        if rows is None:
+            return np.arange(self.size)
+        if isinstance(rows, slice):
+            return np.arange(self.size)[rows]
+        return np.atleast_1d(np.asarray(rows, dtype=np.int64))
+
+    def common_interests(self, rows: Rows = None, columns: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Количество общих интересов: матрица len(rows) x len(columns).
+        columns - отсортированный массив позиций (по умолчанию все пользователи).
+        """
+        rows = self._rows(rows)
+        result = np.zeros((len(rows), self.size if columns is None else len(columns)), dtype=np.uint8)
+        for words in self._mask_words:
+            column_words = words if columns is None else words[columns]
+            result += popcount(words[rows][:, None] & column_words[None, :])
+        return result
+
+    def schedule_overlap(self, rows: Rows = None, columns: Optional[np.ndarray] = None) -> np.ndarray:
+        """Количество общих слотов расписания: матрица len(rows) x len(columns)"""
+        rows = self._rows(rows)
+        column_schedules = self.schedules if columns is None else self.schedules[columns]
+        return popcount(self.schedules[rows][:, None] & column_schedules[None, :])
+
+    def allowed(self, rows: Rows = None, columns: Optional[np.ndarray] = None) -> np.ndarray:
+        """Маска допустимых пар: матрица len(rows) x len(columns)"""
+        rows = self._rows(rows)
+        return self._allowed(rows, columns, self.schedule_overlap(rows, columns))
+
+    def _allowed(self, rows: np.ndarray, columns: Optional[np.ndarray], overlap: np.ndarray) -> np.ndarray:
+        """Маска допустимых пар по уже посчитанному пересечению расписаний"""
+        if columns is None:
+            columns = np.arange(self.size)
+
+        allowed = FORMAT_COMPATIBLE[self.formats[rows]][:, self.formats[columns]]
+        allowed &= overlap > 0
+
+        for index, row in enumerate(rows):
+            # Сам пользователь и его недавние партнеры недопустимы
+            excluded = self._excluded.get(int(row), self._no_partners)
+            excluded = np.append(excluded, row)
+            # Переводим позиции в номера столбцов выборки
+            found = np.searchsorted(columns, excluded)
+            inside = found < len(columns)
+            found, excluded = found[inside], excluded[inside]
+            allowed[index, found[columns[found] == excluded]] = False
+        return allowed
+
+    def scores(self, rows: Rows = None, columns: Optional[np.ndarray] = None) -> np.ndarray:
+        """Оценки совместимости: матрица len(rows) x len(columns), -1 для недопустимых пар"""
+        rows = self._rows(rows)
+        overlap = self.schedule_overlap(rows, columns)
+        # Сдвиг на 1 и умножение на маску быстрее присваивания -1 по булевому индексу
+        scores = self.scorer.score(self, rows, columns, overlap)
+        scores += 1
+        scores *= self._allowed(rows, columns, overlap)
+        scores -= 1
+        return scores
+
+    def matrix(self) -> np.ndarray:
+        """
+        Полная матрица оценок size x size.
+        Считается блоками строк, чтобы промежуточные массивы не занимали лишнюю память.
+        """
+        result = np.empty((self.size, self.size), dtype=np.int16)
+        block = max(1, BLOCK_ELEMENTS // max(1, self.size))
+        for start in range(0, self.size, block):
+            result[start:start + block] = self.scores(slice(start, start + block))
+        return result
@@ -0,0 +1,136 @@
+"""
+Общий движок подбора собеседников.
+
+Еженедельный подбор пар (scheduler.create_pairs), create_meetings_for_users
+и поиск по /find работают через MatchingEngine: пользователи загружаются
+один раз, а совместимость считается в памяти по CompatibilityIndex.
+"""
+import os
+import random
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.matching.compatibility import BLOCK_ELEMENTS, CompatibilityIndex
+from services.matching.pairing import run_pairing
+from services.matching.scoring import Scorer
+
+
+class MatchingEngine:
+    """
+    Индекс кандидатов в памяти поверх списка пользователей.
+
+    Формат ANY (и не указанный формат) совместим с любым, не указанное
+    расписание - с любым расписанием, недавние собеседники исключаются.
+    Оценку пары задает оценщик scorer (см. services.matching.scoring).
+    """
+
+    def __init__(
+        self,
+        users: Sequence,
+        recent_partners: Optional[Dict[int, Iterable[int]]] = None,
+        scorer: Optional[Scorer] = None
+    ):
+        self.users = list(users)
+        self.index = CompatibilityIndex.from_users(self.users, recent_partners, scorer)
+
+    @classmethod
+    async def load(cls, session, scorer: Optional[Scorer] = None, include_users: Sequence = ()):
+        """
+        Загружает активных пользователей с интересами и их недавних собеседников
+        (два запроса) и строит движок.
+
+        :param include_users: Пользователи, которых нужно добавить в индекс,
+            даже если они не активны (например, автор запроса /find)
+        """
+        from services.user_service import get_active_users_with_interests
+        from services.pair_history_service import get_recent_partners
+
+        users = list(await get_active_users_with_interests(session))
+        loaded_ids = {user.telegram_id for user in users}
+        users.extend(user for user in include_users if user.telegram_id not in loaded_ids)
+
+        return cls(users, await get_recent_partners(session), scorer)
+
+    @property
+    def size(self) -> int:
+        return self.index.size
+
+    def pair_all(
+        self,
+        strategy: Optional[str] = None,
+        time_budget: Optional[float] = None,
+        rng: Optional[random.Random] = None
+    ) -> List[Tuple]:
+        """
+        Разбивает всех пользователей движка на пары.
+
+        Стратегия и ограничение времени по умолчанию берутся из переменных
+        PAIRING_STRATEGY (greedy) и PAIRING_TIME_BUDGET (60 секунд).
+
+        :return: Список пар пользователей
+        """
+        pairs = run_pairing(
+            self.index,
+            strategy=strategy or os.getenv("PAIRING_STRATEGY", "greedy"),
+            time_budget=time_budget if time_budget is not None else float(os.getenv("PAIRING_TIME_BUDGET", "60")),
+            rng=rng
+        )
+        return [(self.users[first], self.users[second]) for first, second in pairs]
+
+    def candidates(
+        self,
+        user,
+        exclude_ids: Iterable[int] = (),
+        min_common_interests: int = 1,
+        limit: Optional[int] = None
+    ) -> List[Tuple]:
+        """
+        Допустимые собеседники пользователя по убыванию оценки.
+
+        :param exclude_ids: ID пользователей, которых не нужно предлагать
+        :param min_common_interests: Минимальное количество общих интересов
+        :param limit: Сколько лучших кандидатов вернуть (по умолчанию всех)
+        :return: Список пар (пользователь, оценка)
+        """
+        row = self.index.position(user.telegram_id)
+        scores = self._candidate_scores(np.array([row]), min_common_interests)[0]
+        scores[self.index.positions(exclude_ids)] = -1
+
+        positions = np.flatnonzero(scores >= 0)
+        # Устойчивая сортировка: при равной оценке сохраняется порядок загрузки
+        positions = positions[np.argsort(-scores[positions], kind="stable")][:limit]
+        return [(self.users[position], int(scores[position])) for position in positions]
+
+    def top_candidates(self, limit: int, min_common_interests: int = 1) -> Dict[int, List[Tuple[int, int]]]:
+        """
+        Лучшие кандидаты для всех пользователей движка сразу (для кэша /find).
+        Оценки считаются блоками строк, из каждой строки берутся limit лучших.
+
+        :return: Словарь: ID пользователя -> список пар (ID кандидата, оценка) по убыванию оценки
+        """
+        result = {}
+        block = max(1, BLOCK_ELEMENTS // max(1, self.size))
+        for start in range(0, self.size, block):
+            rows = np.arange(start, min(start + block, self.size))
+            scores = self._candidate_scores(rows, min_common_interests)
+
+            # Уникальный ключ: по убыванию оценки, при равной оценке - по позиции, как в candidates()
+            keys = scores.astype(np.int64) * self.size - np.arange(self.size)
+            keep = min(limit, self.size)
+            best = np.argpartition(-keys, keep - 1, axis=1)[:, :keep]
+
+            for offset, columns in enumerate(best):
+                columns = columns[np.argsort(-keys[offset, columns])]
+                columns = columns[scores[offset, columns] >= 0]
+                result[self.index.user_ids[rows[offset]]] = [
+                    (self.index.user_ids[column], int(scores[offset, column])) for column in columns
+                ]
+        return result
+
+    def _candidate_scores(self, rows: np.ndarray, min_common_interests: int) -> np.ndarray:
+        """Оценки кандидатов для строк; -1 - пара недопустима или мало общих интересов"""
+        scores = self.index.scores(rows)
+        if min_common_interests > 0:
+            scores[self.index.common_interests(rows) < min_common_interests] = -1
+        return scores
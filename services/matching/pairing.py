@@ -0,0 +1,181 @@
+"""
+Алгоритмы разбиения пользователей на пары поверх CompatibilityIndex.
+
+Каждая стратегия принимает индекс и возвращает список пар позиций
+пользователей в индексе. Стратегия еженедельного подбора выбирается
+по имени через run_pairing.
+"""
+import logging
+import random
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.matching.compatibility import CompatibilityIndex
+
+logger = logging.getLogger(__name__)
+
+Pairs = List[Tuple[int, int]]
+
+
+def greedy_pairs(
+    index: CompatibilityIndex,
+    top_k: int = 3,
+    rng: Optional[random.Random] = None,
+    positions: Optional[Sequence[int]] = None
+) -> Pairs:
+    """
+    Жадный подбор пар.
+
+    Пользователи обходятся в случайном порядке; для каждого еще свободного
+    пользователя партнер выбирается случайно из top_k допустимых кандидатов
+    с наибольшей оценкой совместимости. Пользователь без допустимых
+    кандидатов остается без пары.
+
+    :param positions: Позиции пользователей, которых нужно разбить на пары (по умолчанию все)
+    :return: Список пар позиций пользователей в индексе
+    """
+    rng = rng or random.Random()
+    if positions is None:
+        pool = np.arange(index.size)
+    else:
+        pool = np.unique(np.asarray(positions, dtype=np.int64))
+
+    order = pool.tolist()
+    rng.shuffle(order)
+
+    available = np.zeros(index.size, dtype=bool)
+    available[pool] = True
+    # Пул - отсортированные позиции, по которым считаются оценки. Занятые пользователи
+    # убираются из него пачками, когда их становится больше половины
+    pool_free = len(pool)
+    pairs = []
+
+    for position in order:
+        if not available[position]:
+            continue
+        available[position] = False
+        pool_free -= 1
+
+        if pool_free * 2 < len(pool):
+            pool = pool[available[pool]]
+
+        # Ключ кандидата: оценка совместимости + 1; 0 - пара недопустима или партнер занят.
+        # Умножение на маску заметно быстрее присваивания по булевому индексу
+        keys = index.scores(position, pool)[0] + 1
+        keys *= available[pool]
+        best = int(keys.max(initial=0))
+        if best == 0:
+            continue
+
+        # Порог: наибольший ключ, при котором кандидатов с ключом не ниже порога хватает на top_k
+        for threshold in range(best, 0, -1):
+            if np.count_nonzero(keys >= threshold) >= top_k:
+                break
+
+        candidates = np.flatnonzero(keys >= threshold)
+        better = candidates[keys[candidates] > threshold]
+        tied = candidates[keys[candidates] == threshold]
+        chosen = rng.sample(range(len(tied)), min(len(tied), top_k - len(better)))
+        top = better.tolist() + tied[chosen].tolist()
+
+        partner = int(pool[rng.choice(top)])
+        available[partner] = False
+        pool_free -= 1
+        pairs.append((position, partner))
+
+    return pairs
+
+
+def max_weight_pairs(
+    index: CompatibilityIndex,
+    time_budget: float = 60.0,
+    chunk_size: int = 400,
+    edges_per_user: int = 8,
+    rng: Optional[random.Random] = None
+) -> Pairs:
+    """
+    Подбор пар через паросочетание максимального веса (networkx).
+
+    Вес ребра - оценка совместимости + 1, поэтому сначала максимизируется
+    число пар, а среди них - суммарная оценка совместимости.
+    Точный алгоритм работает за O(n^3), поэтому пользователи в случайном
+    порядке делятся на группы по chunk_size, и в графе каждой группы
+    остаются только edges_per_user лучших ребер каждого пользователя.
+
+    Если time_budget (в секундах) исчерпан, оставшиеся группы, а также
+    пользователи, оставшиеся без пары внутри своих групп, разбиваются
+    жадным алгоритмом. Без networkx используется только жадный алгоритм.
+
+    :return: Список пар позиций пользователей в индексе
+    """
+    rng = rng or random.Random()
+    try:
+        import networkx as nx
+    except ImportError:
+        logger.warning("networkx не установлен, используется жадный подбор пар")
+        return greedy_pairs(index, rng=rng)
+
+    started = time.monotonic()
+    order = list(range(index.size))
+    rng.shuffle(order)
+
+    paired = np.zeros(index.size, dtype=bool)
+    pairs = []
+
+    for start in range(0, index.size, chunk_size):
+        if time.monotonic() - started > time_budget:
+            logger.warning(
+                f"Время на подбор пар ({time_budget} с) исчерпано, "
+                f"для оставшихся пользователей используется жадный алгоритм"
+            )
+            break
+
+        chunk = np.sort(np.array(order[start:start + chunk_size], dtype=np.int64))
+        scores = index.scores(chunk, chunk)
+
+        graph = nx.Graph()
+        keep = min(edges_per_user, len(chunk) - 1)
+        for row, row_scores in enumerate(scores):
+            if keep <= 0:
+                break
+            best = np.argpartition(row_scores, -keep)[-keep:]
+            for column in best[row_scores[best] >= 0]:
+                graph.add_edge(row, int(column), weight=int(row_scores[column]) + 1)
+
+        for first, second in nx.max_weight_matching(graph, maxcardinality=True):
+            pairs.append((int(chunk[first]), int(chunk[second])))
+            paired[chunk[first]] = paired[chunk[second]] = True
+
+    # Добираем пары среди всех, кто остался без партнера
+    pairs.extend(greedy_pairs(index, rng=rng, positions=np.flatnonzero(~paired)))
+    return pairs
+
+
+PAIRING_STRATEGIES = ("greedy", "max_weight")
+
+
+def run_pairing(
+    index: CompatibilityIndex,
+    strategy: str = "greedy",
+    time_budget: float = 60.0,
+    rng: Optional[random.Random] = None
+) -> Pairs:
+    """
+    Разбивает пользователей индекса на пары выбранной стратегией
+    ("greedy" или "max_weight") и логирует результат.
+    """
+    started = time.monotonic()
+    if strategy == "greedy":
+        pairs = greedy_pairs(index, rng=rng)
+    elif strategy == "max_weight":
+        pairs = max_weight_pairs(index, time_budget=time_budget, rng=rng)
+    else:
+        raise ValueError(f"Неизвестная стратегия подбора пар: {strategy}")
+
+    logger.info(
+        f"Стратегия {strategy}: {len(pairs)} пар для {index.size} пользователей "
+        f"за {time.monotonic() - started:.2f} с"
+    )
+    return pairs
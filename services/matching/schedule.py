@@ -0,0 +1,96 @@
+"""
+Битовые маски расписания: 5 рабочих дней x 5 временных слотов.
+
+Бит day * 5 + slot означает, что пользователю удобно встречаться в этот
+день в этот слот. Два пользователя могут встретиться, если AND их масок
+не равен нулю. Маска 0 - расписание не указано, такой пользователь
+совместим с любым расписанием.
+"""
+from typing import List, Optional
+
+from database.models import TimeSlot, WeekDay
+
+SCHEDULE_DAYS = tuple(WeekDay)
+SCHEDULE_SLOTS = tuple(TimeSlot)
+
+# Маска "в любое время": все дни и все слоты
+FULL_SCHEDULE_MASK = (1 << (len(SCHEDULE_DAYS) * len(SCHEDULE_SLOTS))) - 1
+
+# Сколько общих слотов максимум учитывается в оценке пары
+SCHEDULE_SCORE_CAP = 3
+
+DAY_SHORT_NAMES = {
+    WeekDay.MONDAY: "Пн",
+    WeekDay.TUESDAY: "Вт",
+    WeekDay.WEDNESDAY: "Ср",
+    WeekDay.THURSDAY: "Чт",
+    WeekDay.FRIDAY: "Пт",
+}
+
+_DAY_INDEX = {day.value: index for index, day in enumerate(SCHEDULE_DAYS)}
+_SLOT_INDEX = {slot.value: index for index, slot in enumerate(SCHEDULE_SLOTS)}
+_DAY_MASK = (1 << len(SCHEDULE_SLOTS)) - 1
+_SLOT_MASK = sum(1 << (day * len(SCHEDULE_SLOTS)) for day in range(len(SCHEDULE_DAYS)))
+
+
+def schedule_to_mask(available_days: Optional[str], time_slot: Optional[str]) -> int:
+    """
+    Собирает маску расписания из строки дней через запятую и временного слота.
+
+    Если указаны только дни, считаются удобными все слоты этих дней;
+    если только слот - этот слот во все дни. Неизвестные значения пропускаются.
+    """
+    days = [_DAY_INDEX[day.strip()] for day in (available_days or "").split(",") if day.strip() in _DAY_INDEX]
+    slots = [_SLOT_INDEX[time_slot]] if time_slot in _SLOT_INDEX else []
+
+    if not days and not slots:
+        return 0
+
+    mask = 0
+    for day in days or range(len(SCHEDULE_DAYS)):
+        for slot in slots or range(len(SCHEDULE_SLOTS)):
+            mask |= 1 << (day * len(SCHEDULE_SLOTS) + slot)
+    return mask
+
+
+def effective_schedule(mask: Optional[int]) -> int:
+    """Маска для сравнения: не указанное расписание (0) совместимо с любым"""
+    return mask or FULL_SCHEDULE_MASK
+
+
+def schedule_overlap(first: Optional[int], second: Optional[int]) -> int:
+    """Количество общих пар (день, слот) у двух пользователей"""
+    return bin(effective_schedule(first) & effective_schedule(second)).count("1")
+
+
+def schedule_score(first: Optional[int], second: Optional[int]) -> int:
+    """
+    Вклад расписания в оценку пары: число общих слотов, не больше SCHEDULE_SCORE_CAP.
+    Если у кого-то из пары расписание не указано, вклад нулевой.
+    """
+    if not first or not second:
+        return 0
+    return min(schedule_overlap(first, second), SCHEDULE_SCORE_CAP)
+
+
+def mask_to_days(mask: int) -> List[WeekDay]:
+    """Дни, в которые есть хотя бы один удобный слот"""
+    return [
+        day for index, day in enumerate(SCHEDULE_DAYS)
+        if (mask >> (index * len(SCHEDULE_SLOTS))) & _DAY_MASK
+    ]
+
+
+def mask_to_slots(mask: int) -> List[TimeSlot]:
+    """Слоты, удобные хотя бы в один день"""
+    return [slot for index, slot in enumerate(SCHEDULE_SLOTS) if (mask >> index) & _SLOT_MASK]
+
+
+def format_weekdays(mask: Optional[int]) -> str:
+    """
+    Форматирует дни из маски расписания в удобочитаемый вид (например, "Пн, Ср")
+    """
+    days = mask_to_days(mask or 0)
+    if not days:
+        return "Не указаны"
+    return ", ".join(DAY_SHORT_NAMES[day] for day in days)
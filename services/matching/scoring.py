@@ -0,0 +1,61 @@
+"""
+Оценщики пар для CompatibilityIndex.
+
+Оценщик считает неотрицательную оценку для блока пар rows x columns;
+недопустимые пары (формат, расписание, недавние встречи) индекс отсекает
+сам, поэтому оценщик о них не знает. Чтобы поменять приоритеты подбора,
+достаточно передать в индекс или движок другой оценщик.
+"""
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+from services.matching.schedule import SCHEDULE_SCORE_CAP
+
+if TYPE_CHECKING:
+    from services.matching.compatibility import CompatibilityIndex
+
+
+class Scorer:
+    """Базовый оценщик: все допустимые пары равноценны"""
+
+    def score(
+        self,
+        index: "CompatibilityIndex",
+        rows: np.ndarray,
+        columns: Optional[np.ndarray],
+        overlap: np.ndarray
+    ) -> np.ndarray:
+        """
+        Оценки пар: новая матрица int16 len(rows) x len(columns) со значениями >= 0.
+
+        :param overlap: Количество общих слотов расписания для тех же пар
+        """
+        return np.zeros(overlap.shape, dtype=np.int16)
+
+
+class InterestScorer(Scorer):
+    """Оценка пары - количество общих интересов"""
+
+    def score(self, index, rows, columns, overlap):
+        return index.common_interests(rows, columns).astype(np.int16)
+
+
+class InterestScheduleScorer(InterestScorer):
+    """
+    Количество общих интересов плюс число общих слотов расписания
+    (не больше cap, только если расписание указано у обоих).
+    """
+
+    def __init__(self, cap: int = SCHEDULE_SCORE_CAP):
+        self.cap = cap
+
+    def score(self, index, rows, columns, overlap):
+        scores = super().score(index, rows, columns, overlap)
+        known = index.schedule_known
+        column_known = known if columns is None else known[columns]
+        scores += np.minimum(overlap, self.cap) * (known[rows][:, None] & column_known[None, :])
+        return scores
+
+
+DEFAULT_SCORER = InterestScheduleScorer()
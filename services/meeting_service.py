@@ -1,14 +1,24 @@
-import random
+import asyncio
 from datetime import datetime, timedelta
-from typing import List, Optional, Tuple
+from typing import AsyncIterator, Callable, Iterable, List, Optional, Sequence, Tuple
 
-from sqlalchemy import select, func, or_, and_
+from sqlalchemy import select, func, or_, and_, insert, exists, union_all
+from sqlalchemy.engine import Row
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, joinedload
 
 from database.models import User, Meeting, Feedback
-from services.user_service import get_recent_meeting_partners, get_matching_users
+from services.pair_history_service import record_pairs
+from services.candidate_cache_service import invalidate_pairs
+from services.broadcast_service import BroadcastMessage
+from services.outbox_service import enqueue_messages
+from services.reminder_service import schedule_meeting_reminder
+from services.matching import MatchingEngine
 from services.test_mode_service import is_test_mode_active, get_accelerated_date, get_real_date
 
+# Поля встречи, от которых зависит таймер напоминания
+REMINDER_FIELDS = {"scheduled_date", "is_cancelled", "is_completed", "reminder_sent"}
+
 
 async def create_meeting(
     session: AsyncSession,
@@ -32,6 +42,8 @@ async def create_meeting(
         is_confirmed=False
     )
     session.add(meeting)
+    await record_pairs(session, [(user1_id, user2_id)])
+    await invalidate_pairs(session, [(user1_id, user2_id)])
     await session.commit()
     return meeting
 
@@ -56,6 +68,30 @@ async def get_meeting(
     return result.scalar_one_or_none()
 
 
+async def get_meetings_with_participants(
+    session: AsyncSession,
+    meeting_ids: Sequence[int]
+) -> List[Meeting]:
+    """
+    Получение встреч вместе с обоими участниками одним запросом.
+    
+    Args:
+        session: Сессия базы данных
+        meeting_ids: ID встреч
+    
+    Returns:
+        Список встреч с загруженными user1 и user2
+    """
+    if not meeting_ids:
+        return []
+    result = await session.execute(
+        select(Meeting)
+        .options(joinedload(Meeting.user1), joinedload(Meeting.user2))
+        .where(Meeting.id.in_(meeting_ids))
+    )
+    return list(result.scalars().all())
+
+
 async def update_meeting(
     session: AsyncSession,
     meeting: Meeting,
@@ -64,6 +100,9 @@ async def update_meeting(
     """
     Обновление данных встречи.
     
+    При изменении даты, отмене или завершении встречи таймер напоминания
+    переставляется или снимается.
+    
     Args:
         session: Сессия базы данных
         meeting: Объект встречи
@@ -72,11 +111,18 @@ async def update_meeting(
     Returns:
         Обновленная встреча
     """
+    # После переноса встречи напоминание нужно отправить заново
+    if "scheduled_date" in kwargs and kwargs["scheduled_date"] != meeting.scheduled_date:
+        kwargs.setdefault("reminder_sent", False)
+    
     for key, value in kwargs.items():
         if hasattr(meeting, key):
             setattr(meeting, key, value)
     
     await session.commit()
+    
+    if REMINDER_FIELDS & set(kwargs):
+        schedule_meeting_reminder(meeting)
     return meeting
 
 
@@ -135,120 +181,186 @@ async def get_pending_feedback_meetings(
     Returns:
         Список встреч без фидбека
     """
-    # Сначала находим все встречи пользователя
-    user_meetings = await get_user_meetings(session, user_id)
-    
-    # Текущее время (с учетом тестового режима, если он активен)
+    # Встречи пользователя, по которым нет фидбека от него (один запрос)
+    result = await session.execute(
+        select(Meeting).where(
+            or_(Meeting.user1_id == user_id, Meeting.user2_id == user_id),
+            Meeting.scheduled_date < _feedback_time(),
+            ~exists().where(Feedback.meeting_id == Meeting.id, Feedback.from_user_id == user_id)
+        )
+    )
+    return list(result.scalars().all())
+
+
+def _feedback_time() -> datetime:
+    """Текущее время для поиска прошедших встреч (с учетом тестового режима)"""
     current_time = datetime.utcnow()
     if is_test_mode_active():
         current_time = get_accelerated_date(current_time)
+    return current_time
+
+
+def build_pending_feedback_query(now: datetime):
+    """
+    Запрос всех пар (участник, встреча), по которым участник еще не оставил фидбек.
+    
+    Для каждой стороны встречи (user1 и user2) выбираются прошедшие встречи
+    без строки фидбека от этого участника (анти-соединение NOT EXISTS),
+    обе выборки объединяются через UNION ALL. Учитываются только активные
+    участники; имя собеседника возвращается тем же запросом.
     
-    # Находим встречи без фидбека от указанного пользователя
-    pending_feedback = []
-    for meeting in user_meetings:
-        # Проверяем только прошедшие встречи с датой
-        if meeting.scheduled_date and meeting.scheduled_date < current_time:
-            # Проверяем, оставил ли пользователь фидбек
-            result = await session.execute(
-                select(Feedback)
-                .where(Feedback.meeting_id == meeting.id)
-                .where(Feedback.from_user_id == user_id)
+    Args:
+        now: Текущее время
+    
+    Returns:
+        Запрос со столбцами meeting_id, user_id, partner_id, partner_name
+    """
+    selects = []
+    for user_column, partner_column in (
+        (Meeting.user1_id, Meeting.user2_id),
+        (Meeting.user2_id, Meeting.user1_id)
+    ):
+        participant = aliased(User)
+        partner = aliased(User)
+        selects.append(
+            select(
+                Meeting.id.label("meeting_id"),
+                user_column.label("user_id"),
+                partner_column.label("partner_id"),
+                partner.full_name.label("partner_name")
+            )
+            .join(participant, participant.telegram_id == user_column)
+            .join(partner, partner.telegram_id == partner_column)
+            .where(
+                Meeting.scheduled_date < now,
+                participant.is_active == True,
+                ~exists().where(Feedback.meeting_id == Meeting.id, Feedback.from_user_id == user_column)
             )
-            feedback = result.scalar_one_or_none()
-            
-            if not feedback:
-                pending_feedback.append(meeting)
+        )
+    return union_all(*selects)
+
+
+async def iter_pending_feedback(
+    session: AsyncSession,
+    chunk_size: int = 1000
+) -> AsyncIterator[List[Row]]:
+    """
+    Потоково выдает пачками все пары (участник, встреча), которым нужно
+    напоминание о фидбеке. Выполняет один запрос, сколько бы ни было
+    пользователей и встреч.
     
-    return pending_feedback
+    Args:
+        session: Сессия базы данных
+        chunk_size: Размер пачки
+    
+    Yields:
+        Списки строк с полями meeting_id, user_id, partner_id, partner_name
+    """
+    result = await session.stream(
+        build_pending_feedback_query(_feedback_time()),
+        execution_options={"yield_per": chunk_size}
+    )
+    async for rows in result.partitions(chunk_size):
+        yield rows
 
 
-async def create_meetings_for_users(session: AsyncSession) -> List[Meeting]:
+async def create_meetings_bulk(
+    session: AsyncSession,
+    pairs: Sequence[Tuple[int, int]],
+    build_notifications: Optional[
+        Callable[[Sequence[int]], Iterable[Tuple[str, BroadcastMessage]]]
+    ] = None
+) -> List[int]:
     """
-    Алгоритм создания пар для всех активных пользователей.
+    Создание встреч для всех пар раунда подбора в одной транзакции.
+    
+    Встречи добавляются одним вызовом INSERT ... RETURNING со списком
+    параметров: SQLAlchemy выполняет его пачками insertmanyvalues и
+    возвращает ID в порядке пар. История пар, кэш кандидатов и очередь
+    уведомлений обновляются в той же транзакции.
+    При ошибке транзакция откатывается целиком, и ни одна встреча раунда
+    не сохраняется.
     
     Args:
         session: Сессия базы данных
+        pairs: Пары ID пользователей (user1_id, user2_id)
+        build_notifications: Функция, которая по ID созданных встреч возвращает
+            уведомления (ключ идемпотентности, сообщение) для очереди outbox
     
     Returns:
-        Список созданных встреч
+        Список ID созданных встреч в порядке пар
     """
-    from services.user_service import get_active_users
+    if not pairs:
+        return []
     
-    # Получаем всех активных пользователей
-    users = await get_active_users(session)
-    if len(users) < 2:
-        return []  # Недостаточно пользователей для создания пар
+    created_at = datetime.utcnow()
+    rows = [
+        {
+            "user1_id": user1_id,
+            "user2_id": user2_id,
+            "is_confirmed": False,
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+        for user1_id, user2_id in pairs
+    ]
+    
+    try:
+        result = await session.execute(
+            insert(Meeting).returning(Meeting.id, sort_by_parameter_order=True),
+            rows
+        )
+        meeting_ids = list(result.scalars().all())
+        await record_pairs(session, pairs, met_at=created_at)
+        await invalidate_pairs(session, pairs)
+        if build_notifications is not None:
+            await enqueue_messages(session, build_notifications(meeting_ids))
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    
+    return meeting_ids
+
+
+async def create_meetings_for_users(session: AsyncSession) -> List[Meeting]:
+    """
+    Алгоритм создания пар для всех активных пользователей.
     
-    # Перемешиваем пользователей случайным образом
-    random.shuffle(users)
+    Пары подбирает общий движок MatchingEngine (как и еженедельная задача),
+    все встречи сохраняются одной транзакцией.
     
-    # Словарь для хранения результатов
-    matched_users = set()
-    created_meetings = []
+    Args:
+        session: Сессия базы данных
     
-    # Обрабатываем каждого пользователя
-    for user in users:
-        # Если пользователь уже в паре, пропускаем
-        if user.telegram_id in matched_users:
-            continue
-        
-        # Получаем недавних собеседников, чтобы исключить их
-        recent_partners = await get_recent_meeting_partners(session, user.telegram_id)
-        
-        # Получаем список подходящих пользователей
-        matching_users = await get_matching_users(
-            session, 
-            user, 
-            excluded_user_ids=list(matched_users) + recent_partners
-        )
-        
-        # Если есть подходящие пользователи, создаем пару
-        if matching_users:
-            # Предпочитаем пользователей с похожими интересами
-            best_match = None
-            max_common_topics = -1
-            
-            for potential_match in matching_users:
-                # Подсчитываем количество общих интересов
-                common_topics = set(topic.value for topic in user.topics) & set(topic.value for topic in potential_match.topics)
-                common_count = len(common_topics)
-                
-                if common_count > max_common_topics:
-                    max_common_topics = common_count
-                    best_match = potential_match
-            
-            # Если нашли подходящего пользователя
-            if best_match:
-                meeting = await create_meeting(session, user.telegram_id, best_match.telegram_id)
-                created_meetings.append(meeting)
-                
-                # Отмечаем обоих пользователей как сопоставленных
-                matched_users.add(user.telegram_id)
-                matched_users.add(best_match.telegram_id)
+    Returns:
+        Список созданных встреч с загруженными user1 и user2
+    """
+    # Активные пользователи с интересами и недавние собеседники - два запроса
+    engine = await MatchingEngine.load(session)
+    if engine.size < 2:
+        return []  # Недостаточно пользователей для создания пар
+    
+    # Подбор в отдельном потоке, чтобы не блокировать цикл событий
+    pairs = [(user.telegram_id, partner.telegram_id) for user, partner in await asyncio.to_thread(engine.pair_all)]
     
     # Проверяем, остался ли один несопоставленный пользователь
-    remaining_users = [u for u in users if u.telegram_id not in matched_users]
-    if len(remaining_users) == 1 and len(users) >= 3:
-        # Берем последнюю созданную пару и делаем из нее тройку
-        last_meeting = created_meetings[-1]
-        
-        # Удаляем последнюю встречу
-        await session.delete(last_meeting)
-        await session.commit()
-        
-        # Создаем две новые встречи
-        user1_id = last_meeting.user1_id
-        user2_id = last_meeting.user2_id
+    matched_users = {user_id for pair in pairs for user_id in pair}
+    remaining_users = [u for u in engine.users if u.telegram_id not in matched_users]
+    if len(remaining_users) == 1 and engine.size >= 3 and pairs:
+        # Берем последнюю пару и делаем из нее тройку: вместо нее две встречи
+        user1_id, user2_id = pairs.pop()
         user3_id = remaining_users[0].telegram_id
-        
-        meeting1 = await create_meeting(session, user1_id, user3_id)
-        meeting2 = await create_meeting(session, user2_id, user3_id)
-        
-        # Заменяем последнюю встречу двумя новыми
-        created_meetings[-1] = meeting1
-        created_meetings.append(meeting2)
+        pairs.extend([(user1_id, user3_id), (user2_id, user3_id)])
+    
+    # Сохраняем все встречи раунда одной транзакцией
+    meeting_ids = await create_meetings_bulk(session, pairs)
+    if not meeting_ids:
+        return []
     
-    return created_meetings
+    # Встречи вместе с участниками - для send_meeting_notifications
+    meetings = {meeting.id: meeting for meeting in await get_meetings_with_participants(session, meeting_ids)}
+    return [meetings[meeting_id] for meeting_id in meeting_ids]
 
 
 async def add_feedback(
@@ -0,0 +1,315 @@
+"""
+Очередь исходящих сообщений (transactional outbox).
+
+Задачи подбора пар, напоминаний и запросов фидбека не отправляют сообщения
+сами, а записывают их в таблицу outbox в той же транзакции, что и изменения
+встреч. Фоновый диспетчер OutboxDispatcher забирает ожидающие сообщения,
+отправляет их через Broadcaster и повторяет неудачные попытки с нарастающей
+задержкой. После перезапуска бота неотправленные сообщения остаются в таблице
+и отправляются при первом проходе диспетчера.
+
+Доставка "хотя бы один раз": сообщение отмечается отправленным после ответа
+Telegram, поэтому при падении процесса между отправкой и отметкой оно может
+уйти повторно. Повторная постановка в очередь исключена ключом идемпотентности.
+"""
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.types import InlineKeyboardMarkup
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import OutboxMessage, OutboxStatus
+from services.broadcast_service import BroadcastMessage, BroadcastStats, Broadcaster
+
+logger = logging.getLogger(__name__)
+
+
+def _insert(session: AsyncSession):
+    """Возвращает конструкцию INSERT с поддержкой ON CONFLICT для текущей базы"""
+    if session.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def get_max_attempts() -> int:
+    """
+    Сколько раз пытаться отправить сообщение, прежде чем отметить его неотправляемым.
+    Задается переменной OUTBOX_MAX_ATTEMPTS (по умолчанию 5).
+    """
+    return int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+
+
+def get_retry_delay(attempts: int) -> timedelta:
+    """
+    Задержка перед следующей попыткой: OUTBOX_RETRY_BASE_SECONDS (30),
+    удваивается с каждой попыткой, но не больше OUTBOX_RETRY_MAX_SECONDS (3600).
+    """
+    base = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "30"))
+    limit = float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", "3600"))
+    return timedelta(seconds=min(limit, base * 2 ** max(0, attempts - 1)))
+
+
+def _dump_payload(message: BroadcastMessage) -> str:
+    """Сериализует текст и клавиатуру сообщения в JSON"""
+    return json.dumps({
+        "text": message.text,
+        "parse_mode": message.parse_mode,
+        "reply_markup": message.reply_markup.model_dump(exclude_none=True) if message.reply_markup else None,
+    }, ensure_ascii=False)
+
+
+def _load_message(row: OutboxMessage) -> BroadcastMessage:
+    """Восстанавливает сообщение рассылки из строки outbox"""
+    payload = json.loads(row.payload)
+    reply_markup = payload.get("reply_markup")
+    return BroadcastMessage(
+        chat_id=row.chat_id,
+        text=payload["text"],
+        reply_markup=InlineKeyboardMarkup.model_validate(reply_markup) if reply_markup else None,
+        parse_mode=payload.get("parse_mode"),
+        key=row.id
+    )
+
+
+async def enqueue_messages(
+    session: AsyncSession,
+    messages: Iterable[Tuple[str, BroadcastMessage]]
+) -> None:
+    """
+    Ставит сообщения в очередь одним executemany-запросом: число параметров
+    в одном выражении не зависит от количества сообщений.
+
+    Не делает commit: сообщения сохраняются в транзакции вызывающего кода.
+    Сообщения с уже существующим ключом идемпотентности пропускаются.
+
+    Args:
+        session: Сессия базы данных
+        messages: Пары (ключ идемпотентности, сообщение)
+    """
+    now = datetime.utcnow()
+    rows = [
+        {
+            "idempotency_key": key,
+            "chat_id": message.chat_id,
+            "payload": _dump_payload(message),
+            "status": OutboxStatus.PENDING,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        }
+        for key, message in messages
+    ]
+    if not rows:
+        return
+
+    insert = _insert(session)
+    await session.execute(
+        insert(OutboxMessage.__table__).on_conflict_do_nothing(
+            index_elements=[OutboxMessage.idempotency_key]
+        ),
+        rows
+    )
+
+
+async def dispatch_outbox(session: AsyncSession, bot: Bot, batch_size: Optional[int] = None) -> BroadcastStats:
+    """
+    Отправляет все сообщения, которые пора отправить, пачками по batch_size
+    (по умолчанию OUTBOX_BATCH_SIZE, 500). Результат каждой пачки сохраняется
+    отдельной транзакцией.
+
+    Args:
+        session: Сессия базы данных
+        bot: Бот для отправки сообщений
+        batch_size: Размер пачки
+
+    Returns:
+        Суммарные итоги отправки
+    """
+    batch_size = batch_size or int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+    broadcaster = Broadcaster.from_env(bot)
+    # Повторы при сетевых ошибках выполняет очередь, а не рассылка
+    broadcaster.max_retries = 0
+    total = BroadcastStats()
+
+    while True:
+        started_at = datetime.utcnow()
+        result = await session.execute(
+            select(OutboxMessage)
+            .where(OutboxMessage.status == OutboxStatus.PENDING, OutboxMessage.next_attempt_at <= started_at)
+            .order_by(OutboxMessage.next_attempt_at, OutboxMessage.id)
+            .limit(batch_size)
+        )
+        rows = result.scalars().all()
+        if not rows:
+            break
+        messages = [_load_message(row) for row in rows]
+        attempts = {row.id: row.attempts + 1 for row in rows}
+        # Соединение не держим открытым, пока идет рассылка
+        await session.commit()
+
+        stats = await broadcaster.run(messages)
+        await _save_results(session, stats, attempts)
+
+        total.total += stats.total
+        total.sent += stats.sent
+        total.failed += stats.failed
+        total.blocked += stats.blocked
+        total.retries += stats.retries
+        total.elapsed += stats.elapsed
+
+        if len(rows) < batch_size:
+            break
+
+    if total.total:
+        logger.info(f"Очередь сообщений: {total}")
+    return total
+
+
+async def _save_results(session: AsyncSession, stats: BroadcastStats, attempts: Dict[int, int]) -> None:
+    """Отмечает результаты отправки пачки двумя запросами и делает commit"""
+    now = datetime.utcnow()
+    table = OutboxMessage.__table__
+
+    sent_ids = [message.key for message in stats.delivered]
+    if sent_ids:
+        await session.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.id.in_(sent_ids))
+            .values(status=OutboxStatus.SENT, attempts=OutboxMessage.attempts + 1, sent_at=now, last_error=None)
+        )
+
+    max_attempts = get_max_attempts()
+    params = []
+    for failure in stats.failures:
+        row_attempts = attempts[failure.message.key]
+        give_up = failure.permanent or row_attempts >= max_attempts
+        params.append({
+            "row_id": failure.message.key,
+            "new_status": OutboxStatus.FAILED if give_up else OutboxStatus.PENDING,
+            "new_attempts": row_attempts,
+            "new_next_attempt_at": now if give_up else now + get_retry_delay(row_attempts),
+            "new_last_error": failure.error,
+        })
+    if params:
+        await session.execute(
+            table.update()
+            .where(table.c.id == bindparam("row_id"))
+            .values(
+                status=bindparam("new_status"),
+                attempts=bindparam("new_attempts"),
+                next_attempt_at=bindparam("new_next_attempt_at"),
+                last_error=bindparam("new_last_error")
+            ),
+            params
+        )
+
+    await session.commit()
+
+
+async def purge_outbox(session: AsyncSession, older_than: timedelta) -> int:
+    """
+    Удаляет отправленные сообщения старше older_than.
+
+    Returns:
+        Количество удаленных сообщений
+    """
+    result = await session.execute(
+        delete(OutboxMessage).where(
+            OutboxMessage.status == OutboxStatus.SENT,
+            OutboxMessage.sent_at < datetime.utcnow() - older_than
+        )
+    )
+    await session.commit()
+    return result.rowcount
+
+
+class OutboxDispatcher:
+    """
+    Фоновая задача, которая отправляет сообщения из очереди.
+
+    Проверяет очередь каждые interval секунд, а также сразу после wake()
+    (его вызывают задачи, поставившие сообщения в очередь). Раз в сутки удаляет
+    отправленные сообщения старше OUTBOX_RETENTION_DAYS (7) дней.
+
+    :param bot: Бот для отправки сообщений
+    :param session_maker: Фабрика сессий базы данных
+    :param interval: Интервал проверки очереди, с
+    """
+
+    def __init__(self, bot: Bot, session_maker, interval: float = 10.0):
+        self.bot = bot
+        self.session_maker = session_maker
+        self.interval = interval
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._purged_at: Optional[datetime] = None
+
+    @classmethod
+    def from_env(cls, bot: Bot, session_maker) -> "OutboxDispatcher":
+        """Диспетчер с интервалом из переменной OUTBOX_DISPATCH_INTERVAL (10 с)"""
+        return cls(bot, session_maker, float(os.getenv("OUTBOX_DISPATCH_INTERVAL", "10")))
+
+    async def open(self) -> None:
+        """Запускает фоновую задачу; неотправленные до перезапуска сообщения уходят сразу"""
+        global _dispatcher
+        _dispatcher = self
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Останавливает фоновую задачу"""
+        global _dispatcher
+        if _dispatcher is self:
+            _dispatcher = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self) -> None:
+        """Запускает проверку очереди, не дожидаясь интервала"""
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                async with self.session_maker() as session:
+                    await dispatch_outbox(session, self.bot)
+                    await self._purge(session)
+            except Exception as e:
+                logger.error(f"Ошибка при отправке сообщений из очереди: {e}", exc_info=True)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _purge(self, session: AsyncSession) -> None:
+        """Удаляет старые отправленные сообщения не чаще раза в сутки"""
+        now = datetime.utcnow()
+        if self._purged_at and now - self._purged_at < timedelta(days=1):
+            return
+        self._purged_at = now
+        deleted = await purge_outbox(session, timedelta(days=float(os.getenv("OUTBOX_RETENTION_DAYS", "7"))))
+        if deleted:
+            logger.info(f"Удалено отправленных сообщений из очереди: {deleted}")
+
+
+_dispatcher: Optional[OutboxDispatcher] = None
+
+
+def wake_outbox_dispatcher() -> None:
+    """Будит запущенный диспетчер после постановки сообщений в очередь (если он запущен)"""
+    if _dispatcher is not None:
+        _dispatcher.wake()
@@ -0,0 +1,144 @@
+import os
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import PairHistory
+
+
+def normalize_pair(user1_id: int, user2_id: int) -> Tuple[int, int]:
+    """
+    Приводит пару пользователей к ключу таблицы pair_history (меньший ID первым).
+    """
+    return (user1_id, user2_id) if user1_id < user2_id else (user2_id, user1_id)
+
+
+def get_exclusion_window() -> timedelta:
+    """
+    Окно, в течение которого пользователи не подбираются повторно.
+    Задается переменной PAIR_EXCLUSION_WEEKS (по умолчанию 8 недель).
+    """
+    return timedelta(weeks=float(os.getenv("PAIR_EXCLUSION_WEEKS", "8")))
+
+
+def _insert(session: AsyncSession):
+    """Возвращает конструкцию INSERT с поддержкой ON CONFLICT для текущей базы"""
+    if session.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+async def record_pairs(
+    session: AsyncSession,
+    pairs: Iterable[Tuple[int, int]],
+    met_at: Optional[datetime] = None
+) -> None:
+    """
+    Обновляет историю встреч для созданных пар одним executemany-запросом
+    (число параметров в выражении не зависит от количества пар).
+
+    Не делает commit: история сохраняется в той же транзакции, что и встречи.
+
+    Args:
+        session: Сессия базы данных
+        pairs: Пары ID пользователей
+        met_at: Дата встречи (по умолчанию текущее время)
+    """
+    counts = Counter(normalize_pair(user1_id, user2_id) for user1_id, user2_id in pairs)
+    if not counts:
+        return
+
+    met_at = met_at or datetime.utcnow()
+    table = PairHistory.__table__
+    insert = _insert(session)
+    statement = insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.user_low_id, table.c.user_high_id],
+        set_={
+            "last_met_at": statement.excluded.last_met_at,
+            "meetings_count": table.c.meetings_count + statement.excluded.meetings_count,
+        }
+    )
+    await session.execute(statement, [
+        {
+            "user_low_id": user_low_id,
+            "user_high_id": user_high_id,
+            "last_met_at": met_at,
+            "meetings_count": count,
+        }
+        for (user_low_id, user_high_id), count in counts.items()
+    ])
+
+
+async def get_recent_partners(
+    session: AsyncSession,
+    user_ids: Optional[Iterable[int]] = None,
+    within: Optional[timedelta] = None
+) -> Dict[int, Set[int]]:
+    """
+    Получение собеседников, с которыми пользователи встречались в пределах окна.
+
+    Args:
+        session: Сессия базы данных
+        user_ids: ID пользователей (по умолчанию все пары из окна)
+        within: Окно исключения (по умолчанию get_exclusion_window())
+
+    Returns:
+        Словарь: ID пользователя -> множество ID недавних собеседников
+    """
+    cutoff = datetime.utcnow() - (within if within is not None else get_exclusion_window())
+    query = select(PairHistory.user_low_id, PairHistory.user_high_id).where(
+        PairHistory.last_met_at >= cutoff
+    )
+
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        query = query.where(or_(
+            PairHistory.user_low_id.in_(user_ids),
+            PairHistory.user_high_id.in_(user_ids)
+        ))
+
+    result = await session.execute(query)
+
+    recent_partners: Dict[int, Set[int]] = defaultdict(set)
+    for user_low_id, user_high_id in result:
+        recent_partners[user_low_id].add(user_high_id)
+        recent_partners[user_high_id].add(user_low_id)
+
+    return dict(recent_partners)
+
+
+async def has_met_recently(
+    session: AsyncSession,
+    user1_id: int,
+    user2_id: int,
+    within: Optional[timedelta] = None
+) -> bool:
+    """
+    Проверка, встречалась ли пара в пределах окна (поиск по первичному ключу).
+
+    Args:
+        session: Сессия базы данных
+        user1_id: ID первого пользователя
+        user2_id: ID второго пользователя
+        within: Окно исключения (по умолчанию get_exclusion_window())
+
+    Returns:
+        True, если пара встречалась в пределах окна
+    """
+    cutoff = datetime.utcnow() - (within if within is not None else get_exclusion_window())
+    user_low_id, user_high_id = normalize_pair(user1_id, user2_id)
+
+    result = await session.execute(
+        select(PairHistory.last_met_at).where(and_(
+            PairHistory.user_low_id == user_low_id,
+            PairHistory.user_high_id == user_high_id
+        ))
+    )
+    last_met_at = result.scalar_one_or_none()
+    return last_met_at is not None and last_met_at >= cutoff
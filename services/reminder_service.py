@@ -0,0 +1,217 @@
+"""
+Напоминания о встречах по точному времени.
+
+Вместо периодического опроса таблицы встреч для каждой встречи с назначенной
+датой заводится одноразовый таймер на момент "дата встречи минус
+REMINDER_LEAD_MINUTES". Таймеры хранятся в куче в памяти процесса: при запуске
+бота куча заполняется одним запросом к базе, а при изменении даты встречи
+таймер переставляется (update_meeting вызывает schedule_meeting_reminder).
+"""
+import asyncio
+import heapq
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from database.models import Meeting
+from services.outbox_service import wake_outbox_dispatcher
+from services.test_mode_service import get_accelerated_date, get_real_date, is_test_mode_active
+
+logger = logging.getLogger(__name__)
+
+
+def get_reminder_lead() -> timedelta:
+    """
+    За сколько до встречи отправлять напоминание.
+    Задается переменной REMINDER_LEAD_MINUTES (по умолчанию 60 минут).
+    """
+    return timedelta(minutes=float(os.getenv("REMINDER_LEAD_MINUTES", "60")))
+
+
+def _current_time() -> datetime:
+    """Текущее время в шкале дат встреч (ускоренное в тестовом режиме)"""
+    now = datetime.now()
+    return get_accelerated_date(now) if is_test_mode_active() else now
+
+
+def needs_reminder(meeting: Meeting) -> bool:
+    """Нужно ли напоминание: дата назначена, встреча впереди, не отменена и напоминание не отправлено"""
+    return (
+        meeting.scheduled_date is not None
+        and not meeting.is_completed
+        and not meeting.is_cancelled
+        and not meeting.reminder_sent
+        and meeting.scheduled_date >= _current_time()
+    )
+
+
+class ReminderTimers:
+    """
+    Куча одноразовых таймеров напоминаний.
+
+    Для каждой встречи хранится только последний поставленный таймер; устаревшие
+    записи кучи (после переноса или отмены) пропускаются при срабатывании.
+
+    :param session_maker: Фабрика сессий базы данных
+    :param send_reminders: Корутина (session, meetings), которая ставит
+        напоминания по встречам с загруженными участниками в очередь
+        и отмечает reminder_sent
+    """
+
+    def __init__(self, session_maker, send_reminders: Callable[[AsyncSession, List[Meeting]], Awaitable[int]]):
+        self.session_maker = session_maker
+        self.send_reminders = send_reminders
+        self._heap: List[Tuple[datetime, int]] = []
+        self._fire_at: Dict[int, datetime] = {}
+        self._changed = asyncio.Event()
+        self._reload = True
+        self._task: Optional[asyncio.Task] = None
+
+    async def open(self) -> None:
+        """Запускает фоновую задачу; таймеры загружаются из базы при первом проходе"""
+        global _timers
+        _timers = self
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Останавливает фоновую задачу"""
+        global _timers
+        if _timers is self:
+            _timers = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def __len__(self) -> int:
+        return len(self._fire_at)
+
+    def schedule(self, meeting: Meeting) -> None:
+        """Ставит, переносит или снимает таймер встречи по ее текущим данным"""
+        if not needs_reminder(meeting):
+            self.cancel(meeting.id)
+            return
+
+        remind_at = meeting.scheduled_date - get_reminder_lead()
+        # Даты встреч в тестовом режиме заданы в ускоренном времени
+        fire_at = get_real_date(remind_at) if is_test_mode_active() else remind_at
+        self._fire_at[meeting.id] = fire_at
+        heapq.heappush(self._heap, (fire_at, meeting.id))
+        self._changed.set()
+
+    def cancel(self, meeting_id: int) -> None:
+        """Снимает таймер встречи"""
+        if self._fire_at.pop(meeting_id, None) is not None:
+            self._changed.set()
+
+    def reload(self) -> None:
+        """Перестраивает таймеры из базы (после переключения тестового режима)"""
+        self._reload = True
+        self._changed.set()
+
+    async def _load(self) -> None:
+        """Заполняет кучу встречами, которым еще нужно напоминание (один запрос)"""
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(Meeting).where(
+                    Meeting.scheduled_date >= _current_time(),
+                    Meeting.is_completed == False,
+                    Meeting.is_cancelled == False,
+                    or_(Meeting.reminder_sent == False, Meeting.reminder_sent.is_(None))
+                )
+            )
+            meetings = result.scalars().all()
+
+        self._heap = []
+        self._fire_at = {}
+        for meeting in meetings:
+            self.schedule(meeting)
+        logger.info(f"Загружены таймеры напоминаний: {len(self._fire_at)}")
+
+    def _pop_due(self) -> List[int]:
+        """Забирает из кучи встречи, время напоминания которых наступило"""
+        now = datetime.now()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, meeting_id = heapq.heappop(self._heap)
+            # Запись устарела: встречу перенесли или таймер сняли
+            if self._fire_at.get(meeting_id) != fire_at:
+                continue
+            del self._fire_at[meeting_id]
+            due.append(meeting_id)
+        return due
+
+    async def _fire(self, meeting_ids: List[int]) -> None:
+        """Ставит в очередь напоминания сработавших таймеров и будит диспетчер очереди"""
+        async with self.session_maker() as session:
+            try:
+                # Встречи вместе с участниками одним запросом
+                result = await session.execute(
+                    select(Meeting)
+                    .options(joinedload(Meeting.user1), joinedload(Meeting.user2))
+                    .where(Meeting.id.in_(meeting_ids))
+                )
+                count = await self.send_reminders(session, list(result.scalars().all()))
+            except Exception as e:
+                logger.error(f"Ошибка при напоминании о встречах {meeting_ids}: {e}", exc_info=True)
+                await session.rollback()
+                self._retry(meeting_ids)
+                return
+        wake_outbox_dispatcher()
+        logger.info(f"Поставлены в очередь напоминания для {count} встреч")
+
+    def _retry(self, meeting_ids: List[int]) -> None:
+        """
+        Повторяет напоминания через REMINDER_RETRY_SECONDS (по умолчанию 60 секунд),
+        если таймер встречи не переставили, пока шла неудачная попытка
+        """
+        fire_at = datetime.now() + timedelta(seconds=float(os.getenv("REMINDER_RETRY_SECONDS", "60")))
+        for meeting_id in meeting_ids:
+            if meeting_id not in self._fire_at:
+                self._fire_at[meeting_id] = fire_at
+                heapq.heappush(self._heap, (fire_at, meeting_id))
+
+    async def _run(self) -> None:
+        while True:
+            self._changed.clear()
+            try:
+                if self._reload:
+                    await self._load()
+                    self._reload = False
+
+                due = self._pop_due()
+                if due:
+                    await self._fire(due)
+            except Exception as e:
+                logger.error(f"Ошибка при загрузке таймеров напоминаний: {e}", exc_info=True)
+
+            timeout = None
+            if self._heap:
+                timeout = max(0.0, (self._heap[0][0] - datetime.now()).total_seconds())
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+_timers: Optional[ReminderTimers] = None
+
+
+def schedule_meeting_reminder(meeting: Meeting) -> None:
+    """Ставит или переносит таймер напоминания встречи (если таймеры запущены)"""
+    if _timers is not None:
+        _timers.schedule(meeting)
+
+
+def reload_meeting_reminders() -> None:
+    """Перестраивает таймеры напоминаний из базы (если таймеры запущены)"""
+    if _timers is not None:
+        _timers.reload()
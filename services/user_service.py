@@ -1,10 +1,20 @@
-from typing import List, Optional, Tuple
+from datetime import timedelta
+from typing import Iterable, List, Optional, Tuple
 
-from sqlalchemy import select, and_, or_, func, text
+from sqlalchemy import select, and_, delete, func, insert, text
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import joinedload, selectinload
 
-from database.models import User, Meeting, TopicType, MeetingFormat
+from database.models import User, TopicType, user_interests
+from services.pair_history_service import get_recent_partners
+from services.matching.schedule import schedule_to_mask
+from services.candidate_cache_service import invalidate_user
+
+# Поля профиля, от которых зависит подбор собеседников
+MATCHING_FIELDS = {
+    "meeting_format", "available_days", "available_time_slot",
+    "registration_complete", "is_active"
+}
 
 
 async def get_user(session: AsyncSession, telegram_id: int) -> Optional[User]:
@@ -17,6 +27,21 @@ async def get_user(session: AsyncSession, telegram_id: int) -> Optional[User]:
     return result.scalar_one_or_none()
 
 
+async def get_user_with_interests(session: AsyncSession, telegram_id: int) -> Optional[User]:
+    """
+    Получение пользователя по telegram_id вместе с интересами.
+
+    Интересы подгружаются сразу (selectinload): в асинхронной сессии
+    ленивая загрузка связи при обращении к user.interests невозможна.
+    """
+    result = await session.execute(
+        select(User)
+        .options(selectinload(User.interests))
+        .where(User.telegram_id == telegram_id)
+    )
+    return result.scalar_one_or_none()
+
+
 async def create_user(
     session: AsyncSession,
     telegram_id: int,
@@ -101,6 +126,16 @@ async def update_user(
         if hasattr(user, key):
             setattr(user, key, value)
     
+    changed_fields = set(data or {}) | set(kwargs)
+    
+    # Пересчитываем маску расписания, если изменились дни или временной слот
+    if {"available_days", "available_time_slot"} & changed_fields:
+        user.schedule_mask = schedule_to_mask(user.available_days, user.available_time_slot)
+    
+    # Кандидаты для /find зависят от формата, расписания и завершенности регистрации
+    if MATCHING_FIELDS & changed_fields:
+        await invalidate_user(session, user.telegram_id)
+    
     await session.commit()
     return user
 
@@ -145,6 +180,35 @@ async def remove_user_topic(
     return user
 
 
+async def set_user_interests(
+    session: AsyncSession,
+    user: User,
+    interest_ids: Iterable[int]
+) -> None:
+    """
+    Замена интересов пользователя.
+
+    Связи пишутся напрямую в user_interests (DELETE и INSERT через executemany
+    со списком параметров), без загрузки объектов Interest. Кэш кандидатов пользователя инвалидируется
+    в той же транзакции.
+    """
+    interest_ids = list(dict.fromkeys(interest_ids))
+
+    await session.execute(
+        delete(user_interests).where(user_interests.c.user_id == user.telegram_id)
+    )
+    if interest_ids:
+        await session.execute(
+            insert(user_interests),
+            [{"user_id": user.telegram_id, "interest_id": interest_id} for interest_id in interest_ids]
+        )
+    await invalidate_user(session, user.telegram_id)
+
+    await session.commit()
+    # Связь interests перечитается при следующем обращении
+    session.expire(user, ["interests"])
+
+
 async def get_active_users(session: AsyncSession) -> List[User]:
     """
     Получение всех активных пользователей.
@@ -157,88 +221,37 @@ async def get_active_users(session: AsyncSession) -> List[User]:
     return result.scalars().all()
 
 
-async def get_matching_users(
-    session: AsyncSession, 
-    user: User,
-    excluded_user_ids: List[int] = None
-) -> List[User]:
+async def get_active_users_with_interests(session: AsyncSession) -> List[User]:
     """
-    Получение подходящих пользователей для создания пар.
+    Получение всех активных пользователей вместе с интересами одним запросом.
     
-    Args:
-        session: Сессия базы данных
-        user: Пользователь, для которого ищем пары
-        excluded_user_ids: Список ID пользователей, которых нужно исключить
-    
-    Returns:
-        Список подходящих пользователей
+    Интересы подгружаются через JOIN, поэтому количество запросов
+    не зависит от числа пользователей.
     """
-    if excluded_user_ids is None:
-        excluded_user_ids = []
-    
-    # Исключаем самого пользователя из списка
-    excluded_user_ids.append(user.telegram_id)
-    
-    # Базовый запрос с предварительной загрузкой interests
-    query = (
+    result = await session.execute(
         select(User)
-        .options(selectinload(User.interests))
+        .options(joinedload(User.interests))
         .where(User.is_active == True)
         .where(User.registration_complete == True)
-        .where(User.telegram_id.not_in(excluded_user_ids))
-    )
-    
-    # Проверяем совместимость форматов встречи
-    format_condition = or_(
-        user.meeting_format == MeetingFormat.ANY,
-        User.meeting_format == MeetingFormat.ANY,
-        user.meeting_format == User.meeting_format
     )
-    query = query.where(format_condition)
-    
-    # Выполняем запрос
-    result = await session.execute(query)
-    return result.scalars().all()
+    return result.unique().scalars().all()
 
 
 async def get_recent_meeting_partners(
     session: AsyncSession,
     user_id: int,
-    limit: int = 5
+    within: Optional[timedelta] = None
 ) -> List[int]:
     """
-    Получение недавних собеседников пользователя.
+    Получение недавних собеседников пользователя по таблице pair_history.
     
     Args:
         session: Сессия базы данных
         user_id: ID пользователя
-        limit: Максимальное количество недавних собеседников
+        within: Окно исключения (по умолчанию PAIR_EXCLUSION_WEEKS недель)
     
     Returns:
         Список ID недавних собеседников
     """
-    # Находим последние встречи
-    query = (
-        select(Meeting)
-        .where(
-            or_(
-                Meeting.user1_id == user_id,
-                Meeting.user2_id == user_id
-            )
-        )
-        .order_by(Meeting.created_at.desc())
-        .limit(limit)
-    )
-    
-    result = await session.execute(query)
-    meetings = result.scalars().all()
-    
-    # Извлекаем ID партнеров
-    partner_ids = []
-    for meeting in meetings:
-        if meeting.user1_id == user_id:
-            partner_ids.append(meeting.user2_id)
-        else:
-            partner_ids.append(meeting.user1_id)
-    
-    return partner_ids 
\ No newline at end of file
+    recent_partners = await get_recent_partners(session, [user_id], within=within)
+    return list(recent_partners.get(user_id, ()))
@@ -9,72 +9,114 @@ import os
 import sys
 
 from dotenv import load_dotenv
-from aiogram.fsm.storage.base import StorageKey
 
-from database.state_storage import SQLiteStorage
+from database.db import get_sqlite_profile
+from database.sharded_storage import create_sqlite_storage
 from states import RegistrationStates, FeedbackStates, PairingStates
 
 load_dotenv()
 
-async def list_states(db_path: str = "database.sqlite3"):
-    """Показывает список всех состояний"""
-    storage = SQLiteStorage(db_path)
-    states = await storage.get_all_states()
+def warn_cached_bot():
+    """Предупреждает, что запущенный бот увидит изменения с задержкой из-за кэша состояний"""
+    max_age = float(os.getenv("FSM_CACHE_MAX_AGE", "30"))
+    if max_age > 0:
+        print(f"Если бот запущен, он увидит изменения не позже чем через {max_age:g} с (FSM_CACHE_MAX_AGE)")
+    else:
+        print("Кэш состояний бота не перечитывает базу (FSM_CACHE_MAX_AGE=0): перезапустите бота")
+
+def open_storage(db_path: str = "database.sqlite3"):
+    """
+    Создает хранилище с той же схемой шардирования, что и у бота
+    (FSM_STORAGE_SHARDS и FSM_STORAGE_SHARD_DIR), чтобы команды обходили все шарды
+    """
+    return create_sqlite_storage(
+        db_path,
+        shards=int(os.getenv("FSM_STORAGE_SHARDS", "0")),
+        shard_dir=os.getenv("FSM_STORAGE_SHARD_DIR", "fsm_storage"),
+        profile=get_sqlite_profile()
+    )
+
+async def list_states(
+    db_path: str = "database.sqlite3",
+    limit: int = None,
+    state: str = None,
+    user_id: int = None,
+    older_than_hours: float = None
+):
+    """Потоково выводит состояния, не загружая всю таблицу в память"""
+    storage = open_storage(db_path)
+    older_than = older_than_hours * 3600 if older_than_hours is not None else None
+    
+    shown = 0
+    try:
+        async for item in storage.iter_states(state=state, user_id=user_id, older_than=older_than, limit=limit):
+            print(f"User ID: {item['user_id']}, State: {item['state']}")
+            if item["data"]:
+                print(f"Data: {json.dumps(item['data'], ensure_ascii=False, indent=2)}")
+            print("-" * 50)
+            shown += 1
+    finally:
+        await storage.close()
     
-    if not states:
+    if not shown:
         print("Хранилище пусто")
         return
     
-    print(f"Всего записей: {len(states)}")
-    for item in states:
-        key_parts = item["key"].split(":")
-        if len(key_parts) >= 3:
-            user_id = key_parts[2]
-            state = item["state"]
-            data = item["data"]
-            print(f"User ID: {user_id}, State: {state}")
-            if data:
-                print(f"Data: {json.dumps(data, ensure_ascii=False, indent=2)}")
-            print("-" * 50)
+    print(f"Показано записей: {shown}")
 
-async def clear_states(user_id: int = None, db_path: str = "database.sqlite3"):
-    """Очищает состояния для конкретного пользователя или для всех пользователей"""
-    storage = SQLiteStorage(db_path)
-    states = await storage.get_all_states()
+async def summary_states(db_path: str = "database.sqlite3", user_id: int = None, older_than_hours: float = None):
+    """Показывает количество записей по каждому состоянию"""
+    storage = open_storage(db_path)
+    older_than = older_than_hours * 3600 if older_than_hours is not None else None
+    try:
+        counts = await storage.count_states(user_id=user_id, older_than=older_than)
+    finally:
+        await storage.close()
     
-    if not states:
-        print("Хранилище уже пусто")
+    if not counts:
+        print("Хранилище пусто")
         return
     
+    print(f"Всего записей: {sum(count for _, count in counts)}")
+    for state, count in counts:
+        print(f"{state or 'Без состояния'}: {count}")
+
+async def clear_states(user_id: int = None, db_path: str = "database.sqlite3"):
+    """Очищает состояния для конкретного пользователя или для всех пользователей"""
+    storage = open_storage(db_path)
+    try:
+        if user_id:
+            # Удаляем все ключи пользователя одним запросом по индексу
+            deleted = await storage.delete_user(user_id)
+        else:
+            # Очищаем всю таблицу
+            deleted = await storage.clear_all()
+    finally:
+        await storage.close()
+    
     if user_id:
-        # Ищем все ключи для указанного пользователя
-        user_keys = []
-        for item in states:
-            key_parts = item["key"].split(":")
-            if len(key_parts) >= 3 and key_parts[2] == str(user_id):
-                user_keys.append(item["key"])
-        
-        if not user_keys:
+        if not deleted:
             print(f"Состояний для пользователя {user_id} не найдено")
             return
-        
-        # Удаляем все найденные ключи
-        for key in user_keys:
-            # Создаем StorageKey из строки
-            bot_id, chat_id, user_id, thread_id = key.split(":")
-            storage_key = StorageKey(bot_id=bot_id, chat_id=int(chat_id), 
-                                     user_id=int(user_id), thread_id=int(thread_id))
-            await storage.reset_all(storage_key)
-        
         print(f"Состояния для пользователя {user_id} были очищены")
     else:
-        # Очищаем всю таблицу
-        import aiosqlite
-        async with aiosqlite.connect(db_path) as db:
-            await db.execute("DELETE FROM fsm_storage")
-            await db.commit()
-        
+        if not deleted:
+            print("Хранилище уже пусто")
+            return
         print("Все состояния были очищены")
+    warn_cached_bot()
+
+async def expire_states(hours: float, db_path: str = "database.sqlite3"):
+    """Удаляет состояния, которые не обновлялись дольше указанного количества часов"""
+    storage = open_storage(db_path)
+    try:
+        expired = await storage.expire_stale(hours * 3600)
+    finally:
+        await storage.close()
+    
+    print(f"Удалено устаревших записей: {expired}")
+    if expired:
+        warn_cached_bot()
 
 async def main():
     parser = argparse.ArgumentParser(description="Утилиты для работы с хранилищем состояний")
@@ -83,18 +125,33 @@ async def main():
     # Команда list
     list_parser = subparsers.add_parser("list", help="Показать список состояний")
     list_parser.add_argument("--db", help="Путь к базе данных", default="database.sqlite3")
+    list_parser.add_argument("--limit", type=int, help="Максимальное количество записей", default=None)
+    list_parser.add_argument("--state", help="Состояние или группа состояний (например, RegistrationStates)", default=None)
+    list_parser.add_argument("--user-id", type=int, help="ID пользователя", default=None)
+    list_parser.add_argument("--older-than-hours", type=float, help="Только записи старше указанного числа часов", default=None)
+    list_parser.add_argument("--summary", action="store_true", help="Показать только количество записей по состояниям")
     
     # Команда clear
     clear_parser = subparsers.add_parser("clear", help="Очистить состояния")
     clear_parser.add_argument("--user-id", type=int, help="ID пользователя (если не указан, очищаются все)", default=None)
     clear_parser.add_argument("--db", help="Путь к базе данных", default="database.sqlite3")
     
+    # Команда expire
+    expire_parser = subparsers.add_parser("expire", help="Удалить устаревшие состояния")
+    expire_parser.add_argument("--hours", type=float, help="Срок жизни состояния в часах", default=72)
+    expire_parser.add_argument("--db", help="Путь к базе данных", default="database.sqlite3")
+    
     args = parser.parse_args()
     
     if args.command == "list":
-        await list_states(args.db)
+        if args.summary:
+            await summary_states(args.db, args.user_id, args.older_than_hours)
+        else:
+            await list_states(args.db, args.limit, args.state, args.user_id, args.older_than_hours)
     elif args.command == "clear":
         await clear_states(args.user_id, args.db)
+    elif args.command == "expire":
+        await expire_states(args.hours, args.db)
     else:
         parser.print_help()
 
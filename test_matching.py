@@ -6,7 +6,7 @@ from dotenv import load_dotenv
 from sqlalchemy import delete, or_
 
 from database.db import async_session_maker, init_db
-from database.models import User, TopicType, MeetingFormat, Meeting
+from database.models import User, TopicType, MeetingFormat, Meeting, PairHistory
 from services.user_service import create_user, update_user, add_user_topic
 from services.meeting_service import create_meetings_for_users
 
@@ -21,7 +21,7 @@ logger = logging.getLogger(__name__)
 
 async def delete_test_data():
     """
-    Удаляет тестовые данные из базы данных (пользователей и связанные встречи).
+    Удаляет тестовые данные из базы данных (пользователей, связанные встречи и историю пар).
     """
     test_ids = [100001, 100002, 100003, 100004, 100005]
     
@@ -37,6 +37,17 @@ async def delete_test_data():
         await session.commit()
         logger.info(f"Удалено {meetings_result.rowcount} тестовых встреч")
         
+        # История пар, иначе при повторном запуске пары исключаются как недавние
+        await session.execute(
+            delete(PairHistory).where(
+                or_(
+                    PairHistory.user_low_id.in_(test_ids),
+                    PairHistory.user_high_id.in_(test_ids)
+                )
+            )
+        )
+        await session.commit()
+        
         # Затем удаляем самих тестовых пользователей
         users_query = delete(User).where(User.telegram_id.in_(test_ids))
         users_result = await session.execute(users_query)